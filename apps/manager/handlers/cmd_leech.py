@@ -4,16 +4,26 @@ import shlex
 import sys
 import uuid
 
-from shared.registry import (
-    get_active_tasks_count,
-)
-
 sys.path.append("/app/shared")
 from pyrogram import Client, enums, filters
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
+from shared.cluster import alive_nodes, fleet_load
 from shared.database import db_service
+from shared.dedup import abandon_source, attach_source, detach_follower, source_key
+from shared.library_index import fingerprints, library_index, release_key
 from shared.settings import settings
+from shared.task_envelope import TaskEnvelope
+from shared.task_queue import (
+    INCOMPLETE_QUEUE,
+    KILL_CHANNEL,
+    LEECH_QUEUE,
+    enqueue,
+    list_incomplete,
+    remove_queued,
+    resume_incomplete,
+    task_id_of,
+)
 
 logger = logging.getLogger("LeechHandler")
 
@@ -40,7 +50,7 @@ async def leech_command(client, message):
             return await message.reply_text(
                 f"<pre>⚠️ Usage:</pre>\n"
                 f"{'—' * 12}\n"
-                f"<code>/leech [URL] [TMDB_ID] [type] \"[name]\"</code>\n\n"
+                f"<code>/leech [URL] [TMDB_ID] [type] \"[name]\" [-f]</code>\n\n"
                 f"<b>Example:</b> <code>/leech https://video-link.mp4 155 movie \"The Dark Knight\"</code>"
             )
         url = all_args[1]
@@ -49,10 +59,13 @@ async def leech_command(client, message):
         tmdb_id = "0"
         type_hint = "auto"
         name_hint = ""
+        force = False
 
         # 3. EXTRACT OPTIONS (ID, Type, or Name)
         for arg in all_args[2:]:
-            if arg.isdigit():
+            if arg.lower() in ["-f", "--force"]:
+                force = True  # Skip the library duplicate check
+            elif arg.isdigit():
                 tmdb_id = arg
             elif arg.lower() in ["tv", "movie", "series", "anime"]:
                 type_hint = arg.lower()
@@ -69,19 +82,12 @@ async def leech_command(client, message):
         trigger_msg_id = message.id  # <--- Store this to delete later
         limit_key = f"active_user_tasks:{user_id}"
 
-        # GLOBAL LIMIT CHECK (Is the whole server full?)
-        active_total = await get_active_tasks_count()
-        if active_total >= settings.MAX_TOTAL_TASKS:
-            return await message.reply_text(
-                f"<pre>⚠️ <b>Server Busy!</b></pre>\n"
-                f"Total active tasks: <code>{active_total}/{settings.MAX_TOTAL_TASKS}</code>\n"
-                f"Your task is in the queue and will start automatically when a slot opens."
-                f"Check Status --> /status"
-            )
+        # FLEET LOAD (Slots, queue depth & this user's tasks in ONE round trip)
+        load = await fleet_load(db_service.redis, user_id)
 
         # USER LIMIT CHECK (Bypass if user is Owner OR Toggle is OFF)
         if settings.ENABLE_USER_LIMITS and user_id != OWNER_ID:
-            active_count = await db_service.redis.scard(limit_key)
+            active_count = load.user_tasks
             if active_count >= settings.MAX_TASKS_PER_USER:
                 # Fetch IDs to show the user
                 active_ids = await db_service.redis.smembers(limit_key)
@@ -103,6 +109,41 @@ async def leech_command(client, message):
         task_id = str(uuid.uuid4())[:8]  # Short unique ID
         status_key = f"task_status:{task_id}"
 
+        # 2.1 ENVELOPE (Built once, pushed as-is)
+        envelope = TaskEnvelope(
+            task_id=task_id,
+            url=url,
+            tmdb_id=int(tmdb_id),
+            type_hint=type_hint,
+            name_hint=name_hint,
+            user_id=str(user_id),
+            origin_chat_id=origin_chat_id,
+            user_tag=user_tag,
+            trigger_msg_id=str(trigger_msg_id),
+        )
+
+        envelope.source_key = source_key(url)
+
+        # 2.2 LIBRARY DEDUP: Already uploaded? (Bloom filter -> Mongo confirm)
+        if settings.ENABLE_LIBRARY_DEDUP and not force:
+            existing = await library_index.lookup(
+                fingerprints(envelope.source_key, release_key(tmdb_id, name_hint))
+            )
+            if existing:
+                return await message.reply_text(
+                    f"<pre>📚 Already in Library</pre>\n"
+                    f"📦 <code>{existing.get('name', 'Unknown')}</code>\n"
+                    f"📎 <a href='{existing.get('msg_link', '#')}'>[View in Log]</a>\n\n"
+                    f"<i>Add</i> <code>-f</code> <i>to leech it anyway.</i>",
+                    disable_web_page_preview=True,
+                )
+
+        # 2.3 IN-FLIGHT DEDUP: Same URL/infohash already running?
+        # Then this task rides along as a follower instead of downloading again.
+        leader_id = None
+        if settings.ENABLE_INFLIGHT_DEDUP:
+            leader_id = await attach_source(db_service.redis, envelope)
+
         # 3. Add to User's Active Set
         await db_service.redis.sadd(limit_key, task_id)
         # Auto-expire the set in 2 hours (Safety against zombie tasks)
@@ -114,13 +155,30 @@ async def leech_command(client, message):
         clean_cid = str(settings.TG_LOG_CHANNEL_ID).replace("-100", "")
         chan_link = f"https://t.me/c/{clean_cid}/1"
 
+        # GLOBAL LOAD CHECK (Is the whole fleet full?)
+        # The task is queued either way; the reply just tells the truth about
+        # when it will start.
+        if leader_id:
+            headline = "<pre>🔗 Attached to Running Task</pre>\n"
+            queue_note = f"Sharing download of {leader_id}"
+        elif not load.nodes:
+            headline = "<pre>⚠️ No Workers Online!</pre>\n"
+            queue_note = "Waiting for a worker node to come online..."
+        elif not load.free:
+            headline = "<pre>⚠️ Server Busy!</pre>\n"
+            queue_note = f"Position #{load.queued + 1} (starts when a slot opens)"
+        else:
+            headline = "<pre>🚀 Task Queued</pre>\n"
+            queue_note = "Added in Queue..."
+
         # Reply with Buttons
         response_text = (
-            f"<pre>🚀 Task Queued</pre>\n"
+            f"{headline}"
             f"{'—' * 12}\n"
             f"🆔 ID: <code>{task_id}</code>\n"
             f"📦 Content: <code>{tmdb_id}</code> ({type_hint.upper()})\n"
-            f"📡 Status: <code>Added in Queue...</code>\n"
+            f"📡 Status: <code>{queue_note}</code>\n"
+            f"🖥️ Fleet: <code>{load.active}/{load.capacity}</code> slots busy | {load.queued} queued\n"
             f"📜 Channel: <a href='{chan_link}'>Open Log</a>"
         )
 
@@ -165,13 +223,14 @@ async def leech_command(client, message):
         # Expire status after 1 hour to keep Redis clean
         await db_service.redis.expire(status_key, 3600)
 
-        # 7. PAYLOAD & PUSH TO QUEUE
-        # FORMAT: task_id|tmdb_id|url|type|name|user_id|origin_chat_id|user_tag|trigger_msg_id
-        payload = f"{task_id}|{tmdb_id}|{url}|{type_hint}|{name_hint}|{user_id}|{origin_chat_id}|{user_tag}|{trigger_msg_id}"
+        # 7. Followers never hit the queue (the leader's worker serves them)
+        if leader_id:
+            logger.info(f"🔗 Task {task_id} attached to in-flight leader {leader_id}")
+            return
 
-        # 5. Push to Queue
-        await db_service.redis.lpush("queue:leech", payload)
-        logger.info(f"Task dispatched: {payload}")
+        # 8. Push to Queue
+        await enqueue(db_service.redis, envelope)
+        logger.info(f"Task dispatched: {envelope.encode()}")
 
         # 🟢 CRITICAL LOG: If you don't see this in Manager Logs, the bridge failed.
         logger.info(f"📤 Task Dispatched to Redis: {task_id}")
@@ -201,12 +260,25 @@ async def cancel_task(client, message):
             f"❌ <b>Task <code>{task_id}</code></b> is not in an active state or doesn't exist."
         )
 
-    # Set a Kill Flag in Redis
+    # Set a Kill Flag in Redis (for tasks not claimed yet / late checks)
     await db_service.redis.set(f"kill_signal:{task_id}", "1", ex=300)
+    # ...and push it to every worker's Kill Switch right now
+    await db_service.redis.publish(KILL_CHANNEL, task_id)
 
     # Update status in Redis so /status reflects it immediately
     await db_service.redis.hset(status_key, "status", "cancelling")
 
+    # Not on a worker yet: no lane will ever clean up after it, so do it here.
+    # A follower leaves its source for good (no shared upload, no re-lead);
+    # a leader still in queue:leech is dropped and its followers re-led.
+    if data.get("status") == "queued":
+        detached = await detach_follower(db_service.redis, task_id)
+        dropped = await remove_queued(db_service.redis, task_id)
+        if dropped:
+            await abandon_source(db_service.redis, task_id)
+        if detached or dropped:
+            await db_service.redis.hset(status_key, "status", "cancelled")
+
     # Release user slot
     await db_service.redis.srem(f"active_user_tasks:{message.from_user.id}", task_id)
 
@@ -267,13 +339,16 @@ async def build_status_text():
                 f"   └ 🛑 /cancel_{task_id}\n\n"
             )
 
-    queue_items = await db_service.redis.lrange("queue:leech", 0, -1)
+    # Workers pop from the RIGHT -> reverse so #1 is the next task to start
+    queue_items = await db_service.redis.lrange(LEECH_QUEUE, 0, -1)
     pending_lines = []
-    for i, item in enumerate(queue_items):
-        parts = item.split("|")
-        t_id = parts[0]
-        # Robust name hint extraction
-        n_hint = parts[4] if len(parts) > 4 and parts[4] else f"TMDB {parts[1]}"
+    for i, item in enumerate(reversed(queue_items)):
+        try:
+            envelope = TaskEnvelope.decode(item)
+        except ValueError:
+            continue
+        t_id = envelope.task_id
+        n_hint = envelope.name_hint or f"TMDB {envelope.tmdb_id}"
         pending_lines.append(
             f"<code>{i+1}.</code> <b>{n_hint}</b> (ID: <code>{t_id}</code>)"
         )
@@ -285,9 +360,23 @@ async def build_status_text():
     queue_section = "\n\n⏳ <b>PENDING QUEUE</b>\n" + (
         "\n".join(pending_lines) if pending_lines else "_Queue is empty._"
     )
-    footer = f"\n\n📊 <b>Total Pending:</b> <code>{len(queue_items)}</code>"
+    # Worker Fleet (Live heartbeats only)
+    nodes = await alive_nodes(db_service.redis)
+    node_lines = [
+        f"🖥️ <code>{n['node_id']}</code> — {n.get('active', 0)}/{n.get('capacity', 0)} "
+        f"(⏳ {n.get('waiting', 0)} | ⬇️ {n.get('downloading', 0)} | ⚙️ {n.get('processing', 0)} | ⬆️ {n.get('uploading', 0)})"
+        for n in nodes
+    ]
+    fleet_section = "\n\n🛰️ <b>WORKER FLEET</b>\n" + (
+        "\n".join(node_lines) if node_lines else "_No workers online._"
+    )
+    load = await fleet_load(db_service.redis)
+    footer = (
+        f"\n\n📊 <b>Total Pending:</b> <code>{len(queue_items)}</code>"
+        f" | <b>Fleet Slots:</b> <code>{load.active}/{load.capacity}</code>"
+    )
 
-    return header + active_section + queue_section + footer
+    return header + active_section + queue_section + fleet_section + footer
 
 
 # --- 3. STATUS COMMAND HANDLER ---
@@ -342,33 +431,27 @@ async def status_callback_handler(client, callback_query):
 @Client.on_callback_query(filters.regex("resume_all_tasks"))
 async def resume_all_callback(client, callback_query):
     await callback_query.answer("♻️ Resuming tasks...")
-    incompletes = await db_service.db.incomplete_tasks.find().to_list(length=100)
-
-    resumed = 0
-    failed_links = []
+    incompletes = await list_incomplete(db_service.redis)
 
-    for task in incompletes:
-        payload = task["payload"]
-        # Simple Link Validation (Check if it's a direct link that might have expired)
-        task_id = payload.split("|")[0]
-        url = payload.split("|")[2]
-        logger.info(f"Resuming Task {task_id} for URL: {url}")
+    for payload in incompletes:
+        logger.info(f"Resuming Task {task_id_of(payload)} from Recovery Store")
 
-        # WZML-X Tip: We re-push to Redis.
-        # If the link is expired, the worker will catch it during download.
-        await db_service.redis.lpush("queue:leech", payload)
-        await db_service.db.incomplete_tasks.delete_one({"_id": task["_id"]})
-        resumed += 1
+    # WZML-X Tip: We re-push to Redis.
+    # If the link is expired, the worker will catch it during download.
+    resumed = await resume_incomplete(db_service.redis)
 
     msg = f"✅ <b>Recovery Complete</b>\nResumed <code>{resumed}</code> tasks."
-    if failed_links:
-        msg += f"\n\n⚠️ <b>Notice:</b> Some links might fail to download if they were temporary/expired."
+    if resumed:
+        msg += "\n\n⚠️ <b>Notice:</b> Some links might fail to download if they were temporary/expired."
 
     await callback_query.message.edit_text(msg)
 
 
 @Client.on_callback_query(filters.regex("clear_incomplete_tasks"))
 async def clear_incomplete_callback(client, callback_query):
-    await db_service.db.incomplete_tasks.drop()
+    # Parked leaders never run again: free their sources first
+    for payload in await list_incomplete(db_service.redis):
+        await abandon_source(db_service.redis, task_id_of(payload))
+    await db_service.redis.delete(INCOMPLETE_QUEUE)
     await callback_query.answer("🗑️ All records cleared.", show_alert=True)
     await callback_query.message.delete()
@@ -3,6 +3,7 @@ import logging
 import os
 import subprocess
 import sys
+import uuid
 
 sys.path.append("/app")
 from core.security import RateLimiter, sign_stream_link
@@ -11,8 +12,11 @@ from fastapi.responses import JSONResponse, StreamingResponse
 from services.metadata import metadata_service
 
 from shared.database import db_service
+from shared.library_index import library_index
 from shared.schemas import SignRequest
 from shared.settings import settings
+from shared.task_envelope import TaskEnvelope
+from shared.task_queue import enqueue
 from shared.utils import generate_short_id
 
 logger = logging.getLogger("Library")
@@ -178,6 +182,9 @@ async def delete_content(tmdb_id: int):
     if res.deleted_count == 0:
         raise HTTPException(404, "Item not found in Library")
 
+    # Let /leech fetch it again (duplicate index must not point at a ghost)
+    await library_index.forget(tmdb_id)
+
     logger.info(f"🗑️ Deleted Library Entry: {tmdb_id}")
     return {"status": "deleted", "id": tmdb_id}
 
@@ -250,10 +257,16 @@ async def attach_media_manually(tmdb_id: int, file_path: str):
     and link it to a movie. (Bridge Step for Phase 3).
     """
     # For now, we use a simple Redis message to signal the Worker
-    # Payload: tmdb_id|file_path
-    payload = f"{tmdb_id}|{file_path}"
-    await db_service.redis.lpush("queue:leech", payload)
-    return {"status": "task_queued", "tmdb_id": tmdb_id, "file": file_path}
+    envelope = TaskEnvelope(
+        task_id=str(uuid.uuid4())[:8], url=file_path, tmdb_id=tmdb_id
+    )
+    await enqueue(db_service.redis, envelope)
+    return {
+        "status": "task_queued",
+        "task_id": envelope.task_id,
+        "tmdb_id": tmdb_id,
+        "file": file_path,
+    }
 
 # --- On-The-Fly Subtitle Extractor ---
 @router.get("/subtitle/{file_id}/{index}.vtt")
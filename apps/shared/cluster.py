@@ -0,0 +1,163 @@
+# apps/shared/cluster.py
+import json
+import logging
+import time
+from typing import NamedTuple
+
+from shared.task_queue import ACTIVE_COUNTS, LEECH_QUEUE
+
+logger = logging.getLogger("Cluster")
+
+# --- REDIS KEYS (Worker Fleet) ---
+NODES_KEY = "cluster:nodes"  # SET of every node that ever registered
+NODE_PREFIX = "cluster:node:"  # HASH per node (capacity, load, health) w/ TTL
+STATUS_LEADER_KEY = "cluster:status_leader"  # Node that owns the fleet status msg
+
+# Acquire-or-renew in one call: returns 1 if ARGV[1] holds the lock afterwards
+_LEAD_LUA = """
+local owner = redis.call('GET', KEYS[1])
+if owner == false or owner == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+
+class FleetLoad(NamedTuple):
+    nodes: int  # Workers with a live heartbeat
+    capacity: int  # Sum of their slots
+    active: int  # Tasks claimed by them
+    queued: int  # Waiting in queue:leech
+    user_tasks: int  # Queued + running tasks of the asking user
+
+    @property
+    def free(self) -> int:
+        return max(self.capacity - self.active, 0)
+
+
+def node_key(node_id: str) -> str:
+    return f"{NODE_PREFIX}{node_id}"
+
+
+def node_tasks_key(node_id: str) -> str:
+    return f"{NODE_PREFIX}{node_id}:tasks"
+
+
+class WorkerRegistry:
+    """
+    Worker-side membership in the fleet.
+    Every heartbeat refreshes this node's capacity/load hash (TTL'd), so a
+    node that stops beating simply disappears from the fleet.
+    """
+
+    def __init__(self, redis, node_id: str, capacity: int, ttl: int = 30):
+        self.redis = redis
+        self.node_id = node_id
+        self.capacity = capacity
+        self.ttl = ttl
+        self.started_at = int(time.time())
+        self._lead = redis.register_script(_LEAD_LUA)
+
+    async def heartbeat(self, **load):
+        """Publishes capacity + live load (active, downloading, waiting, cpu...)."""
+        mapping = {
+            "node_id": self.node_id,
+            "capacity": self.capacity,
+            "started_at": self.started_at,
+            "last_seen": int(time.time()),
+            **load,
+        }
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.sadd(NODES_KEY, self.node_id)
+            pipe.hset(node_key(self.node_id), mapping=mapping)
+            pipe.expire(node_key(self.node_id), self.ttl)
+            if "active" in load:
+                # Local truth re-asserted every beat (heals counter drift)
+                pipe.hset(ACTIVE_COUNTS, self.node_id, load["active"])
+            await pipe.execute()
+
+    async def publish_tasks(self, tasks: list, ttl: int):
+        """Stores this node's UI snapshot so the status leader can render it."""
+        await self.redis.set(node_tasks_key(self.node_id), json.dumps(tasks), ex=ttl)
+
+    async def try_lead(self, ttl: int) -> bool:
+        """Fleet status leader election (one status message for the whole fleet)."""
+        return bool(await self._lead(keys=[STATUS_LEADER_KEY], args=[self.node_id, ttl]))
+
+    async def deregister(self):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.srem(NODES_KEY, self.node_id)
+            pipe.delete(node_key(self.node_id), node_tasks_key(self.node_id))
+            await pipe.execute()
+
+
+# --- FLEET READERS (Manager & Workers) ---
+async def alive_nodes(redis) -> list[dict]:
+    """Returns the load hash of every node with a live heartbeat."""
+    members = sorted(await redis.smembers(NODES_KEY))
+    if not members:
+        return []
+
+    async with redis.pipeline(transaction=False) as pipe:
+        for node_id in members:
+            pipe.hgetall(node_key(node_id))
+        hashes = await pipe.execute()
+
+    nodes, dead = [], []
+    for node_id, data in zip(members, hashes, strict=True):
+        if data:
+            nodes.append(data)
+        else:
+            dead.append(node_id)
+
+    # Prune nodes whose heartbeat expired (keeps SMEMBERS small)
+    if dead:
+        await redis.srem(NODES_KEY, *dead)
+        await redis.hdel(ACTIVE_COUNTS, *dead)
+    return nodes
+
+
+async def fleet_load(redis, user_id=None) -> FleetLoad:
+    """
+    Cluster-wide slot accounting for admission control (2 round trips).
+    Only nodes with a live heartbeat count, so a crashed node's slots
+    vanish with its TTL instead of leaking forever.
+    """
+    user_key = f"active_user_tasks:{user_id}" if user_id else "active_user_tasks:_"
+    members = sorted(await redis.smembers(NODES_KEY))
+
+    async with redis.pipeline(transaction=False) as pipe:
+        for node_id in members:
+            pipe.hget(node_key(node_id), "capacity")
+        pipe.hgetall(ACTIVE_COUNTS)
+        pipe.llen(LEECH_QUEUE)
+        pipe.scard(user_key)
+        *caps, counts, queued, user_tasks = await pipe.execute()
+
+    nodes = capacity = active = 0
+    for node_id, cap in zip(members, caps, strict=True):
+        if cap:
+            nodes += 1
+            capacity += int(cap)
+            active += max(0, int(counts.get(node_id) or 0))
+    return FleetLoad(nodes, capacity, active, int(queued), int(user_tasks))
+
+
+async def fleet_tasks(redis, node_ids) -> list[dict]:
+    """Collects the UI snapshots of the given nodes in ONE round trip."""
+    if not node_ids:
+        return []
+    raw = await redis.mget([node_tasks_key(n) for n in node_ids])
+    tasks = []
+    for node_id, blob in zip(node_ids, raw, strict=True):
+        if not blob:
+            continue
+        try:
+            for task in json.loads(blob):
+                task["node"] = node_id
+                tasks.append(task)
+        except ValueError:
+            logger.warning(f"Corrupt task snapshot from {node_id}")
+    return tasks
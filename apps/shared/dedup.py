@@ -0,0 +1,204 @@
+# apps/shared/dedup.py
+import base64
+import hashlib
+import logging
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from shared.settings import settings
+from shared.task_envelope import TaskEnvelope
+from shared.task_queue import enqueue
+
+logger = logging.getLogger("Dedup")
+
+# --- REDIS KEYS (In-flight coalescing) ---
+SOURCE_PREFIX = "inflight:src:"  # inflight:src:{source_key} -> leader task_id
+FOLLOWERS_PREFIX = "inflight:followers:"  # LIST of follower envelopes per source
+TASK_SOURCE_PREFIX = "inflight:task:"  # inflight:task:{task_id} -> source_key
+
+# Query params that never change WHAT is downloaded
+_TRACKING_PARAMS = {"fbclid", "gclid", "igshid", "ref", "si", "feature"}
+_BTIH_RE = re.compile(r"urn:btih:([a-zA-Z0-9]+)")
+
+# Leader-or-follower in one step: either we own the source, or we are queued
+# behind whoever does. Returns "" for a new leader, else the leader's task_id.
+# KEYS[3] remembers the task's source, so it can be released/detached by id.
+_ATTACH_LUA = """
+local leader = redis.call('GET', KEYS[1])
+if not leader then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+    redis.call('SET', KEYS[3], ARGV[4], 'EX', ARGV[3])
+    return ''
+end
+redis.call('RPUSH', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+redis.call('SET', KEYS[3], ARGV[4], 'EX', ARGV[3])
+return leader
+"""
+
+# Leader is done: release the source and hand back everyone who waited on it.
+# A task that no longer owns the source (abandoned earlier) takes nobody.
+_RELEASE_LUA = """
+redis.call('DEL', KEYS[3])
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return {}
+end
+redis.call('DEL', KEYS[1])
+local followers = redis.call('LRANGE', KEYS[2], 0, -1)
+redis.call('DEL', KEYS[2])
+return followers
+"""
+
+# /cancel of a follower: drop its entry so it never gets a shared upload
+# or becomes the next leader.
+_DETACH_LUA = """
+for _, payload in ipairs(redis.call('LRANGE', KEYS[1], 0, -1)) do
+    local ok, envelope = pcall(cjson.decode, payload)
+    if ok and envelope['task_id'] == ARGV[1] then
+        redis.call('LREM', KEYS[1], 1, payload)
+        redis.call('DEL', KEYS[2])
+        return 1
+    end
+end
+return 0
+"""
+
+
+def _infohash(magnet: str) -> str:
+    """Extracts the btih of a magnet as lowercase hex ('' if absent)."""
+    match = _BTIH_RE.search(magnet)
+    if not match:
+        return ""
+    value = match.group(1)
+    if len(value) == 32:  # Base32 form
+        try:
+            return base64.b32decode(value.upper()).hex()
+        except ValueError:
+            return ""
+    return value.lower()
+
+
+def canonical_url(url: str) -> str:
+    """Strips what doesn't change the content: case, www., ports, tracking, #."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").removeprefix("www.")
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(
+        sorted(
+            (k, v)
+            for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if not k.startswith("utm_") and k not in _TRACKING_PARAMS
+        )
+    )
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def source_key(url: str) -> str:
+    """
+    Normalized identity of WHAT a task downloads.
+    Magnets -> 'btih:<hex>', everything else -> 'url:<sha1 of canonical URL>'.
+    """
+    url = url.strip()
+    if url.startswith("magnet:"):
+        infohash = _infohash(url)
+        if infohash:
+            return f"btih:{infohash}"
+    elif "://" in url:
+        url = canonical_url(url)
+    return f"url:{hashlib.sha1(url.encode(), usedforsecurity=False).hexdigest()}"
+
+
+async def attach_source(redis, envelope: TaskEnvelope) -> str | None:
+    """
+    Registers the task's source at admission.
+    Returns None if this task leads (enqueue it), or the task_id of the
+    running leader it was attached to as a follower (do NOT enqueue).
+    """
+    if not envelope.source_key:
+        return None
+    leader = await redis.eval(
+        _ATTACH_LUA,
+        3,
+        f"{SOURCE_PREFIX}{envelope.source_key}",
+        f"{FOLLOWERS_PREFIX}{envelope.source_key}",
+        f"{TASK_SOURCE_PREFIX}{envelope.task_id}",
+        envelope.task_id,
+        envelope.encode(),
+        settings.INFLIGHT_SOURCE_TTL,
+        envelope.source_key,
+    )
+    return leader or None
+
+
+async def _release(redis, key: str, task_id: str) -> list[TaskEnvelope]:
+    raw = await redis.eval(
+        _RELEASE_LUA,
+        3,
+        f"{SOURCE_PREFIX}{key}",
+        f"{FOLLOWERS_PREFIX}{key}",
+        f"{TASK_SOURCE_PREFIX}{task_id}",
+        task_id,
+    )
+    followers = []
+    for payload in raw:
+        try:
+            followers.append(TaskEnvelope.decode(payload))
+        except ValueError:
+            logger.warning(f"Dropping undecodable follower of {task_id}")
+    return followers
+
+
+async def release_source(redis, envelope: TaskEnvelope) -> list[TaskEnvelope]:
+    """Leader finished (any outcome): frees the source, returns its followers."""
+    if not envelope.source_key:
+        return []
+    return await _release(redis, envelope.source_key, envelope.task_id)
+
+
+async def hand_off(redis, followers: list[TaskEnvelope], leader_id: str):
+    """
+    The leader produced nothing: the first follower becomes the new leader
+    (front of the queue), the rest re-attach behind it.
+    """
+    for follower in followers:
+        if await redis.exists(f"kill_signal:{follower.task_id}"):
+            continue
+        if await attach_source(redis, follower) is None:
+            # They already waited once -> jump the queue
+            follower.priority = max(follower.priority, 1)
+            await enqueue(redis, follower)
+            logger.info(f"👑 {follower.task_id} takes over the source of {leader_id}")
+
+
+async def abandon_source(redis, task_id: str) -> int:
+    """
+    A leader that will never run (buried, cleared, undecodable, cancelled in
+    the queue): frees its source claim right away and re-leads its followers,
+    instead of letting new leeches pile up behind it until the claim expires.
+    Returns the number of followers handed off.
+    """
+    key = await redis.get(f"{TASK_SOURCE_PREFIX}{task_id}")
+    if not key:
+        return 0
+    followers = await _release(redis, key, task_id)
+    await hand_off(redis, followers, task_id)
+    return len(followers)
+
+
+async def detach_follower(redis, task_id: str) -> bool:
+    """/cancel of a waiting follower: it leaves the source's follower list."""
+    key = await redis.get(f"{TASK_SOURCE_PREFIX}{task_id}")
+    if not key:
+        return False
+    return bool(
+        await redis.eval(
+            _DETACH_LUA,
+            2,
+            f"{FOLLOWERS_PREFIX}{key}",
+            f"{TASK_SOURCE_PREFIX}{task_id}",
+            task_id,
+        )
+    )
@@ -21,3 +21,9 @@ class TgLinkException(Exception):
     """No Access granted for this chat"""
 
     pass
+
+
+class LinkRejectedException(Exception):
+    """The host refused a resolved direct link (HTTP 403/410): expired or revoked"""
+
+    pass
@@ -0,0 +1,137 @@
+# apps/shared/library_index.py
+import hashlib
+import logging
+import re
+import time
+
+from shared.database import db_service
+from shared.settings import settings
+
+logger = logging.getLogger("LibraryIndex")
+
+# --- REDIS KEYS ---
+BLOOM_KEY = "library:bloom"  # Plain bitmap (SETBIT/GETBIT), no RedisBloom module needed
+REBUILD_LOCK = "library:bloom:rebuild"  # Only ONE process refills a lost bitmap
+REBUILD_LOCK_TTL = 300
+
+_EPISODE_RE = re.compile(r"\bS(\d{1,2})[ ._-]?E(\d{1,3})\b", re.IGNORECASE)
+_QUALITY_RE = re.compile(r"\b(2160p|1080p|720p|576p|480p|360p|4k)\b", re.IGNORECASE)
+
+
+def release_key(tmdb_id, name: str) -> str:
+    """
+    Normalized 'what is this release' key: TMDB id + episode + quality.
+    Same output for a /leech name hint and the final uploaded file name,
+    e.g. 'rel:1399:s01e02:1080p' or 'rel:155:movie:2160p'. '' if unknowable.
+    """
+    if not name or not str(tmdb_id).isdigit() or int(tmdb_id) == 0:
+        return ""
+    quality = _QUALITY_RE.search(name)
+    if not quality:
+        return ""
+    quality = quality.group(1).lower().replace("4k", "2160p")
+    episode = _EPISODE_RE.search(name)
+    unit = f"s{int(episode[1]):02d}e{int(episode[2]):02d}" if episode else "movie"
+    return f"rel:{int(tmdb_id)}:{unit}:{quality}"
+
+
+def fingerprints(source_key: str = "", release: str = "") -> list[str]:
+    """All identities a library file is known by (source URL/infohash, release)."""
+    return [fp for fp in (source_key and f"src:{source_key}", release) if fp]
+
+
+class LibraryIndex:
+    """
+    Pre-download duplicate detection.
+    1. Redis Bloom filter: O(k) bit reads answer 'definitely new' for free.
+    2. Mongo 'source_index': confirms a Bloom hit and points to the file.
+    The Bloom filter is rebuilt from Mongo if Redis ever loses it: a
+    sentinel bit past the filter is set once a rebuild completes, so a
+    flushed/evicted bitmap (even one re-created by record()) reads as cold.
+    """
+
+    def __init__(self, bits: int = None, hashes: int = 7):
+        self.bits = bits or settings.LIBRARY_BLOOM_BITS
+        self.hashes = hashes
+        self.sentinel = self.bits  # Offset outside every fingerprint's range
+
+    def _offsets(self, fingerprint: str):
+        """Kirsch-Mitzenmacher double hashing: k offsets from one digest."""
+        digest = hashlib.blake2b(fingerprint.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    async def _rebuild(self):
+        """Refills the bitmap from Mongo (lock holder only), then arms the sentinel."""
+        redis = db_service.redis
+        if not await redis.set(REBUILD_LOCK, 1, nx=True, ex=REBUILD_LOCK_TTL):
+            return  # Another process is on it
+        try:
+            count = 0
+            batch = []
+            async for doc in db_service.db.source_index.find({}, {"_id": 1}):
+                batch.append(doc["_id"])
+                if len(batch) >= 500:
+                    await self._add_bits(batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                await self._add_bits(batch)
+                count += len(batch)
+            await redis.setbit(BLOOM_KEY, self.sentinel, 1)
+            logger.info(f"🌸 Library Bloom filter rebuilt ({count} fingerprints)")
+        finally:
+            await redis.delete(REBUILD_LOCK)
+
+    async def _add_bits(self, fps):
+        async with db_service.redis.pipeline(transaction=False) as pipe:
+            for fp in fps:
+                for offset in self._offsets(fp):
+                    pipe.setbit(BLOOM_KEY, offset, 1)
+            await pipe.execute()
+
+    async def might_contain(self, fps) -> list[str]:
+        """
+        Returns the fingerprints the Bloom filter can't rule out (1 round trip).
+        Cold filter (sentinel unset): nothing can be ruled out until rebuilt.
+        """
+        if not fps:
+            return []
+        async with db_service.redis.pipeline(transaction=False) as pipe:
+            pipe.getbit(BLOOM_KEY, self.sentinel)
+            for fp in fps:
+                for offset in self._offsets(fp):
+                    pipe.getbit(BLOOM_KEY, offset)
+            warm, *bits = await pipe.execute()
+        if not warm:
+            await self._rebuild()
+            return list(fps)
+        k = self.hashes
+        return [fp for i, fp in enumerate(fps) if all(bits[i * k : (i + 1) * k])]
+
+    async def lookup(self, fps) -> dict | None:
+        """The library entry already holding this content, or None."""
+        candidates = await self.might_contain(fps)
+        if not candidates:
+            return None  # Bloom says: definitely new (no DB hit)
+        return await db_service.db.source_index.find_one({"_id": {"$in": candidates}})
+
+    async def record(self, fps, **entry):
+        """Indexes a freshly uploaded file under all of its fingerprints."""
+        if not fps:
+            return
+        entry["added_at"] = int(time.time())
+        for fp in fps:
+            await db_service.db.source_index.update_one(
+                {"_id": fp}, {"$set": entry}, upsert=True
+            )
+        await self._add_bits(fps)
+
+    async def forget(self, tmdb_id: int):
+        """Drops index entries of a deleted library item (Bloom bits stay; Mongo decides)."""
+        await db_service.db.source_index.delete_many({"tmdb_id": tmdb_id})
+
+
+# Singleton Instance
+library_index = LibraryIndex()
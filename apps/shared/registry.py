@@ -1,6 +1,8 @@
 # apps/shared/registry.py
 import asyncio
 
+from shared.cluster import fleet_load
+
 # The "Global Warehouse" for active Status Objects (Aria2Status, YtDlpStatus, etc.)
 task_dict = {}
 task_dict_lock = asyncio.Lock()
@@ -30,8 +32,14 @@ class MirrorStatus:
     STATUS_COMPLETED = "Completed"
 
 
-async def get_active_tasks_count():
-    """Counts how many tasks are currently Downloading or Uploading."""
+async def get_active_tasks_count(redis=None):
+    """
+    Counts how many tasks are currently Downloading or Uploading.
+    With a Redis client this is the FLEET-wide count (what the manager needs);
+    without one it only sees this process's task_dict.
+    """
+    if redis is not None:
+        return (await fleet_load(redis)).active
 
     async with task_dict_lock:
         return len(
@@ -87,7 +87,75 @@ class AppSettings(BaseSettings):
     ENABLE_USER_LIMITS: bool = False  # set True for public launch
     MAX_TASKS_PER_USER: int = 3
     MAX_TOTAL_TASKS: int = 10         # Global parallel limit
+
+    # --- STAGE POOLS (Per worker node) ---
+    MAX_CONCURRENT_DOWNLOADS: int = 5   # Network ingress (aria2 / yt-dlp)
+    MAX_CONCURRENT_PROCESSING: int = 2  # ffprobe / screenshots / sample (CPU)
+    MAX_CONCURRENT_UPLOADS: int = 3     # Telegram egress
+    MAX_FILES_PER_TASK: int = 2         # Files of ONE multi-file task in the pipeline at once
     STATUS_UPDATE_INTERVAL: int = 6   # Seconds
+    WORKER_PREFETCH: int = 1          # Extra tasks a node may claim beyond its free slots
+
+    # --- RELIABLE QUEUE (BLMOVE + Leases) ---
+    TASK_LEASE_TTL: int = 60          # Seconds a claimed task survives without heartbeat
+    QUEUE_REAPER_INTERVAL: int = 30   # Seconds between expired-lease sweeps
+    MAX_TASK_RETRIES: int = 3         # Lease expiries before a task goes to queue:dead
+
+    # --- WORKER FLEET (Multi-node) ---
+    WORKER_ID: str | None = None      # Unique node name (Default: SESSION_FILE@hostname)
+    NODE_HEARTBEAT_INTERVAL: int = 10 # Seconds between fleet heartbeats
+    NODE_TTL: int = 30                # Node is considered dead after this much silence
+    ENABLE_WORK_STEALING: bool = True # Idle nodes take waiting work off busy/dead nodes
+
+    # --- IN-FLIGHT DEDUP ---
+    ENABLE_INFLIGHT_DEDUP: bool = True  # Identical leeches share ONE download
+    INFLIGHT_SOURCE_TTL: int = 21600    # Safety expiry of a source claim (6h)
+
+    # --- LIBRARY DEDUP (Pre-download) ---
+    ENABLE_LIBRARY_DEDUP: bool = True   # Refuse leeches of content already in the library
+    LIBRARY_BLOOM_BITS: int = 16777216  # Bloom filter size (2MB, ~1M files @ <1% FP)
+
+    # --- SPECULATIVE LINK RESOLUTION ---
+    RESOLVE_LOOKAHEAD: int = 5          # Queued tasks pre-resolved ahead of their slot
+    RESOLVE_INTERVAL: int = 5           # Seconds between lookahead sweeps
+    RESOLVED_LINK_TTL: int = 600        # Assumed lifetime of a scraped direct link
+    RESOLVE_REFRESH_MARGIN: int = 60    # Re-scrape when less life than this is left
+    RESOLVER_THREADS: int = 8           # Thread pool for blocking host scrapers
+    RESOLVER_PER_HOST_LIMIT: int = 2    # Concurrent scrapes per file host
+    RESOLVER_TIMEOUT: int = 60          # Seconds before a scrape is abandoned
+    RESOLVER_REQUEST_TIMEOUT: int = 20  # Default timeout of each scraper HTTP call
+
+    # --- NATIVE HTTP ENGINE (Plain direct links) ---
+    HTTP_SEGMENTS: int = 8              # Parallel ranged connections per file
+    HTTP_PER_HOST_CONNECTIONS: int = 16 # Connection cap per host across all tasks
+    HTTP_MIN_SEGMENT_SIZE: int = 8388608  # Bytes; smaller files get fewer segments
+
+    # --- YT-DLP ENGINE PROFILES ---
+    YTDL_CONCURRENT_FRAGMENTS: int = 8  # HLS/DASH fragments downloaded in parallel
+    YTDL_ARIA2_EXTRACTORS: str = ""     # Comma list of extractor keys handed to aria2c
+    YTDL_PROCESS_ISOLATION: bool = False  # Run yt-dlp jobs in child processes (own GIL)
+    YTDL_PROCESSES: int = 4             # yt-dlp child processes alive at once
+    YTDL_PLAYLIST_PARALLEL: int = 2     # Playlist entries downloading at once (per task)
+    YTDL_PLAYLIST_LIMIT: int = 100      # Entries taken from one playlist/channel
+
+    # --- FORMAT POLICY (yt-dlp stream pick) ---
+    YTDL_MAX_HEIGHT: int = 1080         # The player streams 1080p; taller is wasted bytes
+    YTDL_VCODEC: str = "h264"           # Preferred codecs: direct browser playback
+    YTDL_ACODEC: str = "aac"
+    YTDL_MAX_FILESIZE: int = 4294967296 # Size ceiling per file in bytes (0 = none)
+    YTDL_TYPE_POLICIES: str = ""        # Per type: "anime:720,movie:1080:h264:aac:3000" (MB)
+
+    # --- DOWNLOAD ADMISSION (yt-dlp pre-pass) ---
+    YTDL_INFO_CACHE_TTL: int = 900      # Seconds an extract_info() result is reused
+    DISK_HEADROOM: int = 2147483648     # Bytes kept free for processing/screenshots
+
+    # --- TORRENT METADATA CACHE (Magnets skip the DHT/metadata phase) ---
+    TORRENT_CACHE_DIR: str = "/app/cache/torrents"  # <infohash>.torrent files
+    TORRENT_CACHE_GRIDFS: bool = False  # Also share them with the fleet via GridFS
+
+    # --- CRASH RESUME ---
+    RESUME_DOWNLOADS: bool = True       # Keep partial data of interrupted tasks across restarts
+    DOWNLOAD_GC_INTERVAL: int = 3600    # Seconds between sweeps of orphaned task dirs
 
     # --- HANDSHAKE & PERSISTENCE ---
     # Default is True for Cloud IDEs (Dev), set to False in Production for .session files
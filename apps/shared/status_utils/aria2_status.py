@@ -3,59 +3,73 @@ import logging
 
 from shared.ext_utils.status_utils import (
     MirrorStatus,
+    get_readable_file_size,
+    get_readable_time,
 )
 
 LOGGER = logging.getLogger("Aria2Status")
 
 
 class Aria2Status:
-    def __init__(self, gid, listener, aria2_instance):
-        self._gid = gid
+    def __init__(self, gid, listener):
+        self.aria2_gid = gid
         self._listener = listener
-        self._aria2 = aria2_instance  # Passed from the engine
-        self._info = None  # Holds the raw aria2 status object
+        # Raw tellStatus fields, pushed in by the async aria2 client.
+        # Reads below never touch the network (safe inside the event loop).
+        self._info = {}
+        self.on_metadata = None  # Async callback once a magnet's metadata arrived
         self.engine = "Aria2 v1.36.0"
 
-    def update(self):
-        """Syncs the internal info from Aria2 daemon."""
+    @property
+    def listener(self):
+        return self._listener
+
+    def apply(self, info: dict):
+        """Stores a fresh tellStatus snapshot (called by the aria2 client)."""
+        if info:
+            self._info = info
+
+    def _int(self, key) -> int:
         try:
-            self._info = self._aria2.get_download(self._gid)
-            if self._info.followed_by:
-                # Handle Metadata -> Torrent handover
-                self._gid = self._info.followed_by[0].gid
-                self._info = self._aria2.get_download(self._gid)
-        except:
-            pass
+            return int(self._info.get(key, 0))
+        except (TypeError, ValueError):
+            return 0
 
     def progress(self):
-        self.update()
-        return f"{self._info.progress:.2f}%" if self._info else "0%"
+        total = self._int("totalLength")
+        if not total:
+            return "0%"
+        return f"{self._int('completedLength') * 100 / total:.2f}%"
 
     def update_progress(self, current, total, status=None):
         """Standardized update call used during Upload phase."""
         # For Aria2, we only need this during upload because download
-        # is handled by the internal .update() loop.
+        # is handled by the aria2 client.
         if status == MirrorStatus.STATUS_UPLOADING:
             # Logic to override aria2 stats with upload stats
             # (Mirroring the YtDlpStatus logic above)
             pass
 
     def speed(self):
-        return f"{self._info.download_speed_string()}/s" if self._info else "0B/s"
+        return f"{get_readable_file_size(self._int('downloadSpeed'))}/s"
 
     def processed_bytes(self):
-        return self._info.completed_length_string() if self._info else "0B"
+        return get_readable_file_size(self._int("completedLength"))
 
     def size(self):
-        return self._info.total_length_string() if self._info else "0B"
+        return get_readable_file_size(self._int("totalLength"))
 
     def eta(self):
-        return self._info.eta_string() if self._info else "∞"
+        speed = self._int("downloadSpeed")
+        if not speed:
+            return "∞"
+        left = self._int("totalLength") - self._int("completedLength")
+        return get_readable_time(left // speed)
 
     def status(self):
-        if not self._info:
+        state = self._info.get("status")
+        if not state:
             return MirrorStatus.STATUS_QUEUEDL
-        state = self._info.status
         if state == "active":
             return MirrorStatus.STATUS_DOWNLOADING
         if state == "waiting":
@@ -0,0 +1,10 @@
+# apps/shared/status_utils/http_status.py
+from shared.status_utils.yt_dlp_status import YtDlpStatus
+
+
+class HttpStatus(YtDlpStatus):
+    """Same numbers + UI as YtDlpStatus; fed by the segmented HTTP engine."""
+
+    def __init__(self, listener, obj, gid):
+        super().__init__(listener, obj, gid)
+        self.engine = "HTTP Segmented"
@@ -18,6 +18,10 @@ class YtDlpStatus:
         self.total_bytes = 0
         self.speed_raw = 0
         self.eta_raw = 0
+        self.fragment_index = 0  # HLS/DASH position (0 = not fragmented)
+        self.fragment_count = 0
+        self.entries_done = 0  # Playlist fan-out (0 total = single video)
+        self.entries_total = 0
 
         # ✅ Stats for Upload (via update_progress)
         self._tracker = None
@@ -38,8 +42,21 @@ class YtDlpStatus:
         if self.total_bytes > 0:
             pct = (self.downloaded_bytes / self.total_bytes) * 100
             return f"{pct:.2f}%"
+        if self.fragment_count:
+            # Live-ish streams give no byte total, but count fragments
+            return f"{self.fragment_index * 100 / self.fragment_count:.2f}%"
         return "0%"
 
+    def entries(self):
+        if not self.entries_total:
+            return ""
+        return f"{self.entries_done}/{self.entries_total}"
+
+    def fragments(self):
+        if not self.fragment_count:
+            return ""
+        return f"{self.fragment_index}/{self.fragment_count}"
+
     def speed(self):
         return f"{get_readable_file_size(self.speed_raw)}/s"
 
@@ -83,6 +100,8 @@ class YtDlpStatus:
             "size": self.size(),
             "speed": self.speed(),
             "eta": self.eta(),
+            "fragments": self.fragments(),
+            "entries": self.entries(),
             "user_tag": self._listener.user_tag,
             "engine": self.engine,
         }
@@ -0,0 +1,114 @@
+# apps/shared/task_envelope.py
+import time
+
+from pydantic import BaseModel, Field
+
+# Bump when a field changes meaning. Older workers refuse newer envelopes.
+ENVELOPE_VERSION = 1
+
+# Legacy wire format (pre-envelope):
+# task_id|tmdb_id|url|type|name|user_id|origin_chat_id|user_tag|trigger_msg_id
+_LEGACY_FIELDS = 9
+
+
+class TaskStage:
+    """Checkpoints a task passes through (stored in the envelope)."""
+
+    QUEUED = "queued"
+    DOWNLOADING = "downloading"
+    PROCESSING = "processing"
+    UPLOADING = "uploading"
+
+
+class ResolvedFile(BaseModel):
+    """One file of a multi-file (folder) resolver result."""
+
+    url: str
+    filename: str = ""
+    path: str = ""  # Sub-folder inside the task directory
+
+
+class ResolvedLink(BaseModel):
+    """Direct-link hint produced by the resolver (skips re-scraping)."""
+
+    url: str
+    headers: list[str] = []  # Raw "Name: value" lines for the engine
+    expires_at: float = 0  # Unix time, 0 = unknown
+    title: str = ""  # Folder name of a multi-file result
+    files: list[ResolvedFile] = []  # Non-empty = folder (url keeps the source)
+
+
+class TaskEnvelope(BaseModel):
+    """
+    The ONE shape a leech task has on the wire (queue:leech & friends).
+    Producers build it, consumers decode it once and pass the object around.
+    Encoded as compact JSON so URLs/names containing '|' survive intact.
+    """
+
+    v: int = ENVELOPE_VERSION
+    task_id: str
+    url: str
+    tmdb_id: int = 0
+    type_hint: str = "auto"
+    name_hint: str = ""
+    user_id: str = "0"
+    origin_chat_id: int = 0  # 0 = Fallback to Log Channel
+    user_tag: str = "User"
+    trigger_msg_id: str = ""
+    source_key: str = ""  # Normalized URL/infohash (In-flight dedup)
+
+    # --- Scheduling ---
+    priority: int = 0  # > 0 jumps the queue
+    retries: int = 0  # Bumped every time a lease expires and the task is requeued
+    stage: str = TaskStage.QUEUED
+    resolved: ResolvedLink | None = None
+    created_at: float = Field(default_factory=time.time)
+
+    def encode(self) -> str:
+        return self.model_dump_json(exclude_none=True)
+
+    @classmethod
+    def decode(cls, raw: str) -> "TaskEnvelope":
+        """Parses a queue payload. Raises ValueError on garbage."""
+        raw = raw.strip()
+        if raw.startswith("{"):
+            env = cls.model_validate_json(raw)
+            if env.v > ENVELOPE_VERSION:
+                raise ValueError(f"Unsupported envelope version v{env.v}")
+            return env
+        return cls._from_legacy(raw)
+
+    @classmethod
+    def _from_legacy(cls, raw: str) -> "TaskEnvelope":
+        """Reads old pipe-delimited payloads still parked in Redis."""
+        parts = [p.strip() for p in raw.split("|", _LEGACY_FIELDS - 1)]
+        if len(parts) < 3 or not parts[0]:
+            raise ValueError(f"Malformed legacy payload: {raw[:60]}")
+        parts += [""] * (_LEGACY_FIELDS - len(parts))
+        (
+            task_id,
+            tmdb_id,
+            url,
+            type_hint,
+            name_hint,
+            user_id,
+            origin_chat_id,
+            user_tag,
+            trigger_msg_id,
+        ) = parts
+        return cls(
+            task_id=task_id,
+            url=url,
+            tmdb_id=int(tmdb_id) if tmdb_id.isdigit() else 0,
+            type_hint=type_hint or "auto",
+            name_hint=name_hint,
+            user_id=user_id or "0",
+            # origin_chat_id must handle the '-' sign for channel IDs
+            origin_chat_id=(
+                int(origin_chat_id)
+                if origin_chat_id.lstrip("-").isdigit()
+                else 0
+            ),
+            user_tag=user_tag or "User",
+            trigger_msg_id=trigger_msg_id,
+        )
@@ -0,0 +1,342 @@
+# apps/shared/task_queue.py
+import logging
+
+from shared.settings import settings
+from shared.task_envelope import TaskEnvelope, TaskStage
+
+logger = logging.getLogger("TaskQueue")
+
+# --- REDIS KEYS (Shared by Manager & Workers) ---
+LEECH_QUEUE = "queue:leech"  # Producers LPUSH, workers pop from the RIGHT
+PROCESSING_PREFIX = "queue:processing:"  # One list per worker node
+INCOMPLETE_QUEUE = "queue:incomplete"  # Parked tasks awaiting the Recovery Menu
+DEAD_QUEUE = "queue:dead"  # Tasks that kept killing their worker (MAX_TASK_RETRIES)
+LEASE_PREFIX = "lease:"  # lease:{task_id} -> node_id (TTL = heartbeat)
+KILL_CHANNEL = "kill_signals"  # Pub/Sub: manager publishes task_ids to cancel
+ACTIVE_COUNTS = "queue:active"  # HASH node_id -> tasks claimed (slot accounting)
+
+# Atomic hand-back: only moves the entry if it is STILL in the source list.
+# Prevents double-requeue when two reapers race on the same dead node.
+# ARGV[2] is the (possibly re-encoded) payload that lands in the target.
+# ARGV[3] is the node owning KEYS[1] (gives its slot back in KEYS[4]).
+_MOVE_BACK_LUA = """
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) > 0 then
+    redis.call('RPUSH', KEYS[2], ARGV[2])
+    redis.call('DEL', KEYS[3])
+    redis.call('HINCRBY', KEYS[4], ARGV[3], -1)
+    return 1
+end
+return 0
+"""
+
+# In-place swap of a processing entry (stage checkpoints)
+_SWAP_LUA = """
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) > 0 then
+    redis.call('LPUSH', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# Lease renewal that never overwrites ANOTHER node's lease.
+# Returns the task_ids whose lease now belongs to someone else (stolen/reaped).
+_RENEW_LUA = """
+local lost = {}
+for i, key in ipairs(KEYS) do
+    local owner = redis.call('GET', key)
+    if owner == false or owner == ARGV[1] then
+        redis.call('SET', key, ARGV[1], 'EX', ARGV[2])
+    else
+        table.insert(lost, ARGV[i + 2])
+    end
+end
+return lost
+"""
+
+# Ack: drop our entry (+ free its slot), and the lease only if it is still ours
+_ACK_LUA = """
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) > 0 then
+    redis.call('HINCRBY', KEYS[3], ARGV[2], -1)
+end
+if redis.call('GET', KEYS[2]) == ARGV[2] then
+    redis.call('DEL', KEYS[2])
+end
+return 1
+"""
+
+# Work stealing: move ONE entry from a victim's processing list into ours
+# and take over its lease. Fails if the victim started/acked it meanwhile
+# (its checkpoint rewrote the entry, so LREM finds nothing).
+# ARGV[6] == '1' -> started entry: only taken once its lease is gone, the
+# same rule reap() follows (a missed heartbeat alone is not death).
+_STEAL_LUA = """
+if ARGV[6] == '1' and redis.call('EXISTS', KEYS[3]) == 1 then
+    return 0
+end
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) > 0 then
+    redis.call('LPUSH', KEYS[2], ARGV[2])
+    redis.call('SET', KEYS[3], ARGV[3], 'EX', ARGV[4])
+    redis.call('HINCRBY', KEYS[4], ARGV[5], -1)
+    redis.call('HINCRBY', KEYS[4], ARGV[3], 1)
+    return 1
+end
+return 0
+"""
+
+
+def task_id_of(payload: str) -> str:
+    """Extracts the task_id from a queued payload (envelope or legacy)."""
+    try:
+        return TaskEnvelope.decode(payload).task_id
+    except ValueError:
+        return payload.split("|", 1)[0].strip()
+
+
+async def enqueue(redis, envelope: TaskEnvelope):
+    """Pushes a task. Priority tasks go to the pop end (served next)."""
+    if envelope.priority > 0:
+        return await redis.rpush(LEECH_QUEUE, envelope.encode())
+    return await redis.lpush(LEECH_QUEUE, envelope.encode())
+
+
+def lease_key(task_id: str) -> str:
+    return f"{LEASE_PREFIX}{task_id}"
+
+
+class ReliableQueue:
+    """
+    Redis-Native At-Least-Once Queue (BLMOVE + Leases).
+
+    1. claim(): BLMOVE the oldest task into this node's processing list
+       and take a lease on it.
+    2. renew(): Heartbeat that keeps leases of in-flight tasks alive.
+    3. ack(): Task handled (success OR known failure) -> drop it for good.
+    4. reap(): Hands back tasks whose lease expired (crashed/hung node).
+    5. steal(): Idle node takes not-yet-started work off busy or dead nodes.
+    """
+
+    def __init__(self, redis, node_id: str, lease_ttl: int = 60):
+        self.redis = redis
+        self.node_id = node_id
+        self.lease_ttl = lease_ttl
+        self.processing_key = f"{PROCESSING_PREFIX}{node_id}"
+        self._move_back = redis.register_script(_MOVE_BACK_LUA)
+        self._swap = redis.register_script(_SWAP_LUA)
+        self._renew = redis.register_script(_RENEW_LUA)
+        self._ack = redis.register_script(_ACK_LUA)
+        self._steal = redis.register_script(_STEAL_LUA)
+        # Entries seen without a lease on the previous sweep.
+        # A task must be lease-less on TWO sweeps before we take it back,
+        # which covers the tiny gap between BLMOVE and SET lease in claim().
+        self._suspects = set()
+
+    async def claim(self, block: int = 1):
+        """Blocks up to `block`s for a task. Returns the payload or None."""
+        payload = await self.redis.blmove(
+            LEECH_QUEUE, self.processing_key, block, "RIGHT", "LEFT"
+        )
+        if payload:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(lease_key(task_id_of(payload)), self.node_id, ex=self.lease_ttl)
+                pipe.hincrby(ACTIVE_COUNTS, self.node_id, 1)
+                await pipe.execute()
+        return payload
+
+    async def renew(self, task_ids) -> list:
+        """
+        Extends the lease of every in-flight task in ONE round trip.
+        Returns the task_ids another node has taken over since the last beat.
+        """
+        task_ids = list(task_ids)
+        if not task_ids:
+            return []
+        return await self._renew(
+            keys=[lease_key(t) for t in task_ids],
+            args=[self.node_id, self.lease_ttl, *task_ids],
+        )
+
+    async def checkpoint(self, payload: str, envelope: TaskEnvelope):
+        """
+        Rewrites our processing entry with the updated envelope (e.g. new stage).
+        Returns the payload that is now stored (needed for ack()),
+        or None if the entry is gone from our list (stolen / reaped).
+        """
+        new_payload = envelope.encode()
+        if new_payload == payload:
+            return payload
+        swapped = await self._swap(
+            keys=[self.processing_key], args=[payload, new_payload]
+        )
+        return new_payload if swapped else None
+
+    async def ack(self, payload: str):
+        """Removes a finished task from the processing list and drops its lease."""
+        await self._ack(
+            keys=[self.processing_key, lease_key(task_id_of(payload)), ACTIVE_COUNTS],
+            args=[payload, self.node_id],
+        )
+
+    async def sync_active(self, count: int):
+        """Re-asserts our slot count from local truth (heals any drift)."""
+        await self.redis.hset(ACTIVE_COUNTS, self.node_id, count)
+
+    async def steal(self, alive: dict, limit: int) -> list:
+        """
+        Takes up to `limit` tasks off other nodes' processing lists.
+        `alive` maps live node_id -> number of claimed-but-waiting tasks.
+        - Live nodes: only entries still in the QUEUED stage (never started).
+        - Dead nodes (no heartbeat): anything whose lease expired too,
+          counted as a retry like reap().
+        Returns the payloads now sitting in OUR processing list.
+        """
+        stolen = []
+        async for key in self.redis.scan_iter(match=f"{PROCESSING_PREFIX}*"):
+            victim = key[len(PROCESSING_PREFIX) :]
+            dead = victim not in alive
+            if victim == self.node_id or (not dead and not alive[victim]):
+                continue  # Ourselves, or a live node with nothing waiting
+
+            # Oldest claims sit at the RIGHT end (claim() pushes LEFT)
+            for payload in reversed(await self.redis.lrange(key, 0, -1)):
+                if len(stolen) >= limit:
+                    return stolen
+                try:
+                    envelope = TaskEnvelope.decode(payload)
+                except ValueError:
+                    continue  # Left for the reaper to bury
+                if dead:
+                    envelope.retries += 1
+                    if envelope.retries > settings.MAX_TASK_RETRIES:
+                        continue
+                elif envelope.stage != TaskStage.QUEUED:
+                    continue
+
+                started = envelope.stage != TaskStage.QUEUED
+                new_payload = envelope.encode()
+                taken = await self._steal(
+                    keys=[
+                        key,
+                        self.processing_key,
+                        lease_key(envelope.task_id),
+                        ACTIVE_COUNTS,
+                    ],
+                    args=[
+                        payload,
+                        new_payload,
+                        self.node_id,
+                        self.lease_ttl,
+                        victim,
+                        int(started),
+                    ],
+                )
+                if taken:
+                    stolen.append(new_payload)
+                    logger.info(
+                        f"🤝 Stole {envelope.task_id} from {'dead' if dead else 'busy'} node {victim}"
+                    )
+        return stolen
+
+    async def park_stale(self):
+        """
+        Startup Recovery: Anything left in OUR processing list belongs to the
+        previous incarnation of this node. Park it for the Recovery Menu.
+        """
+        parked = []
+        for payload in await self.redis.lrange(self.processing_key, 0, -1):
+            moved = await self._move_back(
+                keys=[
+                    self.processing_key,
+                    INCOMPLETE_QUEUE,
+                    lease_key(task_id_of(payload)),
+                    ACTIVE_COUNTS,
+                ],
+                args=[payload, payload, self.node_id],
+            )
+            if moved:
+                parked.append(payload)
+        # Fresh incarnation: nothing is claimed by us yet
+        await self.sync_active(0)
+        return parked
+
+    async def reap(self, skip=(), on_bury=None):
+        """
+        Requeues tasks whose lease expired on ANY node.
+        `skip` holds task_ids this node is still running locally.
+        `on_bury(task_id)` is awaited for every task sent to the dead queue.
+        Returns the number of tasks handed back to queue:leech.
+        """
+        requeued = 0
+        suspects = set()
+
+        async for key in self.redis.scan_iter(match=f"{PROCESSING_PREFIX}*"):
+            for payload in await self.redis.lrange(key, 0, -1):
+                task_id = task_id_of(payload)
+                if task_id in skip or await self.redis.exists(lease_key(task_id)):
+                    continue
+
+                marker = (key, payload)
+                if marker not in self._suspects:
+                    suspects.add(marker)
+                    continue
+
+                # Count the attempt. A task that keeps killing nodes gets buried.
+                target, new_payload = LEECH_QUEUE, payload
+                try:
+                    envelope = TaskEnvelope.decode(payload)
+                    envelope.retries += 1
+                    new_payload = envelope.encode()
+                    if envelope.retries > settings.MAX_TASK_RETRIES:
+                        target = DEAD_QUEUE
+                except ValueError:
+                    target = DEAD_QUEUE
+
+                # RPUSH -> The task is the NEXT one popped (it already waited once)
+                moved = await self._move_back(
+                    keys=[key, target, lease_key(task_id), ACTIVE_COUNTS],
+                    args=[payload, new_payload, key[len(PROCESSING_PREFIX) :]],
+                )
+                if moved and target == LEECH_QUEUE:
+                    requeued += 1
+                    logger.warning(
+                        f"♻️ Lease expired for {task_id} on {key.split(':')[-1]}. Requeued."
+                    )
+                elif moved:
+                    logger.error(f"⚰️ Task {task_id} moved to {DEAD_QUEUE}.")
+                    if on_bury:
+                        await on_bury(task_id)
+
+        self._suspects = suspects
+        return requeued
+
+
+# --- RECOVERY STORE HELPERS (Used by Recovery Menu on Worker & Manager) ---
+async def list_incomplete(redis):
+    return await redis.lrange(INCOMPLETE_QUEUE, 0, -1)
+
+
+async def list_processing(redis) -> list:
+    """Payloads claimed by ANY node (every queue:processing:<node> list)."""
+    payloads = []
+    async for key in redis.scan_iter(match=f"{PROCESSING_PREFIX}*"):
+        payloads += await redis.lrange(key, 0, -1)
+    return payloads
+
+
+async def remove_queued(redis, task_id: str) -> bool:
+    """Drops a task that no worker has claimed yet (cancelled while waiting)."""
+    for payload in await redis.lrange(LEECH_QUEUE, 0, -1):
+        if task_id_of(payload) == task_id:
+            return bool(await redis.lrem(LEECH_QUEUE, 1, payload))
+    return False
+
+
+async def resume_incomplete(redis, task_id: str = None) -> int:
+    """Moves parked tasks (all, or a single task_id) back into queue:leech."""
+    resumed = 0
+    for payload in await list_incomplete(redis):
+        if task_id and task_id_of(payload) != task_id:
+            continue
+        if await redis.lrem(INCOMPLETE_QUEUE, 1, payload):
+            await redis.rpush(LEECH_QUEUE, payload)
+            resumed += 1
+    return resumed
@@ -1,14 +1,21 @@
 # apps/worker-video/handlers/download_manager.py
 import logging
 
-import aria2p
+from services.disk_budget import disk_budget
+from services.link_resolver import LinkResolver
 
 from handlers.mirror_leech_utils.download_utils.aria2_download import add_aria2_download
-from handlers.mirror_leech_utils.download_utils.direct_link_generator import (
-    direct_link_generator,
+from handlers.mirror_leech_utils.download_utils.http_download import (
+    HttpDownloader,
+    looks_direct,
 )
-from handlers.mirror_leech_utils.download_utils.yt_dlp_download import YtDlpHelper
+from handlers.mirror_leech_utils.download_utils.yt_dlp_download import (
+    YtDlpHelper,
+    info_sizes,
+)
+from shared.ext_utils.exceptions import LinkRejectedException
 from shared.settings import settings
+from shared.tg_client import TgClient
 
 logger = logging.getLogger("DownloadManager")
 
@@ -16,46 +23,91 @@ logger = logging.getLogger("DownloadManager")
 class DownloadManager:
     def __init__(self, redis):
         self.redis = redis
-        # Re-use global aria2 instance for the engines
-        self.aria2 = aria2p.API(
-            aria2p.Client(host="http://localhost", port=6800, secret="")
-        )
 
-    async def start(self, listener):
-        """Analyzes URL and dispatches to the correct WZML-style helper."""
+    @staticmethod
+    def _is_torrent(url: str) -> bool:
+        return url.startswith(("magnet:", "bc:")) or url.endswith(".torrent")
+
+    async def preflight(self, listener):
+        """
+        Admission before a download slot is committed. Sites that go straight
+        to yt-dlp get their extract_info pre-pass now (cached for the download):
+        files Telegram can't take fail fast, the rest reserve their disk space.
+        """
         url = listener.url
-        listener.aria2_instance = self.aria2  # Inject instance
-
-        # 1. Bypass Check: Skip generator for YouTube and other streaming sites
-        streaming_hosts = [
-            "youtube.com",
-            "youtu.be",
-            "twitter.com",
-            "x.com",
-            "instagram.com",
-            "tiktok.com",
-        ]
-
-        if not any(x in url for x in streaming_hosts):
-            try:
-                # Only try bypassing for file-hosting links
-                url = direct_link_generator(url)
-                if isinstance(url, tuple):
-                    url = url[0]  # Handle (link, header) tuples
-                logger.info(f"🔗 URL Bypassed: {listener.task_id}")
-            except Exception as e:
-                logger.info(f"ℹ️ Direct Link Generator skipped: {e}")
-
-        # 2. Selection Logic
-        is_torrent = url.startswith(("magnet:", "bc:")) or url.endswith(".torrent")
-
-        if is_torrent:
-            # Torrent -> Aria2
-            return await add_aria2_download(listener, url, listener.dir)
-        else:
-            # Everything else -> YT-DLP (Handles direct files and sites)
-            # WZML-X uses YT-DLP as a robust fallback for raw links too
+        if self._is_torrent(url) or looks_direct(url) or LinkResolver.needs_resolution(url):
+            return  # Size only known once the engine/probe talks to the host
+        info = await YtDlpHelper(listener).extract_info(url)
+        if not info:
+            return
+        total, largest = info_sizes(info)
+        if largest > TgClient.MAX_SPLIT_SIZE:
+            raise Exception(
+                f"❌ File is {largest // 1048576} MB; Telegram uploads stop at {TgClient.MAX_SPLIT_SIZE // 1048576} MB."
+            )
+        await disk_budget.reserve(listener, total)
+
+    async def start(self, listener, on_entry=None):
+        """
+        Analyzes URL and dispatches to the correct WZML-style helper.
+        `on_entry(index, count, path)`: playlists hand over every finished entry.
+        """
+        resolver = LinkResolver(self.redis)
+
+        # 1. Bypass: Use the link the resolver scraped while we waited for a
+        # slot (envelope.resolved) or a cached one. Only scrapes if stale.
+        resolved = await resolver.get(listener.envelope)
+        try:
+            return await self._dispatch(listener, resolved, on_entry)
+        except LinkRejectedException:
+            if not self._scraped(listener, resolved):
+                raise  # Nothing cached to blame: the source itself is dead
+
+        # 2. The host revoked the cached link (403/410): re-scrape ONCE
+        await resolver.invalidate(listener.envelope)
+        fresh = await resolver.resolve(listener.url, fresh=True)
+        await resolver.store(listener.task_id, fresh)
+        listener.envelope.resolved = fresh
+        return await self._dispatch(listener, fresh, on_entry)
+
+    @staticmethod
+    def _scraped(listener, resolved) -> bool:
+        return bool(resolved and (resolved.files or resolved.url != listener.url))
+
+    async def _dispatch(self, listener, resolved, on_entry=None):
+        url, headers = listener.url, []
+        if self._scraped(listener, resolved):
+            logger.info(f"🔗 URL Bypassed: {listener.task_id}")
+            url, headers = resolved.url, resolved.headers
+
+        if resolved and resolved.files:
+            # Folder result (gofile, mediafire, linkbox...): every file, intact
             yt_helper = YtDlpHelper(listener)
-            # Use name_hint if provided to force filename
-            filename = f"{listener.name_hint}.mp4" if listener.name_hint else None
-            return await yt_helper.add_download(url, listener.dir, filename)
+            return await yt_helper.add_files(
+                resolved.files, listener.dir, resolved.title, headers=headers
+            )
+
+        # Selection Logic
+        if self._is_torrent(url):
+            # Torrent -> Aria2
+            return await add_aria2_download(listener, url, listener.dir, headers=headers)
+
+        if self._scraped(listener, resolved) or looks_direct(url):
+            # Plain file -> native segmented engine (probe says if it really is one)
+            http = HttpDownloader(listener)
+            if info := await http.probe(url, headers=headers):
+                await disk_budget.reserve(listener, info["size"])
+                return await http.add_download(info, listener.dir, listener.name_hint)
+            # HTML page / playlist / probe failed -> yt-dlp below
+
+        # Everything else -> YT-DLP (Handles streaming sites and odd links)
+        # WZML-X uses YT-DLP as a robust fallback for raw links too
+        yt_helper = YtDlpHelper(listener)
+        if on_entry:
+            # Playlist/channel -> entries fan out (pre-pass is cached: no re-extract)
+            info = await yt_helper.extract_info(url, headers)
+            if info and info.get("_type") == "playlist":
+                return await yt_helper.add_playlist(info, listener.dir, on_entry)
+        # Use name_hint if provided to force filename
+        filename = f"{listener.name_hint}.mp4" if listener.name_hint else None
+        return await yt_helper.add_download(url, listener.dir, filename, headers=headers)
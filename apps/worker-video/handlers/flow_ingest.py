@@ -1,10 +1,13 @@
 # apps/worker-video/handlers/flow_ingest.py (formerly leech.py)
+import asyncio
+import contextlib
 import logging
 import os
 import re
 import sys
 import time
 import uuid
+from collections import defaultdict
 
 import PTN
 
@@ -14,16 +17,81 @@ from pyrogram.file_id import FileId
 from pyrogram.types import InputMediaPhoto, InputMediaVideo
 from services.metadata_service import MetadataService
 
+from handlers.kill_switch import kill_switch
 from handlers.processor import processor
 from shared.database import db_service
 from shared.formatter import formatter
-from shared.progress import TaskProgress
+from shared.library_index import fingerprints, library_index, release_key
 from shared.registry import MirrorStatus, task_dict, task_dict_lock
 from shared.settings import settings
 from shared.tg_client import TgClient
 
 logger = logging.getLogger("Leecher")
 
+# Seconds between upload progress side effects (registry update, terminal log)
+PROGRESS_INTERVAL = 1.0
+
+
+class LeechJob:
+    """
+    Per-task state for the Process -> Upload -> Index flow.
+    Travels between pipeline stages so concurrent tasks never share state.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        tmdb_id: int,
+        type_hint: str = "auto",
+        task_id: str = None,
+        user_id: str = "0",
+        notify_chat: int = None,
+        trigger_msg_id: str = None,
+        user_tag: str = "User",
+        name_hint: str = "",
+        envelope=None,
+        part: int = 1,
+        parts: int = 1,
+        batch: dict = None,
+        episode: int = None,
+    ):
+        # --- Inputs ---
+        self.file_path = file_path
+        self.tmdb_id = tmdb_id
+        self.type_hint = type_hint
+        self.task_id = task_id
+        self.user_id = user_id
+        self.notify_chat = notify_chat
+        self.trigger_msg_id = trigger_msg_id
+        self.user_tag = user_tag
+        self.name_hint = name_hint
+        self.envelope = envelope  # TaskEnvelope (for stage checkpoints)
+        # --- Multi-file tasks (season packs, folders, torrents) ---
+        self.part = part  # 1-based index of this file in its task
+        self.parts = parts
+        self.batch = batch  # {part: [uploaded, size]} shared by the task's jobs
+        self.episode = episode  # Playlist index (used when the name carries none)
+
+        # --- Filled by MediaLeecher.prepare() ---
+        self.file_name = os.path.basename(file_path)
+        self.branded_name = self.file_name
+        self.db_item = {}
+        self.meta = {}
+        self.caption = ""
+        self.buttons = None
+        self.screenshots = []
+        self.sample_path = None
+        self.cleanup_targets = [file_path]
+
+        # --- Filled by MediaLeecher.upload() ---
+        self.msg_link = "#"
+        self.last_terminal_pct = -1
+        self.last_progress_at = 0.0  # monotonic() of the last progress side effect
+        self.is_cancelled = False
+        self.success = False
+        # Resolved (with self.success) once the job has left the pipeline
+        self.done = asyncio.get_running_loop().create_future()
+
 
 class MediaLeecher:
     def __init__(self, client, db, redis=None):
@@ -31,8 +99,9 @@ class MediaLeecher:
         self.db = db
         # Use passed redis, fallback to shared service singleton
         self.redis = redis or db_service.redis
-        self.last_edit_time = 0  # <--- Track time for throttling
-        self.is_cancelled = False
+        # NOTE: No per-task state lives here. Concurrent tasks each carry a LeechJob.
+        # One DB lookup/insert per title at a time (parallel files of a pack)
+        self._title_locks = defaultdict(asyncio.Lock)
 
         # ✨ CLEAN CONFIG USAGE
         self.tmdb_api_key = settings.TMDB_API_KEY
@@ -92,44 +161,53 @@ class MediaLeecher:
 
         return s_num, e_num, {}
 
-    async def upload_progress(self, current, total):
-        if total <= 0:
+    async def upload_progress(self, current, total, job):
+        """
+        Runs for EVERY part Pyrogram sends, so it must stay I/O free.
+        Kill checks hit a local flag (set by the pub/sub Kill Switch) and the
+        UI/terminal side effects are throttled to one per PROGRESS_INTERVAL.
+        """
+        # 1. MID-UPLOAD KILL SWITCH (Pyrogram Native) ---
+        if kill_switch.is_killed(job.task_id):
+            logger.warning(f"🛑 Kill signal received during upload for {job.task_id}!")
+            # This is the official way to stop Pyrogram without socket errors
+            raise StopTransmission("ABORTED_BY_SIGNAL")
+
+        # 2. THROTTLE: Skip side effects between ticks (the final part always counts)
+        now = time.monotonic()
+        if total <= 0 or (
+            current < total and now - job.last_progress_at < PROGRESS_INTERVAL
+        ):
             return
+        job.last_progress_at = now
+
+        # 2.5 AGGREGATE: Files of one task upload in parallel -> one progress bar
+        if job.batch is not None:
+            job.batch[job.part] = [current, total]
+            current = sum(done for done, _ in job.batch.values())
+            total = sum(size for _, size in job.batch.values())
+
+        # 3. Update SHARED REGISTRY (For StatusManager UI)
+        task = task_dict.get(job.task_id)
+        if task:
+            # WZML-X Logic: Inject progress into the Status Object
+            if hasattr(task, "update_progress"):
+                task.update_progress(
+                    current, total, status=MirrorStatus.STATUS_UPLOADING
+                )
+            elif hasattr(task, "status_obj") and task.status_obj:
+                task.status_obj.update_progress(
+                    current, total, status=MirrorStatus.STATUS_UPLOADING
+                )
 
-        # 1. Always update Redis (for the /status command)
-        if hasattr(self, "current_task_id") and self.current_task_id:
-            # 2. Update SHARED REGISTRY (For StatusManager UI)
-            task = task_dict.get(self.current_task_id)
-            if task:
-                # WZML-X Logic: Inject progress into the Status Object
-                if hasattr(task, "update_progress"):
-                    task.update_progress(
-                        current, total, status=MirrorStatus.STATUS_UPLOADING
-                    )
-                elif hasattr(task, "status_obj") and task.status_obj:
-                    task.status_obj.update_progress(
-                        current, total, status=MirrorStatus.STATUS_UPLOADING
-                    )
-
-                # Terminal Heartbeat (Every 20%)
-                pct_int = int(current * 100 / total)
-                if pct_int % 20 == 0 and pct_int != getattr(
-                    self, "_last_terminal_pct", -1
-                ):
-                    self._last_terminal_pct = pct_int
-                    ui = task.get_ui_dict()
-                    logger.info(
-                        f"📤 [UPLOAD] {pct_int}% | {ui['speed']} | ETA: {ui['eta']} | ID: {self.current_task_id}"
-                    )
-
-            # 4. MID-UPLOAD KILL SWITCH (Pyrogram Native) ---
-            kill_check = await self.redis.get(f"kill_signal:{self.current_task_id}")
-            if kill_check:
-                logger.warning(
-                    f"🛑 Kill signal received during upload for {self.current_task_id}!"
+            # Terminal Heartbeat (Every 20%)
+            pct_int = int(current * 100 / total)
+            if pct_int // 20 != job.last_terminal_pct // 20:
+                job.last_terminal_pct = pct_int
+                ui = task.get_ui_dict()
+                logger.info(
+                    f"📤 [UPLOAD] {pct_int}% | {ui['speed']} | ETA: {ui['eta']} | ID: {job.task_id}"
                 )
-                # This is the official way to stop Pyrogram without socket errors
-                raise StopTransmission("ABORTED_BY_SIGNAL")
 
     async def upload_and_sync(
         self,
@@ -143,90 +221,105 @@ class MediaLeecher:
         user_tag: str = "User",
         name_hint: str = "",
     ):
-        # SAFETY INIT: Variables must exist before TRY block
-        self.current_task_id = task_id
-        self.current_user_id = user_id
-        self.current_user_tag = user_tag  # Store for notifications
-        self.trigger_msg_id = trigger_msg_id
-        # Use origin if provided, fallback to default log channel
-        self.notify_chat = origin_chat_id or self.log_channel
-        self.is_cancelled = False  # Reset state
+        """One-shot flow (Process -> Upload -> Index) for callers without a pipeline."""
+        job = LeechJob(
+            file_path=file_path,
+            tmdb_id=tmdb_id,
+            type_hint=type_hint,
+            task_id=task_id,
+            user_id=user_id,
+            notify_chat=origin_chat_id or self.log_channel,
+            trigger_msg_id=trigger_msg_id,
+            user_tag=user_tag,
+            name_hint=name_hint,
+        )
+        try:
+            if await self.prepare(job):
+                await self.upload(job)
+        finally:
+            await self.finalize(job)
+        return job.success
+
+    async def _library_item(self, tmdb_id, type_hint, file_name) -> dict:
+        """Library document for the title (created from TMDB/Jikan if new)."""
+        # We create a query that respects the user's intent (Movie vs TV)
+        query = {"$or": [{"tmdb_id": int(tmdb_id)}, {"mal_id": int(tmdb_id)}]}
+
+        if type_hint in ["movie", "film"]:
+            query["media_type"] = {"$in": ["movie", "anime_movie"]}
+        elif type_hint in ["tv", "series", "show", "anime", "mal"]:
+            query["media_type"] = {"$in": ["tv", "series", "anime"]}
+
+        db_item = await self.db.library.find_one(query)
 
-        current_file_path = file_path
-        cleanup_targets = [file_path]
+        # 3. METADATA FETCHING (The Enriched Version)
+        if not db_item:
+            logger.info(
+                f"⚠️ Metadata not in DB for ID {tmdb_id} ({type_hint}). Fetching from API..."
+            )
 
-        # Initialize Tracker
-        file_size = os.path.getsize(file_path)
-        self.upload_tracker = TaskProgress(file_size)
+            # Route to correct Service method
+            if type_hint in ["anime", "mal"]:
+                meta_from_api = await self.meta_service.fetch_jikan_anime(int(tmdb_id))
+            elif type_hint in ["movie", "film"]:
+                meta_from_api = await self.meta_service.fetch_tmdb_movie(int(tmdb_id))
+            else:  # tv, series, show, or auto-detected tv
+                meta_from_api = await self.meta_service.fetch_tmdb_tv(int(tmdb_id))
+
+            if meta_from_api:
+                db_item = meta_from_api
+                db_item["short_id"] = str(uuid.uuid4())[:7]
+                db_item["db_status"] = "available"  # Internal Status
+                # Create the skeleton
+                res = await self.db.library.insert_one(db_item.copy())
+                db_item["_id"] = res.inserted_id  # Capture the unique ID
+            else:
+                # Final Fail Safe
+                db_item = {
+                    "tmdb_id": int(tmdb_id),
+                    "title": file_name,
+                    "ratng": 0.0,
+                    "year": 2026,
+                    "genres": [],
+                    "short_id": str(uuid.uuid4())[:7],
+                    "media_type": "unknown",
+                    "visuals": {},
+                }
+                res = await self.db.library.insert_one(db_item.copy())
+                db_item["_id"] = res.inserted_id  # Ensure we have the new ID
+        return db_item
 
+    async def prepare(self, job) -> bool:
+        """
+        STAGE 2 (CPU/Metadata): DB lookup, branded rename, probe & assets.
+        Returns False if the job failed/was cancelled (already reported).
+        """
         try:
             # 1. Kill Switch Check (Before Starting)
-            if task_id and self.redis:
-                # Check if user cancelled while we were downloading
-                is_killed = await self.redis.get(f"kill_signal:{task_id}")
-                if is_killed:
-                    logger.info(f"🛑 Kill signal detected for {task_id}. Aborting.")
-                    raise Exception("TASK_CANCELLED_BY_USER")
+            # Check if user cancelled while we were downloading / queued for this stage
+            if job.task_id and kill_switch.is_killed(job.task_id):
+                logger.info(f"🛑 Kill signal detected for {job.task_id}. Aborting.")
+                raise Exception("TASK_CANCELLED_BY_USER")
 
+            if job.task_id and self.redis:
                 # Update status to 'uploading'
-                await self.redis.hset(f"task_status:{task_id}", "status", "uploading")
+                await self.redis.hset(
+                    f"task_status:{job.task_id}", "status", "uploading"
+                )
 
-            file_name = os.path.basename(current_file_path)
+            file_path = job.file_path
+            file_name = os.path.basename(file_path)
+            tmdb_id = job.tmdb_id
+            type_hint = job.type_hint
 
             # 2. SMART DB CHECK (Look for ID AND verify the Media Type)
-            # We create a query that respects the user's intent (Movie vs TV)
-            query = {"$or": [{"tmdb_id": int(tmdb_id)}, {"mal_id": int(tmdb_id)}]}
-
-            if type_hint in ["movie", "film"]:
-                query["media_type"] = {"$in": ["movie", "anime_movie"]}
-            elif type_hint in ["tv", "series", "show", "anime", "mal"]:
-                query["media_type"] = {"$in": ["tv", "series", "anime"]}
-
-            db_item = await self.db.library.find_one(query)
-
-            # 3. METADATA FETCHING (The Enriched Version)
-            if not db_item:
-                logger.info(
-                    f"⚠️ Metadata not in DB for ID {tmdb_id} ({type_hint}). Fetching from API..."
-                )
-
-                # Route to correct Service method
-                if type_hint in ["anime", "mal"]:
-                    meta_from_api = await self.meta_service.fetch_jikan_anime(
-                        int(tmdb_id)
-                    )
-                elif type_hint in ["movie", "film"]:
-                    meta_from_api = await self.meta_service.fetch_tmdb_movie(
-                        int(tmdb_id)
-                    )
-                else:  # tv, series, show, or auto-detected tv
-                    meta_from_api = await self.meta_service.fetch_tmdb_tv(int(tmdb_id))
-
-                if meta_from_api:
-                    db_item = meta_from_api
-                    db_item["short_id"] = str(uuid.uuid4())[:7]
-                    db_item["db_status"] = "available"  # Internal Status
-                    # Create the skeleton
-                    res = await self.db.library.insert_one(db_item.copy())
-                    db_item["_id"] = res.inserted_id  # Capture the unique ID
-                else:
-                    # Final Fail Safe
-                    db_item = {
-                        "tmdb_id": int(tmdb_id),
-                        "title": file_name,
-                        "ratng": 0.0,
-                        "year": 2026,
-                        "genres": [],
-                        "short_id": str(uuid.uuid4())[:7],
-                        "media_type": "unknown",
-                        "visuals": {},
-                    }
-                    res = await self.db.library.insert_one(db_item.copy())
-                    db_item["_id"] = res.inserted_id  # Ensure we have the new ID
+            async with self._title_locks[int(tmdb_id)]:
+                db_item = await self._library_item(tmdb_id, type_hint, file_name)
+            job.db_item = db_item
 
             # 🚀 4. FIX HEARTBEAT LAG (Update Status Name Now)
             async with task_dict_lock:
-                task = task_dict.get(self.current_task_id)
+                task = task_dict.get(job.task_id)
                 if task:
                     # Check if it's a status object with a listener
                     if hasattr(task, "_listener"):
@@ -239,17 +332,26 @@ class MediaLeecher:
                     )
 
             # 5. Probe Media (Processor)
-            meta = await processor.probe(current_file_path)
+            meta = await processor.probe(file_path)
             duration = meta.get("duration", 0)
+            job.meta = meta
 
             # 2.5 Resolve Episode Data
             # PTN (Parse name) -> Check if DB Item is a Series -> Get Ep Details
 
             # Prioritize parsing the name_hint (e.g. "The Night Manager S01E04")
             # over the raw download URL/filename.
-            parse_target = name_hint if name_hint else file_name
+            parse_target = job.name_hint if job.name_hint else file_name
             ptn = PTN.parse(parse_target)
 
+            # Pack files are often just 'E04.mkv': the season comes from the /leech name
+            if job.parts > 1 and not ptn.get("season") and job.envelope:
+                season = PTN.parse(job.envelope.name_hint or "").get("season")
+                if isinstance(season, int):
+                    ptn["season"] = season
+            if job.episode and not ptn.get("episode"):
+                ptn["episode"] = job.episode
+
             # We check the NEWLY FETCHED db_item media type here to detect if it's a series or anime
             ep_meta = {}
             if db_item.get("media_type") in ["series", "tv"] and db_item.get("tmdb_id"):
@@ -279,10 +381,6 @@ class MediaLeecher:
             ext = os.path.splitext(file_name)[1]
 
             # 1. Determine the best Title
-            # Priority: 1. TMDB Title (Monster) | 2. PTN Guess | 3. Fallback "Video"
-            db_title = db_item.get("title")
-            ptn_title = ptn.get("title")
-
             # Priority: 1. TMDB Title, 2. Filename Title, 3. "Video"
             best_title = db_item.get("title") or ptn.get("title") or "Video"
 
@@ -303,82 +401,104 @@ class MediaLeecher:
 
             # Remove any double dots that might have occurred
             branded_name = branded_name.replace("..", ".")
+            job.branded_name = branded_name
 
             # 6. Perform Rename
             new_path = os.path.join(os.path.dirname(file_path), branded_name)
+            if job.parts > 1 and await asyncio.to_thread(os.path.exists, new_path):
+                # Two files of a pack mapped to one name (extras w/o episode tag)
+                branded_name = f"{os.path.splitext(branded_name)[0]}.Part{job.part}{ext}"
+                job.branded_name = branded_name
+                new_path = os.path.join(os.path.dirname(file_path), branded_name)
             try:
                 os.rename(file_path, new_path)
 
                 # Add the NEW path to cleanup targets so it gets deleted on cancel/finish
-                cleanup_targets.append(new_path)
+                job.cleanup_targets.append(new_path)
 
                 file_path = new_path
-                current_file_path = new_path  # Update the safety variable
                 file_name = branded_name
 
                 logger.info(f"🏷️ Branded via DB/TMDB as: {file_name}")
             except Exception as e:
                 logger.error(f"Rename failed: {e}. Continuing with original.")
+            job.file_path = file_path
+            job.file_name = file_name
 
             # 3. Prepare Visuals
-            clean_caption = formatter.build_caption(
+            job.caption = formatter.build_caption(
                 tmdb_id,
                 meta,
                 file_name,
                 db_entry=db_item,
                 episode_meta=ep_meta,  # <--- PASS THIS TO FORMATTER
             )
-            buttons = formatter.build_buttons(db_item.get("short_id", ""))
+            job.buttons = formatter.build_buttons(db_item.get("short_id", ""))
 
             # 4. Generate Assets
-            screenshots = []
-            sample_path = None
             if duration > 0:
                 # Screenshots
-                screenshots = await processor.generate_screenshots(file_path, duration)
-                cleanup_targets.extend(screenshots)
+                job.screenshots = await processor.generate_screenshots(
+                    file_path, duration
+                )
+                job.cleanup_targets.extend(job.screenshots)
 
                 # Sample
                 if self.gen_samples and duration > 120:
-                    sample_path = await processor.generate_sample(file_path, duration)
-                    if sample_path:
-                        cleanup_targets.append(sample_path)
+                    job.sample_path = await processor.generate_sample(
+                        file_path, duration
+                    )
+                    if job.sample_path:
+                        job.cleanup_targets.append(job.sample_path)
+
+            return True
+
+        except Exception as e:
+            await self._handle_failure(job, e)
+            return False
+
+    async def upload(self, job) -> bool:
+        """STAGE 3 (Telegram Egress): Main upload, asset album & DB indexing."""
+        try:
+            task_id = job.task_id
+            tmdb_id = job.tmdb_id
+            db_item = job.db_item
+            meta = job.meta
+            file_name = job.file_name
 
             # 5. Main Upload (With Fancy Caption)
             logger.info("🚀 Uploading Main Video...")
-            self._last_log = -1
-            self._last_terminal_pct = -1  # Reset for terminal
+            job.last_terminal_pct = -1  # Reset for terminal
 
             video_msg = await self.client.send_document(
                 chat_id=self.log_channel,
-                document=file_path,
+                document=job.file_path,
                 file_name=file_name,
-                caption=clean_caption,  # <--- The Professional Text
-                reply_markup=buttons,
+                caption=job.caption,  # <--- The Professional Text
+                reply_markup=job.buttons,
                 force_document=True,
                 progress=self.upload_progress,
+                progress_args=(job,),
             )
 
             # If task was cancelled, video_msg is None.
             if video_msg is None:
-                logger.info(f"⚠️ Upload aborted for task {task_id}. Skipping indexing.")
-                return False
+                raise StopTransmission("ABORTED_BY_SIGNAL")
 
             # Store the Video Message ID securely
             main_msg_id = video_msg.id
-            main_file_id = video_msg.document.file_id
 
             # --- 🔗 GENERATE MESSAGE LINK  ---
             # Telegram format: https://t.me/c/{CHANNEL_ID}/{MSG_ID}
             # Note: Must strip the "-100" prefix for the link to work
             clean_chat_id = str(self.log_channel).replace("-100", "")
-            msg_link = f"https://t.me/c/{clean_chat_id}/{main_msg_id}"
+            job.msg_link = f"https://t.me/c/{clean_chat_id}/{main_msg_id}"
 
             # Create a rich caption for assets
             asset_caption = (
                 f"📸 <b>Gallery: {db_item.get('title')}</b>\n"
                 f"🆔 TMDB: <code>{tmdb_id}</code>\n"
-                f"📎 <a href='{msg_link}'>[Go to Main File]</a>"
+                f"📎 <a href='{job.msg_link}'>[Go to Main File]</a>"
             )
 
             # 6. Mirroring (Backup)
@@ -393,13 +513,13 @@ class MediaLeecher:
             media_group = []
 
             # 7.1. Add Sample if exists
-            if sample_path:
+            if job.sample_path:
                 media_group.append(
-                    InputMediaVideo(sample_path)
+                    InputMediaVideo(job.sample_path)
                 )  # Add without caption first
 
             # 7.2. Add Screenshots
-            for s in screenshots:
+            for s in job.screenshots:
                 media_group.append(InputMediaPhoto(s))
 
             screen_file_ids = []
@@ -446,6 +566,8 @@ class MediaLeecher:
             decoded = FileId.decode(doc.file_id)
 
             ptn = PTN.parse(file_name)
+            if job.episode and not ptn.get("episode"):
+                ptn["episode"] = job.episode
 
             # --- STRUCTURE 1: The Raw File Data (All Media Types) ---
             db_file_entry = {
@@ -536,14 +658,25 @@ class MediaLeecher:
                 f"✅ Index Complete for {db_item.get('title')} | ID: {db_item['_id']}"
             )
 
-            if self.is_cancelled:
-                logger.warning(
-                    f"🚫 Suppression: Task {task_id} was cancelled, skipping success message."
+            # Source Index: future /leech of the same URL/infohash/release is
+            # refused before download (see shared.library_index)
+            try:
+                await library_index.record(
+                    fingerprints(
+                        job.envelope.source_key if job.envelope else "",
+                        release_key(tmdb_id, file_name),
+                    ),
+                    tmdb_id=int(tmdb_id),
+                    name=file_name,
+                    quality=db_file_entry["quality"],
+                    file_id=doc.file_id,
+                    msg_link=job.msg_link,
                 )
-                return False
+            except Exception as e:
+                logger.warning(f"Source index update failed: {e}")
 
-            # Final Redis Update
-            if task_id and self.redis:
+            # Final Redis Update (multi-file tasks: once all files are in)
+            if task_id and self.redis and job.parts == 1:
                 await self.redis.hset(
                     f"task_status:{task_id}",
                     mapping={"status": "completed", "progress": 100},
@@ -552,146 +685,228 @@ class MediaLeecher:
                     f"task_status:{task_id}", 600
                 )  # Keep for 10mins
 
+            job.success = True
             return True
 
-        except (StopTransmission, Exception) as e:
-            self.is_cancelled = True
-            err_str = str(e)
-
-            # 1. Handle Clean Aborts (User Cancelled)
-            if (
-                isinstance(e, StopTransmission)
-                or "ABORTED_BY_SIGNAL" in err_str
-                or "TASK_CANCELLED" in err_str
-            ):
-                logger.warning(f"🛑 Task {task_id} gracefully stopped.")
-                if task_id and self.redis:
-                    await self.redis.hset(
-                        f"task_status:{task_id}", "status", "cancelled"
-                    )
+        except Exception as e:
+            await self._handle_failure(job, e)
+            return False
 
-                # 📢 NOTIFY USER VIA THE ORIGIN CHAT
-                target_chat = getattr(self, "notify_chat", self.log_channel)
-                try:
-                    await self.client.send_message(
-                        chat_id=target_chat,  # <--- REDIRECTED
-                        text=(
-                            f"🛑 <b>Task Aborted</b>\n"
-                            f"🆔 ID: <code>{task_id}</code>\n"
-                            f"🗑️ Status: Content scrubbed and slot released."
-                        ),
-                    )
-                except Exception as notify_err:
-                    logger.error(f"Failed to send cancellation msg: {notify_err}")
+    async def _handle_failure(self, job, e):
+        """Classifies a stage failure (Abort vs Crash) and notifies the origin chat."""
+        job.is_cancelled = True
+        task_id = job.task_id
+        err_str = str(e)
 
-            # 2. Catch & Silence the Pyrogram 'NoneType' write noise
-            elif "'NoneType' object has no attribute 'write'" in err_str:
-                logger.debug("Silenced Pyrogram session cleanup noise.")
+        if job.parts > 1:
+            # One report per task (see finalize_batch), not one per file
+            logger.warning(f"⚠️ File {job.part}/{job.parts} of {task_id} dropped: {e}")
+            return
 
-            # 3. Handle Real Errors (Crashes/Network)
-            else:
-                logger.error(f"Critical Leech Fail: {e}")
-                target_chat = getattr(self, "notify_chat", self.log_channel)
-                try:
-                    await self.client.send_message(
-                        chat_id=target_chat,
-                        text=f"❌ <b>Task Failed</b>\n🆔 ID: <code>{task_id or 'unknown'}</code>\nError: <code>{err_str[:50]}</code>",
-                    )
-                except:
-                    pass
+        # 1. Handle Clean Aborts (User Cancelled)
+        if (
+            isinstance(e, StopTransmission)
+            or "ABORTED_BY_SIGNAL" in err_str
+            or "TASK_CANCELLED" in err_str
+        ):
+            logger.warning(f"🛑 Task {task_id} gracefully stopped.")
+            if task_id and self.redis:
+                await self.redis.hset(f"task_status:{task_id}", "status", "cancelled")
 
-            return False
+            # 📢 NOTIFY USER VIA THE ORIGIN CHAT
+            try:
+                await self.client.send_message(
+                    chat_id=job.notify_chat,  # <--- REDIRECTED
+                    text=(
+                        f"🛑 <b>Task Aborted</b>\n"
+                        f"🆔 ID: <code>{task_id}</code>\n"
+                        f"🗑️ Status: Content scrubbed and slot released."
+                    ),
+                )
+            except Exception as notify_err:
+                logger.error(f"Failed to send cancellation msg: {notify_err}")
+
+        # 2. Catch & Silence the Pyrogram 'NoneType' write noise
+        elif "'NoneType' object has no attribute 'write'" in err_str:
+            logger.debug("Silenced Pyrogram session cleanup noise.")
+
+        # 3. Handle Real Errors (Crashes/Network)
+        else:
             logger.error(f"Critical Leech Fail: {e}")
+            try:
+                await self.client.send_message(
+                    chat_id=job.notify_chat,
+                    text=f"❌ <b>Task Failed</b>\n🆔 ID: <code>{task_id or 'unknown'}</code>\nError: <code>{err_str[:50]}</code>",
+                )
+            except:
+                pass
 
-        except Exception as e:
-            # Catch the specific stop_transmission error string
-            if (
-                "unbound method stop_transmission" in str(e).lower()
-                or "task_cancelled" in str(e).lower()
-            ):
-                logger.info(f"🛑 Upload {task_id} stopped via native signal.")
-                # Update Redis
-                if task_id and self.redis:
-                    await self.redis.hset(
-                        f"task_status:{task_id}", "status", "cancelled"
-                    )
+    async def finalize(self, job):
+        """Robust Cleanup: Notifications, registry purge, slot release, disk scrub."""
+        task_id = job.task_id
 
-                # Send the "Aborted" message to origin (DM or Log)
-                try:
-                    await self.client.send_message(
-                        chat_id=self.notify_chat,
-                        text=f"🛑 <b>Task Aborted</b>\n🆔 ID: <code>{task_id}</code>",
-                    )
-                except:
-                    pass
-            else:
-                # Real error handling...
+        # Files of a multi-file task only scrub their own disk; the task-level
+        # steps (1-4) run once in finalize_batch()
+        if job.parts > 1:
+            self._scrub(job)
+            return
+
+        # 1. DELETE THE TRIGGER COMMAND (The /leech message)
+        if job.trigger_msg_id and job.notify_chat:
+            try:
+                await self.client.delete_messages(
+                    chat_id=(job.notify_chat), message_ids=int(job.trigger_msg_id)
+                )
+            except:
                 pass
-            return False
 
-        finally:
-            # 9. Robust Cleanup
+        # 2. SEND COMPLETION NOTIFICATION (Only if successful)
+        if job.success and not job.is_cancelled and task_id:
+            try:
+                await self.client.send_message(
+                    chat_id=int(job.notify_chat),
+                    text=(
+                        f"✅ <b>Task Complete</b>\n"
+                        f"📦 <code>{job.branded_name}</code>\n"
+                        f"👤 {job.user_tag}\n"
+                        f"📎 <a href='{job.msg_link}'>[View in Log]</a>"
+                    ),
+                    disable_web_page_preview=True,
+                )
+            except:
+                pass
+
+        # 3. MASTER REGISTRY PURGE
+        if task_id:
+            async with task_dict_lock:
+                task_dict.pop(task_id, None)
+
+        # 4. RELEASE USER SLOT
+        if task_id and job.user_id != "0" and self.redis:
+            limit_key = f"active_user_tasks:{job.user_id}"
+            await self.redis.srem(limit_key, task_id)
+            logger.info(f"🔓 Slot released for User {job.user_id}")
+
+        # 5. Cleanup temporary files
+        self._scrub(job)
 
-            # 1. DELETE THE TRIGGER COMMAND (The /leech message)
-            if self.trigger_msg_id and self.notify_chat:
+    def _scrub(self, job):
+        """Deletes the job's files from disk (source, renamed copy, assets)."""
+        # Master List: Init path + Current path + Screenshots
+        targets = set(job.cleanup_targets)
+        targets.add(job.file_path)
+
+        logger.info(f"🧹 Scrubbing {len(targets)} items...")
+
+        for f in targets:
+            # Resolve Absolute Path just in case
+            abs_path = os.path.abspath(f)
+
+            if os.path.exists(abs_path):
                 try:
-                    await self.client.delete_messages(
-                        chat_id=(self.notify_chat), message_ids=int(self.trigger_msg_id)
+                    # Attempt standard remove
+                    os.remove(abs_path)
+                except Exception as e:
+                    logger.error(
+                        f"❌ Failed to delete {os.path.basename(abs_path)}: {e}"
                     )
-                except:
-                    pass
 
-            # 2. SEND COMPLETION NOTIFICATION (Only if successful)
-            # Note: 'msg_link' and 'db_item' are available from the try block scope if success
-            if not self.is_cancelled and task_id:
-                try:
-                    # We fetch variables from local scope (safe if successful)
-                    title = locals().get("db_item", {}).get("title", "Video")
-                    link = locals().get("msg_link", "#")
-
-                    await self.client.send_message(
-                        chat_id=int(self.notify_chat),
-                        text=(
-                            f"✅ <b>Task Complete</b>\n"
-                            f"📦 <code>{branded_name}</code>\n"
-                            f"👤 {self.current_user_tag}\n"
-                            f"📎 <a href='{link}'>[View in Log]</a>"
-                        ),
-                        disable_web_page_preview=True,
+        logger.info("✅ Cleanup phase done.")
+
+    async def finalize_batch(self, jobs):
+        """Task-level wrap-up of a multi-file task: ONE summary, slot release."""
+        head = jobs[0]
+        task_id = head.task_id
+        done = [job for job in jobs if job.success]
+
+        if head.trigger_msg_id and head.notify_chat:
+            with contextlib.suppress(Exception):
+                await self.client.delete_messages(
+                    chat_id=head.notify_chat, message_ids=int(head.trigger_msg_id)
+                )
+
+        if kill_switch.is_killed(task_id):
+            text = (
+                f"🛑 <b>Task Aborted</b>\n"
+                f"🆔 ID: <code>{task_id}</code>\n"
+                f"📦 Files uploaded before the stop: {len(done)}/{len(jobs)}"
+            )
+            status = "cancelled"
+        elif done:
+            lines = "\n".join(
+                f"• <a href='{job.msg_link}'>{job.branded_name}</a>" for job in done[:20]
+            )
+            more = f"\n… and {len(done) - 20} more" if len(done) > 20 else ""
+            text = (
+                f"✅ <b>Task Complete</b> ({len(done)}/{len(jobs)} files)\n"
+                f"👤 {head.user_tag}\n\n{lines}{more}"
+            )
+            status = "completed"
+        else:
+            text = f"❌ <b>Task Failed</b>\n🆔 ID: <code>{task_id}</code>\nNo file could be uploaded."
+            status = "failed"
+
+        try:
+            await self.client.send_message(
+                chat_id=int(head.notify_chat), text=text, disable_web_page_preview=True
+            )
+        except Exception as e:
+            logger.error(f"Failed to send batch summary: {e}")
+
+        async with task_dict_lock:
+            task_dict.pop(task_id, None)
+
+        if self.redis:
+            await self.redis.hset(
+                f"task_status:{task_id}", mapping={"status": status, "progress": 100}
+            )
+            await self.redis.expire(f"task_status:{task_id}", 600)
+            if head.user_id != "0":
+                await self.redis.srem(f"active_user_tasks:{head.user_id}", task_id)
+                logger.info(f"🔓 Slot released for User {head.user_id}")
+
+        logger.info(f"📦 Batch {task_id} done: {len(done)}/{len(jobs)} files uploaded")
+
+    async def share_result(self, job, followers):
+        """
+        In-flight Dedup: Tasks that asked for the same source while this job
+        was running get the leader's upload instead of a second copy.
+        """
+        for follower in followers:
+            f_id = follower.task_id
+
+            # Follower was cancelled while waiting -> nothing to deliver
+            if self.redis and await self.redis.exists(f"kill_signal:{f_id}"):
+                continue
+
+            chat_id = follower.origin_chat_id or self.log_channel
+            if follower.trigger_msg_id:
+                with contextlib.suppress(Exception):
+                    await self.client.delete_messages(
+                        chat_id=chat_id, message_ids=int(follower.trigger_msg_id)
                     )
-                except:
-                    pass
-
-            # 3. MASTER REGISTRY PURGE
-            if task_id:
-                async with task_dict_lock:
-                    task_dict.pop(task_id, None)
-
-            # 4. RELEASE USER SLOT
-            if task_id and user_id != "0" and self.redis:
-                limit_key = f"active_user_tasks:{user_id}"
-                await self.redis.srem(limit_key, task_id)
-                logger.info(f"🔓 Slot released for User {user_id}")
-
-            # 5. Cleanup temporary files
-            # Master List: Init path + Current path + Screenshots
-            targets = set(cleanup_targets)
-            if "current_file_path" in locals():
-                targets.add(current_file_path)
-
-            logger.info(f"🧹 Scrubbing {len(targets)} items...")
-
-            for f in targets:
-                # Resolve Absolute Path just in case
-                abs_path = os.path.abspath(f)
-
-                if os.path.exists(abs_path):
-                    try:
-                        # Attempt standard remove
-                        os.remove(abs_path)
-                    except Exception as e:
-                        logger.error(
-                            f"❌ Failed to delete {os.path.basename(abs_path)}: {e}"
-                        )
 
-            logger.info("✅ Cleanup phase done.")
+            try:
+                await self.client.send_message(
+                    chat_id=int(chat_id),
+                    text=(
+                        f"✅ <b>Task Complete</b> (Shared Download)\n"
+                        f"📦 <code>{job.branded_name}</code>\n"
+                        f"👤 {follower.user_tag}\n"
+                        f"🔗 Served by task <code>{job.task_id}</code>\n"
+                        f"📎 <a href='{job.msg_link}'>[View in Log]</a>"
+                    ),
+                    disable_web_page_preview=True,
+                )
+            except Exception as e:
+                logger.warning(f"Could not notify follower {f_id}: {e}")
+
+            if self.redis:
+                await self.redis.hset(
+                    f"task_status:{f_id}", mapping={"status": "completed", "progress": 100}
+                )
+                await self.redis.expire(f"task_status:{f_id}", 600)
+                if follower.user_id != "0":
+                    await self.redis.srem(f"active_user_tasks:{follower.user_id}", f_id)
+
+            logger.info(f"🔗 Follower {f_id} served by {job.task_id}")
@@ -0,0 +1,61 @@
+# apps/worker-video/handlers/kill_switch.py
+import asyncio
+import contextlib
+import logging
+
+from shared.task_queue import KILL_CHANNEL
+
+logger = logging.getLogger("KillSwitch")
+
+
+class KillSwitch:
+    """
+    ONE Redis pub/sub subscription per worker node.
+    The manager publishes task_ids on KILL_CHANNEL; we fan them out to the
+    local TaskListeners, so nobody has to poll kill_signal:{id} keys.
+    """
+
+    def __init__(self):
+        self.redis = None
+        self._listeners = {}  # {task_id: TaskListener}
+
+    async def register(self, listener):
+        """Tracks a local task. Catches kills sent BEFORE this node claimed it."""
+        self._listeners[listener.task_id] = listener
+        if self.redis and await self.redis.get(f"kill_signal:{listener.task_id}"):
+            listener.cancel()
+
+    def unregister(self, task_id):
+        self._listeners.pop(task_id, None)
+
+    def is_killed(self, task_id) -> bool:
+        """Local, zero-I/O check (safe for hot paths like progress callbacks)."""
+        listener = self._listeners.get(task_id)
+        return bool(listener and listener.is_cancelled)
+
+    async def run(self, redis):
+        """Background loop: (Re)subscribes and dispatches kill messages."""
+        self.redis = redis
+        while True:
+            pubsub = redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(KILL_CHANNEL)
+                logger.info(f"🛰️ Kill Switch listening on '{KILL_CHANNEL}'")
+                async for message in pubsub.listen():
+                    task_id = str(message.get("data", "")).strip()
+                    listener = self._listeners.get(task_id)
+                    if listener and not listener.is_cancelled:
+                        logger.warning(f"🛑 Kill signal received for {task_id}")
+                        listener.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Kill Switch connection lost: {e}. Reconnecting...")
+                await asyncio.sleep(2)
+            finally:
+                with contextlib.suppress(Exception):
+                    await pubsub.reset()
+
+
+# Singleton Instance
+kill_switch = KillSwitch()
@@ -1,4 +1,5 @@
 # apps/worker-video/handlers/listeners/task_listener.py
+import asyncio
 import logging
 import os
 import shutil
@@ -6,6 +7,7 @@ from html import escape
 
 from shared.registry import MirrorStatus, task_dict, task_dict_lock
 from shared.settings import settings
+from shared.task_envelope import TaskEnvelope
 from shared.tg_client import TgClient
 
 logger = logging.getLogger("TaskListener")
@@ -17,50 +19,60 @@ class TaskListener:
     Coordinates: Download -> Rename -> Process -> Upload -> Index.
     """
 
-    def __init__(
-        self,
-        task_id,
-        url,
-        tmdb_id,
-        user_id,
-        user_tag,
-        origin_chat_id,
-        trigger_msg_id,
-        type_hint="auto",
-        name_hint="",
-    ):
-        # --- Metadata (Your existing features) ---
-        self.task_id = task_id
-        self.url = url
-        self.tmdb_id = tmdb_id
-        self.user_id = user_id
-        self.user_tag = user_tag
-        self.origin_chat_id = origin_chat_id
-        self.trigger_msg_id = trigger_msg_id
-        self.type_hint = type_hint
-        self.name_hint = name_hint
+    def __init__(self, envelope: TaskEnvelope):
+        # --- Metadata (Decoded once from the queue envelope) ---
+        self.envelope = envelope
+        self.task_id = envelope.task_id
+        self.url = envelope.url
+        self.tmdb_id = envelope.tmdb_id
+        self.user_id = envelope.user_id
+        self.user_tag = envelope.user_tag
+        # 0 = Command came from nowhere we can answer -> Log Channel
+        self.origin_chat_id = envelope.origin_chat_id or settings.TG_LOG_CHANNEL_ID
+        self.trigger_msg_id = envelope.trigger_msg_id
+        self.type_hint = envelope.type_hint
+        self.name_hint = envelope.name_hint
 
         # WZML-X LOGIC: Unique directory per task
-        self.dir = os.path.join(settings.DOWNLOAD_DIR, str(task_id))
+        self.dir = os.path.join(settings.DOWNLOAD_DIR, str(self.task_id))
         os.makedirs(self.dir, exist_ok=True)
 
         # --- State ---
-        self.name = self.name_hint or f"TMDB {tmdb_id}"
+        self.name = self.name_hint or f"TMDB {self.tmdb_id}"
         self.size = 0
         self.is_cancelled = False
         self.is_finished = False
-        self.aria2_instance = None  # To be injected by DownloadManager
+        # Event-driven hand-over (no polling): exactly one ends the download phase
+        self.finished = asyncio.Event()
+        self.failed = asyncio.Event()
+        self.cancelled = asyncio.Event()
+        self._settled = asyncio.Event()
         self.local_path = None
         self.status_obj = None  # Will hold Aria2Status or YtDlpStatus
         self._last_term_pct = -1
         # Register in the global task_dict immediately so /status sees it
         task_dict[self.task_id] = self
 
+        # ♻️ CRASH RESUME: Partial data of an interrupted run stays, so the
+        # engines continue from their byte offset (.aria2 / yt-dlp .part)
+        self.resumed = settings.RESUME_DOWNLOADS and bool(os.listdir(self.dir))
+        if self.resumed:
+            logger.info(f"♻️ Resuming from partial data: {self.dir}")
         # Delete the unique task folder
-        if os.path.exists(self.dir):
+        elif os.path.exists(self.dir):
             shutil.rmtree(self.dir)
             logger.info(f"🧹 Cleaned task directory: {self.dir}")
 
+    def cancel(self):
+        """Marks the task as cancelled and wakes whoever waits on it."""
+        self.is_cancelled = True
+        self.cancelled.set()
+        self._settled.set()
+
+    async def wait(self):
+        """Blocks until the download phase ends (finished, failed or cancelled)."""
+        await self._settled.wait()
+
     def status(self):
         if self.is_cancelled:
             return MirrorStatus.STATUS_CANCELLED
@@ -92,11 +104,16 @@ class TaskListener:
     async def on_download_complete(self):
         """Called when engine finishes. Transition to Upload."""
         self.is_finished = True
+        self.finished.set()
+        self._settled.set()
         logger.info(f"✅ Download Phase Finished: {self.task_id}")
         # Note: Handover to flow_ingest happens in worker.py
 
     async def on_error(self, error_message):
         """Cleanup and Notify on failure."""
+        self.failed.set()
+        self._settled.set()
+
         # 1. IMMEDIATE REGISTRY CLEANUP (Kills the stale status message)
         async with task_dict_lock:
             if self.task_id in task_dict:
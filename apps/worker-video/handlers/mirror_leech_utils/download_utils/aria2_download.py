@@ -1,12 +1,15 @@
 # apps/worker-video/handlers/mirror_leech_utils/download_utils/aria2_download.py
 import logging
 
+from services.aria2_client import aria2
+from services.torrent_cache import infohash_of, torrent_cache
+
 from shared.status_utils.aria2_status import Aria2Status
 
 LOGGER = logging.getLogger("Aria2Download")
 
 
-async def add_aria2_download(listener, url, dpath, filename=None):
+async def add_aria2_download(listener, url, dpath, filename=None, headers=None):
     """
     WZML-Style Aria2 Downloader.
     Handles URI addition and initial Status Object registration.
@@ -20,19 +23,38 @@ async def add_aria2_download(listener, url, dpath, filename=None):
     }
     if filename:
         a2c_opt["out"] = filename
+    if headers:
+        a2c_opt["header"] = headers  # e.g. Cookie/Referer from the host scraper
+    if listener.resumed:
+        # Pick up the partial files (+ .aria2 control files) of the last run
+        a2c_opt["continue"] = "true"
+        if url.startswith(("magnet:", "bc:")) or url.endswith(".torrent"):
+            a2c_opt["check-integrity"] = "true"  # Verify pieces, skip the ones we have
+
+    # 1.1 Magnets: Known infohash -> start from the cached .torrent (no DHT
+    # metadata phase). Unknown -> let aria2 save the metadata for next time.
+    infohash = infohash_of(url)
+    torrent = await torrent_cache.get(infohash)
+    if infohash and not torrent:
+        a2c_opt["bt-save-metadata"] = "true"
 
     try:
-        # 2. Add URI to Aria2 Daemon
-        # Using the api instance attached to the listener (initialized in DownloadManager)
-        download = listener.aria2_instance.add_uris([url], options=a2c_opt)
-        gid = download.gid
+        # 2. Add to Aria2 Daemon (async RPC over the shared websocket)
+        if torrent:
+            gid = await aria2.add_torrent(torrent, a2c_opt)
+            LOGGER.info(f"🧲 Metadata cache hit: {infohash} | ID: {listener.task_id}")
+        else:
+            gid = await aria2.add_uris([url], a2c_opt)
     except Exception as e:
         LOGGER.error(f"Aria2 Add Error: {e}")
         await listener.on_error(str(e))
         return
 
-    # 3. Create Status Object
-    status = Aria2Status(gid, listener, listener.aria2_instance)
+    # 3. Create Status Object (aria2 notifications now drive the listener)
+    status = Aria2Status(gid, listener)
+    if infohash and not torrent:
+        status.on_metadata = lambda: torrent_cache.capture(infohash, dpath)
+    aria2.watch(status)
 
     LOGGER.info(f"📥 Aria2 Download Started. GID: {gid} | ID: {listener.task_id}")
 
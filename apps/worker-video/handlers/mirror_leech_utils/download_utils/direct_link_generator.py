@@ -4,25 +4,130 @@ from http.cookiejar import MozillaCookieJar
 from json import loads
 from os import path as ospath
 from re import findall, match, search
+from threading import local
 from time import sleep
 from urllib.parse import parse_qs, quote, urlparse
 from uuid import uuid4
 
-from cloudscraper import create_scraper
+from cloudscraper import CloudScraper
 from lxml.etree import HTML
-from requests import Session, get, post
+from requests import Session
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from handlers.mirror_leech_utils.download_utils.host_registry import (
+    HostPlugin,
+    HostRegistry,
+    host_of,
+    hosts,
+)
 from shared.ext_utils.exceptions import DirectDownloadLinkException
 from shared.ext_utils.help_messages import PASSWORD_ERROR_MESSAGE
-from shared.ext_utils.links_utils import is_share_link
 from shared.ext_utils.status_utils import speed_string_to_bytes
 from shared.settings import settings as Config
 
 # GoFile token cache to avoid rate limiting
 gofile_token_cache = None
 
+# --- PER-HOST SESSION POOL ---
+# Host functions run on the resolver's thread pool (see services.link_resolver).
+# Each thread keeps ONE keep-alive session per host, so repeated scrapes of
+# the same host reuse TCP/TLS connections instead of a fresh handshake per
+# call. Every request gets a default timeout. Cookies and headers are reset
+# after each scrape: one link's login/referer never leaks into the next.
+# Per-link headers go on the request (headers=...), never on the session.
+_local = local()
+
+
+class _KeepAlive:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._base_headers = self.headers.copy()
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault("timeout", Config.RESOLVER_REQUEST_TIMEOUT)
+        return super().request(method, url, *args, **kwargs)
+
+    def reset(self):
+        """Back to a clean session; the pooled connections stay open."""
+        self.cookies.clear()
+        self.headers = self._base_headers.copy()
+
+    def close(self):
+        # 'with _session() as s:' must not tear the pooled connections down
+        pass
+
+
+class _KeepAliveSession(_KeepAlive, Session):
+    pass
+
+
+class _KeepAliveScraper(_KeepAlive, CloudScraper):
+    pass
+
+
+def _pooled(kind):
+    sessions = getattr(_local, "sessions", None)
+    if sessions is None:
+        sessions = _local.sessions = {}
+    key = (getattr(_local, "host", ""), kind)
+    if key not in sessions:
+        sessions[key] = (
+            _KeepAliveScraper() if kind == "scraper" else _KeepAliveSession()
+        )
+    return sessions[key]
+
+
+def _release_host(host_name):
+    """The scrape is over: reset every pooled session it may have touched."""
+    for (session_host, _), session in getattr(_local, "sessions", {}).items():
+        if session_host == host_name:
+            session.reset()
+
+
+def _session():
+    """Pooled requests.Session for the host being resolved on this thread."""
+    return _pooled("requests")
+
+
+def _scraper():
+    """Pooled cloudscraper session for the host being resolved on this thread."""
+    return _pooled("scraper")
+
+
+def get(url, **kwargs):
+    return _session().get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    return _session().post(url, **kwargs)
+
+
+# --- HOST PLUGINS ---
+# Every scraper below declares its domains + capabilities with @host, so
+# dispatch is a dict lookup in the registry instead of an if/elif scan.
+debrid_hosts = HostRegistry()  # Routed to Debrid-Link when DEBRID_LINK_API is set
+
+
+def host(*domains, registry=hosts, **spec):
+    """Registers the decorated scraper as a HostPlugin (see host_registry)."""
+
+    def wrapper(func):
+        def scrape(url):
+            _local.host = host_of(url)  # Selects this thread's session pool
+            try:
+                return func(url)
+            finally:
+                _release_host(_local.host)
+
+        registry.register(
+            HostPlugin(name=func.__name__, fetch=scrape, domains=domains, **spec)
+        )
+        return func
+
+    return wrapper
+
+
 user_agent = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:122.0) Gecko/20100101 Firefox/122.0"
 )
@@ -144,220 +249,71 @@ debrid_link_supported_sites = [
 ]
 
 
+def find_host(link) -> HostPlugin | None:
+    """The plugin that scrapes this link (None = not a supported host)."""
+    if not host_of(link):
+        raise DirectDownloadLinkException("ERROR: Invalid URL")
+    if Config.DEBRID_LINK_API and (plugin := debrid_hosts.match(link)):
+        return plugin
+    return hosts.match(link)
+
+
 def direct_link_generator(link):
     """direct links generator"""
-    domain = urlparse(link).hostname
-    if not domain:
-        raise DirectDownloadLinkException("ERROR: Invalid URL")
-    elif Config.DEBRID_LINK_API and any(
-        x in domain for x in debrid_link_supported_sites
-    ):
-        return debrid_link(link)
-    elif "yadi.sk" in link or "disk.yandex." in link:
-        return yandex_disk(link)
-    elif "buzzheavier.com" in domain:
-        return buzzheavier(link)
-    elif "devuploads" in domain:
-        return devuploads(link)
-    elif "lulacloud.com" in domain:
-        return lulacloud(link)
-    elif "fuckingfast.co" in domain:
-        return fuckingfast_dl(link)
-    elif "mediafire.com" in domain:
-        return mediafire(link)
-    elif "osdn.net" in domain:
-        return osdn(link)
-    elif "github.com" in domain:
-        return github(link)
-    elif "hxfile.co" in domain:
-        return hxfile(link)
-    elif "1drv.ms" in domain:
-        return onedrive(link)
-    elif "pixeldrain.com" in domain:
-        return pixeldrain(link)
-    elif "racaty" in domain:
-        return racaty(link)
-    elif "1fichier.com" in domain:
-        return fichier(link)
-    elif "solidfiles.com" in domain:
-        return solidfiles(link)
-    elif "krakenfiles.com" in domain:
-        return krakenfiles(link)
-    elif "upload.ee" in domain:
-        return uploadee(link)
-    elif "gofile.io" in domain:
-        return gofile(link)
-    elif "send.cm" in domain:
-        return send_cm(link)
-    elif "tmpsend.com" in domain:
-        return tmpsend(link)
-    elif "easyupload.io" in domain:
-        return easyupload(link)
-    elif "streamvid.net" in domain:
-        return streamvid(link)
-    elif "shrdsk.me" in domain:
-        return shrdsk(link)
-    elif "u.pcloud.link" in domain:
-        return pcloud(link)
-    elif "qiwi.gg" in domain:
-        return qiwi(link)
-    elif "mp4upload.com" in domain:
-        return mp4upload(link)
-    elif "berkasdrive.com" in domain:
-        return berkasdrive(link)
-    elif "swisstransfer.com" in domain:
-        return swisstransfer(link)
-    elif "instagram.com" in domain:
-        return instagram(link)
-    elif any(x in domain for x in ["akmfiles.com", "akmfls.xyz"]):
-        return akmfiles(link)
-    elif any(
-        x in domain
-        for x in [
-            "dood.watch",
-            "doodstream.com",
-            "dood.to",
-            "dood.so",
-            "dood.cx",
-            "dood.la",
-            "dood.ws",
-            "dood.sh",
-            "doodstream.co",
-            "dood.pm",
-            "dood.wf",
-            "dood.re",
-            "dood.video",
-            "dooood.com",
-            "dood.yt",
-            "doods.yt",
-            "dood.stream",
-            "doods.pro",
-            "ds2play.com",
-            "d0o0d.com",
-            "ds2video.com",
-            "do0od.com",
-            "d000d.com",
-        ]
-    ):
-        return doods(link)
-    elif any(
-        x in domain
-        for x in [
-            "streamtape.com",
-            "streamtape.co",
-            "streamtape.cc",
-            "streamtape.to",
-            "streamtape.net",
-            "streamta.pe",
-            "streamtape.xyz",
-        ]
-    ):
-        return streamtape(link)
-    elif any(x in domain for x in ["wetransfer.com", "we.tl"]):
-        return wetransfer(link)
-    elif any(
-        x in domain
-        for x in [
-            "terabox.com",
-            "nephobox.com",
-            "4funbox.com",
-            "mirrobox.com",
-            "momerybox.com",
-            "teraboxapp.com",
-            "1024tera.com",
-            "terabox.app",
-            "gibibox.com",
-            "goaibox.com",
-            "terasharelink.com",
-            "teraboxlink.com",
-            "freeterabox.com",
-            "1024terabox.com",
-            "teraboxshare.com",
-            "terafileshare.com",
-        ]
-    ):
-        return terabox(link)
-    elif any(
-        x in domain
-        for x in [
-            "filelions.co",
-            "filelions.site",
-            "filelions.live",
-            "filelions.to",
-            "mycloudz.cc",
-            "cabecabean.lol",
-            "filelions.online",
-            "embedwish.com",
-            "kitabmarkaz.xyz",
-            "wishfast.top",
-            "streamwish.to",
-            "kissmovies.net",
-        ]
-    ):
-        return filelions_and_streamwish(link)
-    elif any(x in domain for x in ["streamhub.ink", "streamhub.to"]):
-        return streamhub(link)
-    elif any(x in domain for x in ["hubcloud.one", "hubcloud.foo"]):
-        return hubcloud(link)
-    elif any(
-        x in domain
-        for x in [
-            "linkbox.to",
-            "lbx.to",
-            "teltobx.net",
-            "telbx.net",
-        ]
-    ):
-        return linkBox(link)
-    elif is_share_link(link):
-        if "gdtot" in domain:
-            return gdtot(link)
-        elif "filepress" in domain:
-            return filepress(link)
-        else:
-            return sharer_scraper(link)
-    elif any(
-        x in domain
-        for x in [
-            "anonfiles.com",
-            "zippyshare.com",
-            "letsupload.io",
-            "hotfile.io",
-            "bayfiles.com",
-            "megaupload.nz",
-            "letsupload.cc",
-            "filechan.org",
-            "myfile.is",
-            "vshare.is",
-            "rapidshare.nu",
-            "lolabits.se",
-            "openload.cc",
-            "share-online.is",
-            "upvid.cc",
-            "uptobox.com",
-            "uptobox.fr",
-        ]
-    ):
-        raise DirectDownloadLinkException(f"ERROR: R.I.P {domain}")
-    else:
+    if not (plugin := find_host(link)):
         raise DirectDownloadLinkException(f"No Direct link function found for {link}")
+    return plugin.fetch(link)
 
 
-def get_captcha_token(session, params):
+@host(
+    "anonfiles.com",
+    "zippyshare.com",
+    "letsupload.io",
+    "hotfile.io",
+    "bayfiles.com",
+    "megaupload.nz",
+    "letsupload.cc",
+    "filechan.org",
+    "myfile.is",
+    "vshare.is",
+    "rapidshare.nu",
+    "lolabits.se",
+    "openload.cc",
+    "share-online.is",
+    "upvid.cc",
+    "uptobox.com",
+    "uptobox.fr",
+)
+def dead_host(link):
+    raise DirectDownloadLinkException(f"ERROR: R.I.P {host_of(link)}")
+
+
+@host(keywords=("gdtot", "filepress", "filebee", "appdrive", "gdflix"))
+def share_link(link):
+    if "gdtot" in host_of(link):
+        return gdtot(link)
+    elif "filepress" in host_of(link):
+        return filepress(link)
+    else:
+        return sharer_scraper(link)
+
+
+def get_captcha_token(session, params, headers=None):
     recaptcha_api = "https://www.google.com/recaptcha/api2"
-    res = session.get(f"{recaptcha_api}/anchor", params=params)
+    res = session.get(f"{recaptcha_api}/anchor", params=params, headers=headers)
     anchor_html = HTML(res.text)
     if not (anchor_token := anchor_html.xpath('//input[@id="recaptcha-token"]/@value')):
         return
     params["c"] = anchor_token[0]
     params["reason"] = "q"
-    res = session.post(f"{recaptcha_api}/reload", params=params)
+    res = session.post(f"{recaptcha_api}/reload", params=params, headers=headers)
     if token := findall(r'"rresp","(.*?)"', res.text):
         return token[0]
 
 
+@host(*debrid_link_supported_sites, registry=debrid_hosts, folders=True)
 def debrid_link(url):
-    cget = create_scraper().request
+    cget = _scraper().request
     resp = cget(
         "POST",
         f"https://debrid-link.com/api/v2/downloader/add?access_token={Config.DEBRID_LINK_API}",
@@ -389,6 +345,7 @@ def debrid_link(url):
         return details
 
 
+@host("hubcloud.one", "hubcloud.foo")
 def hubcloud(url):
     try:
         response = get(f"http://hubcloud.cfd/bypass?url={url}").json()
@@ -405,6 +362,7 @@ def hubcloud(url):
     return links[0]["url"]
 
 
+@host("buzzheavier.com")
 def buzzheavier(link):
     """
     Generate a direct download link for buzzheavier URLs.
@@ -412,7 +370,7 @@ def buzzheavier(link):
     @return: Direct download link
     """
     link = link if link.endswith("/") else link + "/"
-    client = create_scraper()
+    client = _scraper()
     try:
         res = client.get(
             link + "download", headers={"hx-current-url": link, "referer": link}
@@ -431,13 +389,14 @@ def buzzheavier(link):
     return redirect_url
 
 
+@host("fuckingfast.co")
 def fuckingfast_dl(url):
     """
     Generate a direct download link for fuckingfast.co URLs.
     @param url: URL from fuckingfast.co
     @return: Direct download link
     """
-    session = Session()
+    session = _session()
     url = url.strip()
 
     try:
@@ -460,13 +419,14 @@ def fuckingfast_dl(url):
         session.close()
 
 
+@host(keywords=("devuploads",))
 def devuploads(url):
     """
     Generate a direct download link for devuploads.com URLs.
     @param url: URL from devuploads.com
     @return: Direct download link
     """
-    session = Session()
+    session = _session()
     res = session.get(url)
     html = HTML(res.text)
     if not html.xpath("//input[@name]"):
@@ -510,13 +470,14 @@ def devuploads(url):
     return direct_link[0]
 
 
+@host("lulacloud.com")
 def lulacloud(url):
     """
     Generate a direct download link for www.lulacloud.com URLs.
     @param url: URL from www.lulacloud.com
     @return: Direct download link
     """
-    session = Session()
+    session = _session()
     try:
         res = session.post(url, headers={"Referer": url}, allow_redirects=False)
         return res.headers["location"]
@@ -526,6 +487,7 @@ def lulacloud(url):
         session.close()
 
 
+@host("mediafire.com", folders=True, ttl=1800)
 def mediafire(url, session=None):
     if "/folder/" in url:
         return mediafireFolder(url)
@@ -548,7 +510,7 @@ def mediafire(url, session=None):
             raise DirectDownloadLinkException(f"ERROR: {e.__class__.__name__}") from e
 
     if session is None:
-        session = create_scraper()
+        session = _scraper()
         parsed_url = urlparse(url)
         url = f"{parsed_url.scheme}://{parsed_url.netloc}{parsed_url.path}"
     try:
@@ -588,8 +550,9 @@ def mediafire(url, session=None):
     return final_link[0]
 
 
+@host("osdn.net")
 def osdn(url):
-    with create_scraper() as session:
+    with _scraper() as session:
         try:
             html = HTML(session.get(url).text)
         except Exception as e:
@@ -599,6 +562,7 @@ def osdn(url):
         return f"https://osdn.net{direct_link[0]}"
 
 
+@host("yadi.sk", keywords=("disk.yandex.",))
 def yandex_disk(url: str) -> str:
     """Yandex.Disk direct link generator
     Based on https://github.com/wldhx/yadisk-direct"""
@@ -615,19 +579,21 @@ def yandex_disk(url: str) -> str:
         ) from e
 
 
+@host("github.com", ttl=86400)
 def github(url):
     """GitHub direct links generator"""
     try:
         findall(r"\bhttps?://.*github\.com.*releases\S+", url)[0]
     except IndexError as e:
         raise DirectDownloadLinkException("No GitHub Releases links found") from e
-    with create_scraper() as session:
+    with _scraper() as session:
         _res = session.get(url, stream=True, allow_redirects=False)
         if "location" in _res.headers:
             return _res.headers["location"]
         raise DirectDownloadLinkException("ERROR: Can't extract the link")
 
 
+@host("hxfile.co", headers=True)
 def hxfile(url):
     if not ospath.isfile("hxfile.txt"):
         raise DirectDownloadLinkException("ERROR: hxfile.txt (cookies) Not Found!")
@@ -637,7 +603,7 @@ def hxfile(url):
     except Exception as e:
         raise DirectDownloadLinkException(f"ERROR: {e.__class__.__name__}") from e
     cookies = {cookie.name: cookie.value for cookie in jar}
-    with Session() as session:
+    with _session() as session:
         try:
             if url.strip().endswith(".html"):
                 url = url[:-5]
@@ -657,10 +623,11 @@ def hxfile(url):
     raise DirectDownloadLinkException("ERROR: Direct download link not found")
 
 
+@host("1drv.ms", ttl=3600)
 def onedrive(link):
     """Onedrive direct link generator
     By https://github.com/junedkh"""
-    with create_scraper() as session:
+    with _scraper() as session:
         try:
             link = session.get(link).url
             parsed_link = urlparse(link)
@@ -693,6 +660,7 @@ def onedrive(link):
     return resp["@content.downloadUrl"]
 
 
+@host("pixeldrain.com", ttl=86400)
 def pixeldrain(url):
     try:
         url = url.rstrip("/")
@@ -703,11 +671,21 @@ def pixeldrain(url):
         raise DirectDownloadLinkException("ERROR: Direct link not found")
 
 
+@host(
+    "streamtape.com",
+    "streamtape.co",
+    "streamtape.cc",
+    "streamtape.to",
+    "streamtape.net",
+    "streamta.pe",
+    "streamtape.xyz",
+    ttl=300,
+)
 def streamtape(url):
     splitted_url = url.split("/")
     _id = splitted_url[4] if len(splitted_url) >= 6 else splitted_url[-1]
     try:
-        with Session() as session:
+        with _session() as session:
             html = HTML(session.get(url).text)
     except Exception as e:
         raise DirectDownloadLinkException(f"ERROR: {e.__class__.__name__}") from e
@@ -721,8 +699,9 @@ def streamtape(url):
     return f"https://streamtape.com/get_video?id={_id}{link[-1]}"
 
 
+@host(keywords=("racaty",))
 def racaty(url):
-    with create_scraper() as session:
+    with _scraper() as session:
         try:
             url = session.get(url).url
             json_data = {"op": "download2", "id": url.split("/")[-1]}
@@ -735,6 +714,7 @@ def racaty(url):
         raise DirectDownloadLinkException("ERROR: Direct link not found")
 
 
+@host("1fichier.com", ttl=1800)
 def fichier(link):
     """1Fichier direct link generator
     Based on https://github.com/Maujar
@@ -749,7 +729,7 @@ def fichier(link):
     else:
         pswd = None
         url = link
-    cget = create_scraper().request
+    cget = _scraper().request
     try:
         if pswd is None:
             req = cget("post", url)
@@ -809,11 +789,12 @@ def fichier(link):
     )
 
 
+@host("solidfiles.com")
 def solidfiles(url):
     """Solidfiles direct link generator
     Based on https://github.com/Xonshiz/SolidFiles-Downloader
     By https://github.com/Jusidama18"""
-    with create_scraper() as session:
+    with _scraper() as session:
         try:
             headers = {
                 "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_9_4) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/36.0.1985.125 Safari/537.36"
@@ -827,8 +808,9 @@ def solidfiles(url):
             raise DirectDownloadLinkException(f"ERROR: {e.__class__.__name__}") from e
 
 
+@host("krakenfiles.com", ttl=1800)
 def krakenfiles(url):
-    with Session() as session:
+    with _session() as session:
         try:
             _res = session.get(url)
         except Exception as e:
@@ -855,8 +837,9 @@ def krakenfiles(url):
     return _json["url"]
 
 
+@host("upload.ee")
 def uploadee(url):
-    with create_scraper() as session:
+    with _scraper() as session:
         try:
             html = HTML(session.get(url).text)
         except Exception as e:
@@ -867,6 +850,25 @@ def uploadee(url):
         raise DirectDownloadLinkException("ERROR: Direct Link not found")
 
 
+@host(
+    "terabox.com",
+    "nephobox.com",
+    "4funbox.com",
+    "mirrobox.com",
+    "momerybox.com",
+    "teraboxapp.com",
+    "1024tera.com",
+    "terabox.app",
+    "gibibox.com",
+    "goaibox.com",
+    "terasharelink.com",
+    "teraboxlink.com",
+    "freeterabox.com",
+    "1024terabox.com",
+    "teraboxshare.com",
+    "terafileshare.com",
+    ttl=600,
+)
 def terabox(url):
     try:
         encoded_url = quote(url)
@@ -877,7 +879,7 @@ def terabox(url):
 
 
 def filepress(url):
-    with create_scraper() as session:
+    with _scraper() as session:
         try:
             url = session.get(url).url
             raw = urlparse(url)
@@ -909,7 +911,7 @@ def filepress(url):
 
 
 def gdtot(url):
-    cget = create_scraper().request
+    cget = _scraper().request
     try:
         res = cget("GET", f"https://gdtot.pro/file/{url.split('/')[-1]}")
     except Exception as e:
@@ -951,7 +953,7 @@ def gdtot(url):
 
 
 def sharer_scraper(url):
-    cget = create_scraper().request
+    cget = _scraper().request
     try:
         url = cget("GET", url).url
         raw = urlparse(url)
@@ -1007,8 +1009,9 @@ def sharer_scraper(url):
         )
 
 
+@host("wetransfer.com", "we.tl")
 def wetransfer(url):
-    with create_scraper() as session:
+    with _scraper() as session:
         try:
             url = session.get(url).url
             splited_url = url.split("/")
@@ -1029,8 +1032,9 @@ def wetransfer(url):
         raise DirectDownloadLinkException("ERROR: cannot find direct link")
 
 
+@host("akmfiles.com", "akmfls.xyz")
 def akmfiles(url):
-    with create_scraper() as session:
+    with _scraper() as session:
         try:
             html = HTML(
                 session.post(
@@ -1046,8 +1050,9 @@ def akmfiles(url):
         raise DirectDownloadLinkException("ERROR: Direct link not found")
 
 
+@host("shrdsk.me")
 def shrdsk(url):
-    with create_scraper() as session:
+    with _scraper() as session:
         try:
             _json = session.get(
                 f"https://us-central1-affiliate2apk.cloudfunctions.net/get_data?shortid={url.split('/')[-1]}",
@@ -1068,6 +1073,7 @@ def shrdsk(url):
     raise DirectDownloadLinkException("ERROR: cannot find direct link in headers")
 
 
+@host("linkbox.to", "lbx.to", "teltobx.net", "telbx.net", folders=True)
 def linkBox(url: str):
     parsed_url = urlparse(url)
     try:
@@ -1169,13 +1175,14 @@ def linkBox(url: str):
                 details["contents"].append(item)
 
     try:
-        with Session() as session:
+        with _session() as session:
             __fetch_links(session)
     except DirectDownloadLinkException as e:
         raise e
     return details
 
 
+@host("gofile.io", folders=True, headers=True, ttl=3600)
 def gofile(url):
     try:
         if "::" in url:
@@ -1313,7 +1320,7 @@ def gofile(url):
                 details["contents"].append(item)
 
     details = {"contents": [], "title": "", "total_size": 0}
-    with Session() as session:
+    with _session() as session:
         try:
             token = __get_token(session)
         except Exception as e:
@@ -1345,17 +1352,16 @@ def mediafireFolder(url):
         folderkey = folderkey[0]
     details = {"contents": [], "title": "", "total_size": 0, "header": ""}
 
-    session = create_scraper()
+    # Own session (not pooled): it gets a custom retry adapter
+    session = CloudScraper.create_scraper(
+        browser={"browser": "firefox", "platform": "windows", "mobile": False},
+        delay=10,
+    )
     adapter = HTTPAdapter(
         max_retries=Retry(total=10, read=10, connect=10, backoff_factor=0.3)
     )
     session.mount("http://", adapter)
     session.mount("https://", adapter)
-    session = create_scraper(
-        browser={"browser": "firefox", "platform": "windows", "mobile": False},
-        delay=10,
-        sess=session,
-    )
     folder_infos = []
 
     def __get_info(folderkey):
@@ -1392,7 +1398,7 @@ def mediafireFolder(url):
     details["title"] = folder_infos[0]["name"]
 
     def __scraper(url):
-        session = create_scraper()
+        session = _scraper()
         parsed_url = urlparse(url)
         url = f"{parsed_url.scheme}://{parsed_url.netloc}{parsed_url.path}"
 
@@ -1507,7 +1513,7 @@ def send_cm_file(url, file_id=None):
     else:
         _password = ""
     _passwordNeed = False
-    with create_scraper() as session:
+    with _scraper() as session:
         if file_id is None:
             try:
                 html = HTML(session.get(url).text)
@@ -1535,6 +1541,7 @@ def send_cm_file(url, file_id=None):
         raise DirectDownloadLinkException("ERROR: Direct link not found")
 
 
+@host("send.cm", folders=True, headers=True, ttl=900)
 def send_cm(url):
     if "/d/" in url:
         return send_cm_file(url)
@@ -1555,7 +1562,7 @@ def send_cm(url):
         details["title"] = splitted_url[5]
     else:
         details["title"] = splitted_url[-1]
-    session = Session()
+    session = _session()
 
     def __collectFolders(html):
         folders = []
@@ -1636,11 +1643,38 @@ def send_cm(url):
     return details
 
 
+@host(
+    "dood.watch",
+    "doodstream.com",
+    "dood.to",
+    "dood.so",
+    "dood.cx",
+    "dood.la",
+    "dood.ws",
+    "dood.sh",
+    "doodstream.co",
+    "dood.pm",
+    "dood.wf",
+    "dood.re",
+    "dood.video",
+    "dooood.com",
+    "dood.yt",
+    "doods.yt",
+    "dood.stream",
+    "doods.pro",
+    "ds2play.com",
+    "d0o0d.com",
+    "ds2video.com",
+    "do0od.com",
+    "d000d.com",
+    headers=True,
+    ttl=300,
+)
 def doods(url):
     if "/e/" in url:
         url = url.replace("/e/", "/d/")
     parsed_url = urlparse(url)
-    with create_scraper() as session:
+    with _scraper() as session:
         try:
             html = HTML(session.get(url).text)
         except Exception as e:
@@ -1664,6 +1698,7 @@ def doods(url):
     return (link.group(1), f"Referer: {parsed_url.scheme}://{parsed_url.hostname}/")
 
 
+@host("easyupload.io", captcha=True)
 def easyupload(url):
     if "::" in url:
         _password = url.split("::")[-1]
@@ -1671,7 +1706,7 @@ def easyupload(url):
     else:
         _password = ""
     file_id = url.split("/")[-1]
-    with create_scraper() as session:
+    with _scraper() as session:
         try:
             _res = session.get(url)
         except Exception as e:
@@ -1693,7 +1728,7 @@ def easyupload(url):
                 "ERROR: Failed to get server for EasyUpload Link"
             )
         action_url = match.group()
-        session.headers.update({"referer": "https://easyupload.io/"})
+        referer = {"referer": "https://easyupload.io/"}
         recaptcha_params = {
             "k": "6LfWajMdAAAAAGLXz_nxz2tHnuqa-abQqC97DIZ3",
             "ar": "1",
@@ -1703,7 +1738,7 @@ def easyupload(url):
             "size": "invisible",
             "cb": "c3o1vbaxbmwe",
         }
-        if not (captcha_token := get_captcha_token(session, recaptcha_params)):
+        if not (captcha_token := get_captcha_token(session, recaptcha_params, referer)):
             raise DirectDownloadLinkException("ERROR: Captcha token not found")
         try:
             data = {
@@ -1713,7 +1748,7 @@ def easyupload(url):
                 "captchatoken": captcha_token,
                 "method": "regular",
             }
-            json_resp = session.post(url=action_url, data=data).json()
+            json_resp = session.post(url=action_url, data=data, headers=referer).json()
         except Exception as e:
             raise DirectDownloadLinkException(f"ERROR: {e.__class__.__name__}") from e
     if "download_link" in json_resp:
@@ -1727,6 +1762,20 @@ def easyupload(url):
     )
 
 
+@host(
+    "filelions.co",
+    "filelions.site",
+    "filelions.live",
+    "filelions.to",
+    "mycloudz.cc",
+    "cabecabean.lol",
+    "filelions.online",
+    "embedwish.com",
+    "kitabmarkaz.xyz",
+    "wishfast.top",
+    "streamwish.to",
+    "kissmovies.net",
+)
 def filelions_and_streamwish(url):
     parsed_url = urlparse(url)
     hostname = parsed_url.hostname
@@ -1768,7 +1817,7 @@ def filelions_and_streamwish(url):
         quality = spited_file_code[1]
         file_code = spited_file_code[0]
     url = f"{scheme}://{hostname}/{file_code}"
-    with Session() as session:
+    with _session() as session:
         try:
             _res = session.get(
                 f"{apiUrl}/api/file/direct_link",
@@ -1797,12 +1846,13 @@ def filelions_and_streamwish(url):
     raise DirectDownloadLinkException(f"ERROR: {error}")
 
 
+@host("streamvid.net")
 def streamvid(url: str):
     file_code = url.split("/")[-1]
     parsed_url = urlparse(url)
     url = f"{parsed_url.scheme}://{parsed_url.hostname}/d/{file_code}"
     quality_defined = bool(url.strip().endswith(("_o", "_h", "_n", "_l")))
-    with create_scraper() as session:
+    with _scraper() as session:
         try:
             html = HTML(session.get(url).text)
         except Exception as e:
@@ -1849,11 +1899,12 @@ def streamvid(url: str):
         raise DirectDownloadLinkException("ERROR: Something went wrong")
 
 
+@host("streamhub.ink", "streamhub.to")
 def streamhub(url):
     file_code = url.split("/")[-1]
     parsed_url = urlparse(url)
     url = f"{parsed_url.scheme}://{parsed_url.hostname}/d/{file_code}"
-    with create_scraper() as session:
+    with _scraper() as session:
         try:
             html = HTML(session.get(url).text)
         except Exception as e:
@@ -1864,10 +1915,9 @@ def streamhub(url):
         for i in inputs:
             if key := i.get("name"):
                 data[key] = i.get("value")
-        session.headers.update({"referer": url})
         sleep(1)
         try:
-            html = HTML(session.post(url, data=data).text)
+            html = HTML(session.post(url, data=data, headers={"referer": url}).text)
         except Exception as e:
             raise DirectDownloadLinkException(f"ERROR: {e.__class__.__name__}") from e
         if directLink := html.xpath(
@@ -1879,8 +1929,9 @@ def streamhub(url):
         raise DirectDownloadLinkException("ERROR: direct link not found!")
 
 
+@host("u.pcloud.link")
 def pcloud(url):
-    with create_scraper() as session:
+    with _scraper() as session:
         try:
             res = session.get(url)
         except Exception as e:
@@ -1890,6 +1941,7 @@ def pcloud(url):
     raise DirectDownloadLinkException("ERROR: Direct link not found")
 
 
+@host("tmpsend.com", headers=True)
 def tmpsend(url):
     parsed_url = urlparse(url)
     if any(x in parsed_url.path for x in ["thank-you", "download"]):
@@ -1904,10 +1956,11 @@ def tmpsend(url):
     return download_link, header
 
 
+@host("qiwi.gg")
 def qiwi(url):
     """qiwi.gg link generator
     based on https://github.com/aenulrofik"""
-    with Session() as session:
+    with _session() as session:
         file_id = url.split("/")[-1]
         try:
             res = session.get(url).text
@@ -1921,8 +1974,9 @@ def qiwi(url):
             raise DirectDownloadLinkException("ERROR: File not found")
 
 
+@host("mp4upload.com", headers=True)
 def mp4upload(url):
-    with Session() as session:
+    with _session() as session:
         try:
             url = url.replace("embed-", "")
             req = session.get(url).text
@@ -1955,10 +2009,11 @@ def mp4upload(url):
             raise DirectDownloadLinkException("ERROR: File Not Found!")
 
 
+@host("berkasdrive.com")
 def berkasdrive(url):
     """berkasdrive.com link generator
     by https://github.com/aenulrofik"""
-    with Session() as session:
+    with _session() as session:
         try:
             sesi = session.get(url).text
         except Exception as e:
@@ -1970,6 +2025,7 @@ def berkasdrive(url):
         raise DirectDownloadLinkException("ERROR: File Not Found!")
 
 
+@host("swisstransfer.com", folders=True, headers=True)
 def swisstransfer(link):
     matched_link = match(
         r"https://www\.swisstransfer\.com/d/([\w-]+)(?:\:\:(\w+))?", link
@@ -2067,6 +2123,7 @@ def swisstransfer(link):
     }
 
 
+@host("instagram.com")
 def instagram(link: str) -> str:
     """
     Fetches the direct video download URL from an Instagram post.
@@ -0,0 +1,87 @@
+# apps/worker-video/handlers/mirror_leech_utils/download_utils/host_registry.py
+import asyncio
+import re
+from collections.abc import Callable
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+
+def host_of(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    return host.removeprefix("www.")
+
+
+def host_suffixes(host: str):
+    """'a.b.com' -> 'a.b.com', 'b.com', 'com' (one dict probe per label)."""
+    while host:
+        yield host
+        host = host.partition(".")[2]
+
+
+@dataclass(eq=False)
+class HostPlugin:
+    """One file host: where it lives, what it can return, how to scrape it."""
+
+    name: str
+    fetch: Callable  # Blocking scraper: url -> link | (link, header) | folder dict
+    domains: tuple = ()  # Domain + all of its subdomains
+    exact: tuple = ()  # Only this exact hostname
+    keywords: tuple = ()  # Substring of the hostname (odd TLD families)
+    folders: bool = False  # May return a multi-file {"contents": [...]} dict (else rejected)
+    headers: bool = False  # Link only works with the returned header (required)
+    captcha: bool = False  # Burns a captcha/quota per scrape
+    ttl: int = 0  # Lifetime of a scraped link (0 = resolver default)
+
+    async def resolve(self, url, executor=None):
+        """Runs the blocking scraper off the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.fetch, url)
+
+
+class HostRegistry:
+    """
+    Hostname -> HostPlugin dispatch.
+    Exact and suffix matches are dict lookups (one per domain label);
+    keyword hosts share ONE precompiled regex, tried only on a miss.
+    """
+
+    def __init__(self):
+        self._exact = {}
+        self._suffix = {}
+        self._keywords = {}
+        self._keyword_re = None
+        self.plugins = []
+
+    def register(self, plugin: HostPlugin) -> HostPlugin:
+        for domain in plugin.domains:
+            self._suffix[domain.lower()] = plugin
+        for domain in plugin.exact:
+            self._exact[domain.lower()] = plugin
+        for keyword in plugin.keywords:
+            self._keywords[keyword.lower()] = plugin
+        self._keyword_re = None  # Recompiled on next miss
+        self.plugins.append(plugin)
+        return plugin
+
+    def match(self, url: str) -> HostPlugin | None:
+        host = host_of(url) if "://" in url else url.lower()
+        if not host:
+            return None
+        if plugin := self._exact.get(host):
+            return plugin
+        for suffix in host_suffixes(host):
+            if plugin := self._suffix.get(suffix):
+                return plugin
+        if not self._keywords:
+            return None
+        if self._keyword_re is None:
+            self._keyword_re = re.compile(
+                "|".join(re.escape(k) for k in sorted(self._keywords, key=len, reverse=True))
+            )
+        if found := self._keyword_re.search(host):
+            return self._keywords[found.group(0)]
+        return None
+
+
+# Singleton Instance
+hosts = HostRegistry()
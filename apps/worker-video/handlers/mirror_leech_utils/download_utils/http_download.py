@@ -0,0 +1,252 @@
+# apps/worker-video/handlers/mirror_leech_utils/download_utils/http_download.py
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import re
+from urllib.parse import unquote, urlparse
+
+import aiohttp
+
+from handlers.mirror_leech_utils.download_utils.host_registry import host_of
+from shared.ext_utils.exceptions import LinkRejectedException
+from shared.settings import settings
+from shared.status_utils.http_status import HttpStatus
+
+LOGGER = logging.getLogger("HttpDownload")
+
+CHUNK_SIZE = 1 << 20  # Bytes buffered per pwrite()
+SEGMENT_RETRIES = 3
+STATE_SUFFIX = ".segments"  # Sidecar: per-segment offsets of the .part file
+# Links of these types are files for sure (anything else gets probed)
+DIRECT_EXTENSIONS = (
+    ".mkv", ".mp4", ".avi", ".mov", ".webm", ".m4v", ".ts", ".wmv", ".flv",
+    ".zip", ".rar", ".7z", ".iso",
+)
+# Not a file: yt-dlp has to extract these
+NOT_A_FILE = ("text/", "application/json", "mpegurl", "dash+xml")
+
+_host_slots = {}  # {host: asyncio.Semaphore} shared by every task of the node
+
+
+def _host_slot(host: str) -> asyncio.Semaphore:
+    if host not in _host_slots:
+        _host_slots[host] = asyncio.Semaphore(settings.HTTP_PER_HOST_CONNECTIONS)
+    return _host_slots[host]
+
+
+def looks_direct(url: str) -> bool:
+    """A plain file URL by its path (query strings ignored)."""
+    return urlparse(url).path.lower().endswith(DIRECT_EXTENSIONS)
+
+
+def _header_dict(headers) -> dict:
+    return {
+        k.strip(): v.strip()
+        for k, v in (h.split(":", 1) for h in headers or [] if ":" in h)
+    }
+
+
+def _filename(url: str, disposition: str) -> str:
+    if match := re.search(r"filename\*=(?:UTF-8'')?([^;]+)", disposition, re.I):
+        return unquote(match.group(1).strip('" '))
+    if match := re.search(r'filename="?([^";]+)"?', disposition, re.I):
+        return match.group(1).strip()
+    return unquote(os.path.basename(urlparse(url).path))
+
+
+class HttpDownloader:
+    """
+    Native Segmented HTTP Engine (plain direct links).
+    One ranged GET per segment, all in parallel on the event loop: no
+    extractor, no thread. Segment offsets are checkpointed next to the
+    .part file, so a restarted task continues where it stopped.
+    """
+
+    def __init__(self, listener):
+        self._listener = listener
+        self.status_obj = None
+        self._headers = {}
+        self._done = 0  # Bytes on disk (all segments)
+
+    async def probe(self, url, headers=None) -> dict | None:
+        """
+        One 1-byte ranged GET: size, range support and server filename.
+        None -> not a plain file (HTML page, playlist...): yt-dlp's job.
+        """
+        self._headers = _header_dict(headers)
+        timeout = aiohttp.ClientTimeout(total=settings.RESOLVER_REQUEST_TIMEOUT)
+        try:
+            async with (
+                aiohttp.ClientSession(timeout=timeout) as session,
+                session.get(
+                    url, headers={**self._headers, "Range": "bytes=0-0"}, ssl=False
+                ) as resp,
+            ):
+                if resp.status in (403, 410):
+                    raise LinkRejectedException(
+                        "❌ Download Link Expired, Forbidden or Bad Request. You must re-leech with a new link."
+                    )
+                if resp.status not in (200, 206):
+                    return None
+                if any(x in resp.content_type for x in NOT_A_FILE):
+                    return None
+                total = 0
+                if resp.status == 206:
+                    content_range = resp.headers.get("Content-Range", "/0")
+                    total = int(content_range.rsplit("/", 1)[-1] or 0)
+                elif resp.content_length:
+                    total = resp.content_length
+                return {
+                    "url": str(resp.url),  # Redirects resolved once, not per segment
+                    "size": total,
+                    "ranges": resp.status == 206 and total > 0,
+                    "name": _filename(
+                        str(resp.url), resp.headers.get("Content-Disposition", "")
+                    ),
+                }
+        except LinkRejectedException:
+            raise
+        except (aiohttp.ClientError, TimeoutError, ValueError) as e:
+            LOGGER.info(f"ℹ️ HTTP probe failed ({e}); handing over to yt-dlp.")
+            return None
+
+    async def add_download(self, info, path, name_hint=None):
+        """Downloads a probed file into `path` (segmented when ranges work)."""
+        self._gid = self._listener.task_id
+        tag = settings.FILE_BRANDING_TAG if settings.FILE_BRANDING_TAG else ""
+
+        # 1. Filename: name_hint keeps the server's extension
+        name = info["name"] or f"{self._gid}.mp4"
+        if name_hint:
+            name = f"{name_hint}{os.path.splitext(name)[1] or '.mp4'}"
+        final_name = f"{tag} {name}".strip()
+        target = os.path.join(path, final_name)
+        self._listener.name = final_name
+
+        # 2. Status + plan (a resumed task reloads its segment offsets)
+        self.status_obj = HttpStatus(self._listener, self, self._gid)
+        await self._listener.on_download_start(self.status_obj)
+        segments = self._plan(info, target)
+        self._done = sum(seg[2] for seg in segments)
+        if self._done:
+            LOGGER.info(f"♻️ Resuming at {self._done}/{info['size']} bytes | ID: {self._gid}")
+
+        # 3. Transfer: every segment in parallel + one ticker for progress/state
+        ticker = asyncio.create_task(self._tick(info, segments, target))
+        fd = os.open(f"{target}.part", os.O_RDWR | os.O_CREAT)
+        try:
+            if info["ranges"]:
+                await asyncio.to_thread(os.ftruncate, fd, info["size"])
+            async with aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=None, sock_read=60)
+            ) as session:
+                fetches = [
+                    asyncio.create_task(self._fetch(session, info, seg, fd))
+                    for seg in segments
+                ]
+                try:
+                    await asyncio.gather(*fetches)
+                except BaseException:
+                    # One segment failed (or we got cancelled): stop the others
+                    for fetch in fetches:
+                        fetch.cancel()
+                    await asyncio.gather(*fetches, return_exceptions=True)
+                    raise
+        finally:
+            ticker.cancel()
+            os.close(fd)
+            self._save_state(target, info, segments)  # Checkpoint for a restart
+
+        # 4. Done: .part -> final name, sidecar gone
+        os.replace(f"{target}.part", target)
+        with contextlib.suppress(OSError):
+            os.remove(f"{target}{STATE_SUFFIX}")
+        self.status_obj.update_progress(self._done, info["size"] or self._done)
+        LOGGER.info(f"⚡ HTTP download finished ({len(segments)} segments) | ID: {self._gid}")
+        await self._listener.on_download_complete()
+
+    def _plan(self, info, target) -> list[list[int]]:
+        """[start, end, done] per segment; reloaded from the sidecar if it matches."""
+        size = info["size"]
+        if not info["ranges"]:
+            return [[0, -1, 0]]  # One stream, restarts from 0
+        if self._listener.resumed and os.path.exists(f"{target}.part"):
+            try:
+                with open(f"{target}{STATE_SUFFIX}") as f:
+                    state = json.load(f)
+                if state["size"] == size:
+                    return state["segments"]
+            except (OSError, ValueError, KeyError):
+                pass
+        count = max(1, min(settings.HTTP_SEGMENTS, size // settings.HTTP_MIN_SEGMENT_SIZE))
+        step = -(-size // count)
+        return [[start, min(start + step, size) - 1, 0] for start in range(0, size, step)]
+
+    async def _fetch(self, session, info, seg, fd):
+        """One segment; network errors retry from the segment's current offset."""
+        start, end, _ = seg
+        if end >= 0 and start + seg[2] > end:
+            return  # Finished before the restart
+        for attempt in range(1, SEGMENT_RETRIES + 1):
+            if end < 0 and seg[2]:
+                self._done -= seg[2]  # No ranges: every attempt starts from 0
+                seg[2] = 0
+            headers = dict(self._headers)
+            if end >= 0:
+                headers["Range"] = f"bytes={start + seg[2]}-{end}"
+            try:
+                async with (
+                    _host_slot(host_of(info["url"])),
+                    session.get(info["url"], headers=headers, ssl=False) as resp,
+                ):
+                    if resp.status in (403, 410):
+                        raise LinkRejectedException(
+                            "❌ Download Link Expired, Forbidden or Bad Request. You must re-leech with a new link."
+                        )
+                    if end >= 0 and resp.status != 206:
+                        raise aiohttp.ClientResponseError(
+                            resp.request_info, (), status=resp.status,
+                            message="Range request not honoured",
+                        )
+                    resp.raise_for_status()
+                    buffer = bytearray()
+                    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                        if self._listener.is_cancelled:
+                            raise Exception("TASK_CANCELLED_BY_USER")
+                        buffer += chunk
+                        if len(buffer) >= CHUNK_SIZE:
+                            await self._write(fd, seg, buffer)
+                            buffer = bytearray()
+                    if buffer:
+                        await self._write(fd, seg, buffer)
+                return
+            except (aiohttp.ClientError, TimeoutError) as e:
+                if attempt == SEGMENT_RETRIES:
+                    raise Exception(f"HTTP segment failed: {e}") from e
+                LOGGER.warning(f"🔁 Segment {start}-{end} retry {attempt}: {e}")
+                await asyncio.sleep(2 * attempt)
+
+    async def _write(self, fd, seg, data):
+        await asyncio.to_thread(os.pwrite, fd, data, seg[0] + seg[2])
+        seg[2] += len(data)
+        self._done += len(data)
+
+    async def _tick(self, info, segments, target):
+        """Once per second: status numbers, heartbeat and resume checkpoint."""
+        total = info["size"]
+        while True:
+            await asyncio.sleep(1)
+            self.status_obj.update_progress(self._done, total)
+            self._listener.on_progress(self._done, total)
+            if info["ranges"]:
+                await asyncio.to_thread(self._save_state, target, info, segments)
+
+    def _save_state(self, target, info, segments):
+        if not info["ranges"]:
+            return
+        tmp = f"{target}{STATE_SUFFIX}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"size": info["size"], "segments": segments}, f)
+        os.replace(tmp, f"{target}{STATE_SUFFIX}")
@@ -1,11 +1,16 @@
 # apps/worker-video/handlers/mirror_leech_utils/download_utils/yt_dlp_download.py
 import asyncio
+import copy
 import logging
 import os
+import time
+from dataclasses import dataclass
 from re import search as re_search
 
 import yt_dlp
 
+from handlers.mirror_leech_utils.download_utils.ytdl_process import run_isolated
+from shared.ext_utils.exceptions import LinkRejectedException
 from shared.registry import (
     non_queued_dl,
     queue_dict_lock,
@@ -18,18 +23,124 @@ from shared.status_utils.yt_dlp_status import YtDlpStatus
 
 LOGGER = logging.getLogger("YtDlpDownload")
 
+_info_cache = {}  # {(url, policy): (expires_at, info)} extract_info(download=False) results
+
 
 def sync_to_async(func, *args, **kwargs):
     loop = asyncio.get_event_loop()
     return loop.run_in_executor(None, func, *args, **kwargs)
 
 
+@dataclass(frozen=True)
+class FormatPolicy:
+    """Which streams a media type gets: what our player streams, not the biggest."""
+
+    max_height: int
+    vcodec: str = ""  # Preferred, not required (e.g. h264 for browser playback)
+    acodec: str = ""
+    max_filesize: int = 0  # Bytes per file (0 = no ceiling)
+
+    def opts(self) -> dict:
+        cap = f"[height<={self.max_height}]"
+        size = ""
+        if self.max_filesize:
+            size = f"[filesize<?{self.max_filesize}][filesize_approx<?{self.max_filesize}]"
+        # Within height + size -> within height -> anything (never leech nothing)
+        selector = f"bv*{cap}{size}+ba/b{cap}{size}/bv*{cap}+ba/b{cap}/bv*+ba/b"
+        sort = [f"res:{self.max_height}"]
+        if self.vcodec:
+            sort.append(f"vcodec:{self.vcodec}")
+        if self.acodec:
+            sort.append(f"acodec:{self.acodec}")
+        sort.append("ext:mp4:m4a")
+        return {
+            "format": selector,
+            "format_sort": sort,
+            # h264/aac fit MP4 as-is: no remux into MKV
+            "merge_output_format": "mp4/mkv",
+        }
+
+
+def format_policy(type_hint: str = "auto") -> FormatPolicy:
+    """
+    Defaults (YTDL_MAX_HEIGHT/VCODEC/ACODEC/MAX_FILESIZE) with per media type
+    overrides from YTDL_TYPE_POLICIES: "type:height[:vcodec[:acodec[:max_mb]]]".
+    A malformed entry is skipped (with a warning) instead of failing the task.
+    """
+    policy = [
+        settings.YTDL_MAX_HEIGHT,
+        settings.YTDL_VCODEC,
+        settings.YTDL_ACODEC,
+        settings.YTDL_MAX_FILESIZE // 1048576,
+    ]
+    for item in settings.YTDL_TYPE_POLICIES.split(","):
+        media_type, _, spec = item.strip().partition(":")
+        if media_type.lower() != (type_hint or "auto").lower() or not spec:
+            continue
+        override = list(policy)
+        try:
+            for i, value in enumerate(spec.split(":")[:4]):
+                if value:
+                    override[i] = int(value) if i in (0, 3) else value
+        except ValueError:
+            LOGGER.warning(f"⚠️ Ignoring malformed YTDL_TYPE_POLICIES entry: {item.strip()!r}")
+            continue
+        policy = override
+    height, vcodec, acodec, max_mb = policy
+    return FormatPolicy(height, vcodec, acodec, max_mb * 1048576)
+
+
+def engine_profile(info: dict | None) -> tuple[str, dict]:
+    """
+    yt-dlp options per extractor (from the pre-pass info):
+    - YTDL_ARIA2_EXTRACTORS -> aria2c moves the bytes (multi-connection)
+    - HLS/DASH (or unknown) -> N fragments in flight instead of one
+    - plain progressive file -> stock single stream
+    """
+    info = info or {}
+    fragments = {"concurrent_fragment_downloads": settings.YTDL_CONCURRENT_FRAGMENTS}
+    aria2_keys = {
+        key.strip().lower() for key in settings.YTDL_ARIA2_EXTRACTORS.split(",") if key.strip()
+    }
+    if info.get("extractor_key", "").lower() in aria2_keys:
+        return "Aria2", {
+            **fragments,
+            "external_downloader": {"default": "aria2c"},
+            "external_downloader_args": {
+                "aria2c": ["-x16", "-s16", "-k1M", f"-j{settings.YTDL_CONCURRENT_FRAGMENTS}"]
+            },
+        }
+    protocol = info.get("protocol", "")
+    if not protocol or "m3u8" in protocol or "dash" in protocol:
+        return "Fragments", fragments
+    return "Native", {}
+
+
+def _format_size(fmt: dict) -> int:
+    return fmt.get("filesize") or fmt.get("filesize_approx") or 0
+
+
+def info_sizes(info: dict) -> tuple[int, int]:
+    """(total, largest file) in bytes of an extracted info dict (0 = unknown)."""
+    if info.get("_type") == "playlist":
+        sizes = [info_sizes(entry)[0] for entry in info.get("entries") or [] if entry]
+        return sum(sizes), max(sizes, default=0)
+    if info.get("requested_formats"):
+        size = sum(_format_size(fmt) for fmt in info["requested_formats"])
+    else:
+        size = _format_size(info)
+    return size, size
+
+
 class YtDlpHelper:
     def __init__(self, listener):
         self._listener = listener
         self.status_obj = None
+        envelope = getattr(listener, "envelope", None)
+        self.policy = format_policy(envelope.type_hint if envelope else "auto")
         self.opts = {
-            "format": "bestvideo+bestaudio/best",
+            # Stream pick (height/codec/size) per media type, see format_policy()
+            **self.policy.opts(),
             "nocheckcertificate": True,
             "progress_hooks": [self._on_progress],
             "logger": self,  # Self-log to catch extension changes
@@ -41,6 +152,8 @@ class YtDlpHelper:
             "socket_timeout": 10,
             "retries": 3,
             "fragment_retries": 3,
+            # Same outtmpl on a resumed task -> continue the .part file
+            "continuedl": True,
         }
 
     def debug(self, msg):
@@ -68,6 +181,9 @@ class YtDlpHelper:
                 self.status_obj.total_bytes = total
                 self.status_obj.speed_raw = d.get("speed", 0)
                 self.status_obj.eta_raw = d.get("eta", 0)
+                # HLS/DASH: yt-dlp reports the fragment position as well
+                self.status_obj.fragment_index = d.get("fragment_index") or 0
+                self.status_obj.fragment_count = d.get("fragment_count") or 0
 
                 # Call the listener so it can print the Terminal Heartbeat
                 # We wrap it in a non-async call since _on_progress is sync
@@ -78,8 +194,77 @@ class YtDlpHelper:
             if "filename" in d:
                 self._listener.name = d["filename"].rsplit("/", 1)[-1]
 
-    async def add_download(self, url, path, filename=None):
+    async def extract_info(self, url, headers=None) -> dict | None:
+        """
+        Pre-pass: extract_info(download=False) with the download's own options
+        (same format pick), cached per URL. Size/title/format are known before
+        a byte flows; add_download() then replays the cached dict.
+        """
+        now = time.time()
+        cached = _info_cache.get((url, self.policy))
+        if cached and cached[0] > now:
+            return copy.deepcopy(cached[1])  # Downloading mutates the dict
+
+        self._set_headers(headers)
+        # Playlists/channels: entries stay URL stubs (each one extracts when it downloads)
+        opts = {**self.opts, "extract_flat": "in_playlist"}
+        try:
+            if settings.YTDL_PROCESS_ISOLATION:
+                info = await run_isolated(
+                    opts, url, extract=True, cancelled=self._is_cancelled
+                )
+            else:
+                info = await sync_to_async(self._real_extract, url, opts)
+        except Exception as e:
+            LOGGER.info(f"ℹ️ Pre-extraction skipped ({e}); extracting at download time.")
+            return None
+        for key in [k for k, (expires, _) in _info_cache.items() if expires <= now]:
+            _info_cache.pop(key, None)
+        _info_cache[(url, self.policy)] = (now + settings.YTDL_INFO_CACHE_TTL, info)
+        return copy.deepcopy(info)
+
+    def _real_extract(self, url, opts):
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            return ydl.sanitize_info(ydl.extract_info(url, download=False))
+
+    def _is_cancelled(self):
+        return self._listener.is_cancelled
+
+    def _on_child_event(self, kind, payload):
+        """Hook/logger events streamed back from an isolated yt-dlp process."""
+        if kind == "progress":
+            self._on_progress(payload)
+        elif kind == "error_log":
+            self.error(payload)  # Same LOGGER.error as in-thread mode
+        else:
+            self.debug(payload)
+
+    async def _download(self, url, info=None):
+        """One yt-dlp job: own process (YTDL_PROCESS_ISOLATION) or a thread."""
+        if not settings.YTDL_PROCESS_ISOLATION:
+            return await sync_to_async(self._real_download, url, info)
+        try:
+            await run_isolated(
+                self.opts,
+                url,
+                info,
+                on_event=self._on_child_event,
+                cancelled=self._is_cancelled,
+            )
+        except Exception as e:
+            self._raise_engine_error(url, e)
+
+    def _set_headers(self, headers):
+        # Host scrapers may need Cookie/Referer on the final request
+        if headers:
+            self.opts["http_headers"] = {
+                k.strip(): v.strip()
+                for k, v in (h.split(":", 1) for h in headers if ":" in h)
+            }
+
+    async def add_download(self, url, path, filename=None, headers=None):
         self._gid = self._listener.task_id
+        self._set_headers(headers)
 
         # 0. Fetch the Brand Tag from settings
         # Example: "[ShadowSystem]"
@@ -102,12 +287,26 @@ class YtDlpHelper:
             # Placeholder name until yt-dlp fetches the real title
             self._listener.name = f"{tag} Fetching Title...".strip()
 
+        # 2.1 Pre-pass (usually a cache hit from the worker's preflight):
+        # real name + size on the status line from the first second
+        info = await self.extract_info(url, headers)
+        profile, extra = engine_profile(info)
+        self.opts.update(extra)
+        self.status_obj.engine = f"YT-DLP {profile}"
+        if info:
+            size, _ = info_sizes(info)
+            self.status_obj.total_bytes = size
+            if not filename and info.get("_type", "video") == "video":
+                self._listener.name = os.path.basename(
+                    yt_dlp.YoutubeDL(self.opts).prepare_filename(info)
+                )
+
         # 3. Notify Listener that download is starting
         await self._listener.on_download_start(self.status_obj)
 
         # 4. Run the download
         # This blocks this specific task (but not the whole worker) until finished
-        await sync_to_async(self._real_download, url)
+        await self._download(url, info)
 
         # WZML-X Update: Capture the actual filename after download finishes
         files = os.listdir(path)
@@ -121,19 +320,143 @@ class YtDlpHelper:
         # 5. Signal completion so worker.py moves to Uploading
         await self._listener.on_download_complete()
 
-    def _real_download(self, url):
+    async def add_files(self, files, path, title="", headers=None):
+        """
+        Multi-file (folder) results: each file lands in its own sub-folder
+        of the task directory, then ONE completion for the whole folder.
+        """
+        self._gid = self._listener.task_id
+        self._set_headers(headers)
+        tag = settings.FILE_BRANDING_TAG if settings.FILE_BRANDING_TAG else ""
+
+        self.status_obj = YtDlpStatus(self._listener, self, self._gid)
+        self._listener.name = title or files[0].filename
+        await self._listener.on_download_start(self.status_obj)
+
+        for index, file in enumerate(files, start=1):
+            if self._listener.is_cancelled:
+                return
+            name = f"{tag} {file.filename}".strip() if file.filename else None
+            folder = os.path.join(path, file.path)
+            os.makedirs(folder, exist_ok=True)
+            self.opts["outtmpl"] = os.path.join(
+                folder, name or f"{tag} %(title)s.%(ext)s".strip()
+            )
+            LOGGER.info(f"📁 [{index}/{len(files)}] {file.filename} | ID: {self._gid}")
+            await self._download(file.url)
+
+        # The 'finished' hook renamed us after each file: back to the folder
+        self._listener.name = title or files[0].filename
+        await self._listener.on_download_complete()
+
+    async def add_playlist(self, info, path, on_entry):
+        """
+        Playlist/channel fan-out: entries download YTDL_PLAYLIST_PARALLEL at a
+        time, each into its own numbered folder. A finished entry goes to
+        `on_entry(index, count, file_path)` right away, so it is processed and
+        uploaded while the rest of the list is still downloading.
+        """
+        self._gid = self._listener.task_id
+        entries = [e for e in info.get("entries") or [] if e]
+        entries = entries[: settings.YTDL_PLAYLIST_LIMIT]
+        count = len(entries)
+
+        self.status_obj = YtDlpStatus(self._listener, self, self._gid)
+        self.status_obj.engine = "YT-DLP Playlist"
+        self.status_obj.entries_total = count
+        self._listener.name = info.get("title") or f"Playlist {self._gid}"
+        await self._listener.on_download_start(self.status_obj)
+        LOGGER.info(f"🎞️ Playlist '{self._listener.name}': {count} entries | ID: {self._gid}")
+
+        progress = {}  # {index: (downloaded, total)} of every entry
+        slots = asyncio.Semaphore(settings.YTDL_PLAYLIST_PARALLEL)
+
+        async def fetch(index, entry):
+            async with slots:
+                if self._listener.is_cancelled:
+                    return
+                folder = os.path.join(path, f"{index:03d}")
+                os.makedirs(folder, exist_ok=True)
+                helper = _PlaylistEntry(self._listener, self, index, progress)
+                helper.opts["outtmpl"] = os.path.join(folder, "%(title)s.%(ext)s")
+                helper.opts.update(engine_profile(None)[1])
+                url = entry.get("url") or entry.get("webpage_url")
+                try:
+                    await helper._download(url)
+                except Exception as e:
+                    if self._listener.is_cancelled:
+                        return
+                    # One private/removed video must not sink the playlist
+                    LOGGER.warning(f"⚠️ Entry {index}/{count} failed: {e} | ID: {self._gid}")
+                    return
+                finished = [
+                    f for f in os.listdir(folder) if not f.endswith((".part", ".ytdl"))
+                ]
+                if finished:
+                    self.status_obj.entries_done += 1
+                    await on_entry(index, count, os.path.join(folder, finished[0]))
+
+        await asyncio.gather(*(fetch(i, e) for i, e in enumerate(entries, 1)))
+        self._listener.name = info.get("title") or f"Playlist {self._gid}"
+        if not self.status_obj.entries_done and not self._listener.is_cancelled:
+            await self._listener.on_error("No playlist entry could be downloaded.")
+            return
+        await self._listener.on_download_complete()
+
+    def _playlist_progress(self, progress):
+        """Aggregate download numbers of the running entries (until uploads take over)."""
+        if self.status_obj._upload_status:
+            return
+        self.status_obj.downloaded_bytes = sum(done for done, _ in progress.values())
+        self.status_obj.total_bytes = sum(total for _, total in progress.values())
+
+    def _real_download(self, url, info=None):
         try:
             with yt_dlp.YoutubeDL(self.opts) as ydl:
-                ydl.download([url])
+                if info:
+                    # Replays the pre-extracted dict (formats already picked):
+                    # same path as --load-info-json, nothing is extracted twice
+                    ydl.process_ie_result(info, download=True)
+                else:
+                    ydl.download([url])
         except Exception as e:
-            if (
-                "403" in str(e)
-                or "404" in str(e)
-                or "400" in str(e)
-                or "Expired" in str(e)
-            ):
-                # This message will be caught by the worker.py 'except' block
-                raise Exception(
-                    "❌ Download Link Expired, Forbidden or Bad Request. You must re-leech with a new link."
-                )
-            raise e
+            self._raise_engine_error(url, e)
+
+    @staticmethod
+    def _raise_engine_error(url, e):
+        """Maps yt-dlp failures to the errors the worker/DownloadManager expect."""
+        if "403" in str(e) or "410" in str(e):
+            # Signed format URLs went stale (under every policy)
+            for key in [k for k in list(_info_cache) if k[0] == url]:
+                _info_cache.pop(key, None)
+            # Lets the DownloadManager drop a cached link and re-scrape once
+            raise LinkRejectedException(
+                "❌ Download Link Expired, Forbidden or Bad Request. You must re-leech with a new link."
+            ) from e
+        if "404" in str(e) or "400" in str(e) or "Expired" in str(e):
+            # This message will be caught by the worker.py 'except' block
+            raise Exception(
+                "❌ Download Link Expired, Forbidden or Bad Request. You must re-leech with a new link."
+            )
+        raise e
+
+
+class _PlaylistEntry(YtDlpHelper):
+    """One playlist entry: reports into the playlist's aggregate status."""
+
+    def __init__(self, listener, playlist, index, progress):
+        super().__init__(listener)
+        self._playlist = playlist
+        self._index = index
+        self._progress = progress
+
+    def debug(self, msg):
+        pass  # Merger renames concern this entry, not the task name
+
+    def _on_progress(self, d):
+        if self._listener.is_cancelled:
+            raise Exception("TASK_CANCELLED_BY_USER")
+        if d["status"] == "downloading":
+            total = d.get("total_bytes") or d.get("total_bytes_estimate") or 0
+            self._progress[self._index] = (d.get("downloaded_bytes", 0), total)
+            self._playlist._playlist_progress(self._progress)
@@ -0,0 +1,135 @@
+# apps/worker-video/handlers/mirror_leech_utils/download_utils/ytdl_process.py
+import asyncio
+import multiprocessing
+import time
+
+from shared.settings import settings
+
+PROGRESS_INTERVAL = 0.5  # Seconds between 'downloading' events sent to the parent
+# Only what YtDlpHelper._on_progress reads (hook dicts also carry unpicklables)
+PROGRESS_KEYS = (
+    "status",
+    "downloaded_bytes",
+    "total_bytes",
+    "total_bytes_estimate",
+    "speed",
+    "eta",
+    "fragment_index",
+    "fragment_count",
+    "filename",
+)
+
+_slots = None  # asyncio.Semaphore: yt-dlp child processes alive at once
+
+
+class _PipeLogger:
+    """yt-dlp logger inside the child: only the Merger line matters upstream."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def debug(self, msg):
+        if "Merger" in msg:
+            self.conn.send(("log", msg))
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        self.conn.send(("error_log", msg))
+
+
+def _child_main(conn, opts, url, info, extract):
+    """Child process: one yt-dlp job, every event goes back over the pipe."""
+    import yt_dlp
+
+    last = 0.0
+
+    def hook(d):
+        nonlocal last
+        now = time.monotonic()
+        if d["status"] == "downloading" and now - last < PROGRESS_INTERVAL:
+            return
+        last = now
+        conn.send(("progress", {k: d[k] for k in PROGRESS_KEYS if k in d}))
+
+    opts = {**opts, "progress_hooks": [hook], "logger": _PipeLogger(conn)}
+    try:
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            if extract:
+                result = ydl.sanitize_info(ydl.extract_info(url, download=False))
+            elif info:
+                ydl.process_ie_result(info, download=True)
+                result = None
+            else:
+                ydl.download([url])
+                result = None
+        conn.send(("done", result))
+    except BaseException as e:
+        conn.send(("error", str(e)))
+    finally:
+        conn.close()
+
+
+async def run_isolated(opts, url, info=None, extract=False, on_event=None, cancelled=None):
+    """
+    Runs one yt-dlp job in its own process (own GIL): the event loop, uploads
+    and heartbeats never compete with extraction/merging. Hook events arrive
+    through a pipe watched by the loop (no thread); `cancelled()` true ->
+    the child is terminated. Returns the extracted info (extract=True).
+    """
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(settings.YTDL_PROCESSES)
+
+    ctx = multiprocessing.get_context("spawn")  # Never fork a threaded event loop
+    reader, writer = ctx.Pipe(duplex=False)
+    child_opts = {k: v for k, v in opts.items() if k not in ("progress_hooks", "logger")}
+    proc = ctx.Process(
+        target=_child_main, args=(writer, child_opts, url, info, extract), daemon=True
+    )
+
+    async with _slots:
+        loop = asyncio.get_running_loop()
+        outcome = loop.create_future()
+
+        def settle(result):
+            if not outcome.done():
+                outcome.set_result(result)
+
+        def on_readable():
+            try:
+                while reader.poll():
+                    kind, payload = reader.recv()
+                    if kind in ("progress", "log", "error_log"):
+                        if on_event:
+                            on_event(kind, payload)
+                    else:
+                        settle((kind, payload))
+            except EOFError:
+                settle(("error", f"yt-dlp process exited ({proc.exitcode})"))
+            except Exception as e:
+                settle(("error", str(e)))  # e.g. TASK_CANCELLED_BY_USER from the hook
+
+        proc.start()
+        writer.close()  # Child holds the only write end: EOF once it is gone
+        loop.add_reader(reader.fileno(), on_readable)
+        try:
+            while not outcome.done():
+                if cancelled and cancelled():
+                    settle(("error", "TASK_CANCELLED_BY_USER"))
+                    break
+                await asyncio.wait([outcome], timeout=1)
+            kind, payload = outcome.result()
+        finally:
+            loop.remove_reader(reader.fileno())
+            if proc.is_alive():
+                proc.terminate()  # Cancelled or bailed out: no orphan keeps downloading
+            await asyncio.to_thread(proc.join, 5)
+            if proc.is_alive():
+                proc.kill()
+            reader.close()
+
+    if kind == "error":
+        raise Exception(payload)
+    return payload
@@ -4,7 +4,15 @@ import logging
 from pyrogram import Client, filters
 
 from shared.database import db_service
+from shared.dedup import abandon_source
 from shared.ext_utils.button_build import ButtonMaker
+from shared.task_envelope import TaskEnvelope
+from shared.task_queue import (
+    INCOMPLETE_QUEUE,
+    list_incomplete,
+    resume_incomplete,
+    task_id_of,
+)
 
 logger = logging.getLogger("RecoveryHandler")
 
@@ -18,46 +26,47 @@ async def recovery_callbacks(client, callback_query):
     query = callback_query.data
 
     if query == "clear_incomplete_tasks":
-        # 1. Get all task IDs from MongoDB before dropping it
-        incompletes = await db_service.db.incomplete_tasks.find().to_list(length=100)
+        # 1. Get all parked payloads before dropping the recovery store
+        incompletes = await list_incomplete(db_service.redis)
 
         # 2. Loop and delete corresponding Redis keys
-        for task in incompletes:
-            task_id = task["_id"]
-            payload = task.get("payload", "")
-            user_id = payload.split("|")[5] if "|" in payload else "0"
+        for payload in incompletes:
+            try:
+                envelope = TaskEnvelope.decode(payload)
+                task_id, user_id = envelope.task_id, envelope.user_id
+            except ValueError:
+                task_id, user_id = task_id_of(payload), "0"
 
             await db_service.redis.delete(f"task_status:{task_id}")
+            await abandon_source(db_service.redis, task_id)  # Followers re-led
             if user_id != "0":
                 await db_service.redis.srem(f"active_user_tasks:{user_id}", task_id)
 
-        # 3. Clear MongoDB
-        await db_service.db.incomplete_tasks.drop()
+        # 3. Clear the Recovery Store
+        await db_service.redis.delete(INCOMPLETE_QUEUE)
         await callback_query.answer("🗑️ All records and live statuses cleared.", show_alert=True)
         return await callback_query.message.delete()
 
     if query == "resume_all_tasks":
         await callback_query.answer("♻️ Resuming all...")
-        incompletes = await db_service.db.incomplete_tasks.find().to_list(length=100)
-        resumed = 0
-        for task in incompletes:
-            await db_service.redis.lpush("queue:leech", task["payload"])
-            await db_service.db.incomplete_tasks.delete_one({"_id": task["_id"]})
-            resumed += 1
+        resumed = await resume_incomplete(db_service.redis)
         await callback_query.message.edit_text(
             f"✅ <b>Successfully resumed {resumed} tasks.</b>\n<i>Note: If links were temporary/expired, the worker will log a 'Download Failed' error shortly.</i>"
         )
 
     if query == "select_incomplete_tasks":
-        incompletes = await db_service.db.incomplete_tasks.find().to_list(length=100)
+        incompletes = await list_incomplete(db_service.redis)
         if not incompletes:
             return await callback_query.answer("No tasks found!", show_alert=True)
 
         buttons = ButtonMaker()
-        for task in incompletes:
-            # Payload part 4 is the name_hint
-            name = task["payload"].split("|")[4] or f"ID: {task['_id']}"
-            buttons.data_button(f"📥 {name[:20]}", f"resume_single_{task['_id']}")
+        for payload in incompletes:
+            task_id = task_id_of(payload)
+            try:
+                name = TaskEnvelope.decode(payload).name_hint or f"ID: {task_id}"
+            except ValueError:
+                name = f"ID: {task_id}"
+            buttons.data_button(f"📥 {name[:20]}", f"resume_single_{task_id}")
 
         buttons.data_button("🔙 Back", "back_to_recovery")
         await callback_query.message.edit_text(
@@ -69,11 +78,7 @@ async def recovery_callbacks(client, callback_query):
 @Client.on_callback_query(filters.regex(r"^resume_single_(.+)$"))
 async def resume_single_callback(client, callback_query):
     task_id = callback_query.matches[0].group(1)
-    task = await db_service.db.incomplete_tasks.find_one({"_id": task_id})
-
-    if task:
-        await db_service.redis.lpush("queue:leech", task["payload"])
-        await db_service.db.incomplete_tasks.delete_one({"_id": task_id})
+    if await resume_incomplete(db_service.redis, task_id):
         await callback_query.answer(f"✅ Resumed {task_id}")
         # Refresh the selection menu
         return await recovery_callbacks(client, callback_query)
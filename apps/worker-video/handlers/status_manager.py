@@ -6,7 +6,9 @@ from html import escape
 
 from pyrogram.errors import FloodWait, MessageIdInvalid, MessageNotModified
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from services.aria2_client import aria2
 
+from shared.cluster import alive_nodes, fleet_tasks
 from shared.registry import task_dict, task_dict_lock
 from shared.settings import settings
 from shared.utils import ProgressManager, SystemMonitor
@@ -15,40 +17,59 @@ logger = logging.getLogger("StatusManager")
 
 
 class StatusManager:
-    def __init__(self, client):
+    """
+    ONE status message for the whole fleet.
+    Every node publishes its task snapshot to Redis; only the elected
+    status leader renders and edits the Telegram message.
+    """
+
+    def __init__(self, client, fleet=None):
         self.client = client
+        self.fleet = fleet  # WorkerRegistry (None = standalone node)
         self.status_msg = None  # Holds the ONE active status message
         self.last_update = 0
         self.is_running = False
         self.start_time = time.time()
 
-    async def get_readable_message(self):
-        """Builds the UI by polling polymorphic Status Objects."""
+    async def get_local_snapshot(self):
+        """UI dicts of the tasks running on THIS node."""
         async with task_dict_lock:
             # We filter for objects that actually have the status interface
-            tasks = list(task_dict.values())
-
+            tasks = [t for t in task_dict.values() if hasattr(t, "get_ui_dict")]
+            snapshot = []
+            for task in tasks:
+                # ✅ POLYMORPHIC CALLS: The object (Aria2Status/YtDlpStatus) handles its own math
+                ui = task.get_ui_dict()
+
+                # STALL CHECK
+                ui["stalled"] = False
+                if hasattr(task, "status_obj") and task.status_obj:
+                    tracker = getattr(task.status_obj, "_tracker", None)
+                    if tracker and (time.time() - tracker.last_update_time) > 45:
+                        ui["stalled"] = True
+                snapshot.append(ui)
+        return snapshot
+
+    async def get_readable_message(self, tasks, nodes=()):
+        """Builds the UI from task snapshots (local or fleet-wide)."""
         if not tasks:
             return None, None
 
+        capacity = sum(int(n.get("capacity", 0)) for n in nodes)
         msg = "<pre>🛰️ Shadow Systems Status</pre>\n"
-        msg += f"<pre>📦 <b>Task Running:</b> {len(tasks)}/{settings.MAX_TOTAL_TASKS}</pre>\n"
+        msg += f"<pre>📦 <b>Task Running:</b> {len(tasks)}/{capacity or settings.MAX_TOTAL_TASKS}</pre>\n"
         msg += "—" * 12 + "\n\n"
 
         for index, task in enumerate(tasks, start=1):
-            # ✅ POLYMORPHIC CALLS: The object (Aria2Status/YtDlpStatus) handles its own math
-            t_status = task.status()
-            t_name = escape(str(task.name()))
-            t_id = task.gid()
-            progress_str = task.progress()  # e.g. "45.20%"
-            user_tag = escape(str(task._listener.user_tag))
-            engine = task.engine
-
-            # STALL CHECK
-            if hasattr(task, "status_obj") and task.status_obj:
-                tracker = getattr(task.status_obj, "_tracker", None)
-                if tracker and (time.time() - tracker.last_update_time) > 45:
-                    t_status = f"STALLED ⚠️ ({t_status})"
+            t_status = task["status"]
+            t_name = escape(str(task["name"]))
+            t_id = task["task_id"]
+            progress_str = task["progress"]  # e.g. "45.20%"
+            user_tag = escape(str(task["user_tag"]))
+            engine = task["engine"]
+
+            if task.get("stalled"):
+                t_status = f"STALLED ⚠️ ({t_status})"
 
             # Clean percentage for the bar
             try:
@@ -67,19 +88,32 @@ class StatusManager:
             msg += f"<b>{index}. {t_status}:</b>\n"
             msg += f"<code>{t_name}</code>\n"
             msg += f"{bar} {progress_str}\n"
-            msg += f"<b>Processed:</b> {task.processed_bytes()} of {task.size()}\n"
-            msg += f"<b>Speed:</b> {task.speed()}\n"
-            msg += f"<b>ETA:</b> {task.eta()}\n"
+            msg += f"<b>Processed:</b> {task['processed']} of {task['size']}\n"
+            msg += f"<b>Speed:</b> {task['speed']}\n"
+            msg += f"<b>ETA:</b> {task['eta']}\n"
+            if task.get("entries"):
+                msg += f"<b>Entries:</b> {task['entries']} downloaded\n"
+            if task.get("fragments"):
+                msg += f"<b>Fragments:</b> {task['fragments']}\n"
             msg += f"<b>Engine:</b> <code>{engine}</code>\n"
+            if task.get("node"):
+                msg += f"🖥️ <code>{escape(task['node'])}</code>\n"
             msg += f"👤 {user_tag}\n"
             msg += f"🆔 <code>{t_id}</code>\n"
             msg += f"🛑 /cancel_{t_id}\n\n"
 
-        # Footer including System Health
-        stats = SystemMonitor.get_stats()
+        # Footer including System Health (One line per node in a fleet)
         msg += "—" * 12 + "\n"
-        msg += f"💻 <b>CPU:</b> {stats['cpu']}% | 🧠 <b>RAM:</b> {stats['mem']}%\n"
-        msg += f"💾 <b>FREE:</b> {stats['free']}\n"
+        if nodes:
+            for node in nodes:
+                msg += (
+                    f"🖥️ <b>{escape(node['node_id'])}:</b> {node.get('active', 0)}/{node.get('capacity', 0)} | "
+                    f"💻 {node.get('cpu', 0)}% | 🧠 {node.get('mem', 0)}% | 💾 {node.get('free', '?')}\n"
+                )
+        else:
+            stats = SystemMonitor.get_stats()
+            msg += f"💻 <b>CPU:</b> {stats['cpu']}% | 🧠 <b>RAM:</b> {stats['mem']}%\n"
+            msg += f"💾 <b>FREE:</b> {stats['free']}\n"
         uptime_sec = int(time.time() - self.start_time)
         msg += f"⏱️ <b>UPTIME:</b> {ProgressManager.get_readable_time(uptime_sec)}"
 
@@ -104,18 +138,28 @@ class StatusManager:
         logger.info("💓 Status Heartbeat started.")
         while self.is_running:
             try:
-                # Use a lock and create a snapshot to prevent 'dict changed size' errors
-                async with task_dict_lock:
-                    count = len(task_dict)
-                    # This uses the new ShadowTask helper to get the UI-friendly dictionary
-                    [
-                        task.get_ui_dict()
-                        for task in task_dict.values()
-                        if hasattr(task, "get_ui_dict")
-                    ]
+                # ONE aria2 RPC per tick refreshes every aria2 task's stats
+                await aria2.refresh()
+                # Snapshot under the lock to prevent 'dict changed size' errors
+                tasks = await self.get_local_snapshot()
+                nodes = ()
+
+                if self.fleet:
+                    # Share our snapshot, then see who owns the status message
+                    ttl = settings.STATUS_UPDATE_INTERVAL * 3
+                    await self.fleet.publish_tasks(tasks, ttl=ttl)
+                    if not await self.fleet.try_lead(ttl=ttl):
+                        # Another node renders the fleet view -> drop ours
+                        await self.delete_status()
+                        await asyncio.sleep(settings.STATUS_UPDATE_INTERVAL)
+                        continue
+                    nodes = await alive_nodes(self.fleet.redis)
+                    tasks = await fleet_tasks(
+                        self.fleet.redis, [n["node_id"] for n in nodes]
+                    )
 
                 # CASE 1: No active tasks -> Delete message
-                if count == 0:
+                if not tasks:
                     if self.status_msg:
                         await self.delete_status()
                         logger.info("🗑️ Status message deleted (Queue Empty).")
@@ -125,9 +169,7 @@ class StatusManager:
                     (
                         msg_text,
                         buttons,
-                    ) = (
-                        await self.get_readable_message()
-                    )  # This uses the snapshot logic now
+                    ) = await self.get_readable_message(tasks, nodes)
                     if msg_text:
                         if not self.status_msg:
                             self.status_msg = await self.client.send_message(
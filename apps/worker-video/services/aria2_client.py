@@ -0,0 +1,248 @@
+# apps/worker-video/services/aria2_client.py
+import asyncio
+import base64
+import contextlib
+import itertools
+import logging
+import time
+
+import aiohttp
+
+logger = logging.getLogger("Aria2Client")
+
+RPC_URL = "ws://localhost:6800/jsonrpc"
+CALL_TIMEOUT = 15  # Seconds before an RPC call is given up
+# Only what the status UI + event handling read (keeps snapshots small)
+STATUS_KEYS = [
+    "gid",
+    "status",
+    "totalLength",
+    "completedLength",
+    "downloadSpeed",
+    "followedBy",
+    "errorMessage",
+]
+
+
+class Aria2Error(Exception):
+    """aria2 answered a call with an error (or the socket dropped mid-call)."""
+
+
+class Aria2Client:
+    """
+    ONE async JSON-RPC websocket to the local aria2c, shared by the worker.
+    Calls are awaited futures (no blocking HTTP on the event loop) and
+    aria2's push notifications drive the TaskListener events directly:
+    onDownloadComplete / onBtDownloadComplete -> on_download_complete()
+    onDownloadError -> on_error(). Nobody polls for completion.
+    Progress comes from ONE batched snapshot per status tick (refresh()).
+    """
+
+    def __init__(self, url: str = RPC_URL, secret: str = ""):
+        self.url = url
+        self.token = f"token:{secret}" if secret else None
+        self._ws = None
+        self._ids = itertools.count(1)
+        self._pending = {}  # {rpc id: Future}
+        self._watched = {}  # {gid: Aria2Status}
+        self._early = {}  # {gid: (event, ts)} notifications before watch()
+        self._connected = asyncio.Event()
+
+    # --- CONNECTION ---
+    async def run(self):
+        """Background loop: (Re)connects and dispatches responses/notifications."""
+        while True:
+            try:
+                async with (
+                    aiohttp.ClientSession() as session,
+                    session.ws_connect(self.url, heartbeat=30) as ws,
+                ):
+                    self._ws = ws
+                    self._connected.set()
+                    logger.info(f"🛰️ aria2 websocket connected ({self.url})")
+                    asyncio.create_task(self._resync())
+                    async for msg in ws:
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            self._dispatch(msg.json())
+                        elif msg.type in (
+                            aiohttp.WSMsgType.CLOSED,
+                            aiohttp.WSMsgType.ERROR,
+                        ):
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"aria2 websocket lost: {e}. Reconnecting...")
+            finally:
+                self._connected.clear()
+                self._ws = None
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(Aria2Error("aria2 connection lost"))
+                self._pending.clear()
+            await asyncio.sleep(2)
+
+    async def call(self, method: str, *params):
+        """Single JSON-RPC call ('aria2.' prefix optional)."""
+        if "." not in method:
+            method = f"aria2.{method}"
+        if method.startswith("aria2."):
+            params = self._auth(*params)
+        await asyncio.wait_for(self._connected.wait(), CALL_TIMEOUT)
+
+        rpc_id = str(next(self._ids))
+        future = asyncio.get_running_loop().create_future()
+        self._pending[rpc_id] = future
+        try:
+            await self._ws.send_json(
+                {"jsonrpc": "2.0", "id": rpc_id, "method": method, "params": list(params)}
+            )
+            return await asyncio.wait_for(future, CALL_TIMEOUT)
+        finally:
+            self._pending.pop(rpc_id, None)
+
+    def _auth(self, *params) -> list:
+        return [self.token, *params] if self.token else list(params)
+
+    def _dispatch(self, data: dict):
+        if "id" in data:
+            future = self._pending.get(str(data["id"]))
+            if future and not future.done():
+                if "error" in data:
+                    future.set_exception(Aria2Error(data["error"].get("message", "")))
+                else:
+                    future.set_result(data.get("result"))
+            return
+
+        event = data.get("method", "").removeprefix("aria2.")
+        for param in data.get("params", []):
+            gid = param.get("gid")
+            if not gid:
+                continue
+            if gid in self._watched:
+                asyncio.create_task(self._on_event(gid, event))
+            else:
+                # add_uris() hasn't returned yet: replay once watched
+                self._early[gid] = (event, time.monotonic())
+
+    # --- DOWNLOADS ---
+    async def add_uris(self, uris: list, options: dict) -> str:
+        return await self.call("addUri", uris, options)
+
+    async def add_torrent(self, torrent: bytes, options: dict) -> str:
+        return await self.call(
+            "addTorrent", base64.b64encode(torrent).decode(), [], options
+        )
+
+    async def tell_status(self, gid: str, keys=None) -> dict:
+        return await self.call("tellStatus", gid, keys or STATUS_KEYS)
+
+    async def remove(self, gid: str):
+        with contextlib.suppress(Aria2Error):  # Already finished/removed
+            await self.call("forceRemove", gid)
+
+    def watch(self, status):
+        """Routes aria2 events for status.aria2_gid to its listener."""
+        self._watched[status.aria2_gid] = status
+        if early := self._early.pop(status.aria2_gid, None):
+            asyncio.create_task(self._on_event(status.aria2_gid, early[0]))
+        asyncio.create_task(self._remove_on_cancel(status))
+        # Drop replay entries nobody claimed
+        cutoff = time.monotonic() - 60
+        for gid, (_, ts) in list(self._early.items()):
+            if ts < cutoff:
+                self._early.pop(gid, None)
+
+    def unwatch(self, gid: str):
+        self._watched.pop(gid, None)
+
+    async def _remove_on_cancel(self, status):
+        """/cancel (Kill Switch) -> stop the transfer inside aria2 as well."""
+        gid = status.aria2_gid
+        await status.listener.wait()  # Finished, failed or cancelled
+        if status.listener.is_cancelled and self._watched.get(gid) is status:
+            self.unwatch(gid)
+            await self.remove(gid)
+            logger.info(f"🛑 aria2 download removed: {status.listener.task_id}")
+
+    async def refresh(self):
+        """
+        Status tick: ONE system.multicall (tellActive + tellWaiting) snapshots
+        every watched download. Rendering then reads cached fields only, so
+        the RPC cost is flat no matter how many tasks or fields are shown.
+        """
+        if not self._watched or not self._connected.is_set():
+            return
+        calls = [
+            {"methodName": "aria2.tellActive", "params": self._auth(STATUS_KEYS)},
+            {
+                "methodName": "aria2.tellWaiting",
+                "params": self._auth(0, len(self._watched), STATUS_KEYS),
+            },
+        ]
+        try:
+            results = await self.call("system.multicall", calls)
+        except (Aria2Error, TimeoutError) as e:
+            logger.debug(f"aria2 snapshot failed: {e}")
+            return
+        for result in results:
+            if not isinstance(result, list):
+                continue  # {faultCode, faultString}
+            for info in result[0]:
+                if status := self._watched.get(info.get("gid")):
+                    status.apply(info)
+
+    async def _on_event(self, gid: str, event: str):
+        if event not in ("onDownloadComplete", "onBtDownloadComplete", "onDownloadError"):
+            return
+        # Claimed once: onBtDownloadComplete + onDownloadComplete both fire for torrents
+        status = self._watched.pop(gid, None)
+        if not status:
+            return
+        listener = status.listener
+
+        if event in ("onDownloadComplete", "onBtDownloadComplete"):
+            try:
+                info = await self.tell_status(gid)
+            except (Aria2Error, TimeoutError):
+                info = {}
+            status.apply(info)
+            if info.get("followedBy"):
+                # Magnet metadata done -> the real torrent continues under a new gid
+                new_gid = info["followedBy"][0]
+                if status.on_metadata:
+                    try:
+                        await status.on_metadata()
+                    except Exception as e:
+                        logger.warning(f"Metadata hook failed for {listener.task_id}: {e}")
+                status.aria2_gid = new_gid
+                self.watch(status)
+                logger.info(f"🧲 Metadata fetched, following {new_gid}: {listener.task_id}")
+                return
+            if event == "onBtDownloadComplete":
+                await self.remove(gid)  # Stop seeding right away
+            await listener.on_download_complete()
+
+        else:
+            try:
+                info = await self.tell_status(gid, ["errorMessage"])
+                error = info.get("errorMessage") or "aria2 download failed"
+            except (Aria2Error, TimeoutError):
+                error = "aria2 download failed"
+            await listener.on_error(error)
+
+    async def _resync(self):
+        """After a reconnect: catch the events we missed while offline."""
+        for gid in list(self._watched):
+            try:
+                info = await self.tell_status(gid)
+            except (Aria2Error, TimeoutError):
+                continue
+            if info.get("status") == "complete":
+                asyncio.create_task(self._on_event(gid, "onDownloadComplete"))
+            elif info.get("status") == "error":
+                asyncio.create_task(self._on_event(gid, "onDownloadError"))
+
+
+# Singleton Instance
+aria2 = Aria2Client()
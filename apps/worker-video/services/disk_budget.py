@@ -0,0 +1,67 @@
+# apps/worker-video/services/disk_budget.py
+import asyncio
+import contextlib
+import logging
+import shutil
+
+from shared.settings import settings
+
+logger = logging.getLogger("DiskBudget")
+
+RECHECK_INTERVAL = 30  # Seconds: space also frees up without a release()
+
+
+class DiskBudget:
+    """
+    Node-local disk admission. A download whose size is known up front
+    (yt-dlp pre-pass, HTTP probe) reserves it before bytes flow; the
+    space still owed to running downloads counts as used, so two big
+    tasks can't both start on a disk that only fits one.
+    """
+
+    def __init__(self):
+        self._reserved = {}  # {task_id: (listener, bytes)}
+        self._released = None  # asyncio.Condition (created inside the loop)
+
+    def _owed(self) -> int:
+        """Bytes reserved but not written yet."""
+        owed = 0
+        for listener, size in self._reserved.values():
+            written = getattr(listener.status_obj, "downloaded_bytes", 0) or 0
+            owed += max(size - written, 0)
+        return owed
+
+    def available(self) -> int:
+        free = shutil.disk_usage(settings.DOWNLOAD_DIR).free
+        return free - self._owed() - settings.DISK_HEADROOM
+
+    async def reserve(self, listener, size: int):
+        """Waits until `size` bytes fit on disk, then books them for the task."""
+        if not size or listener.task_id in self._reserved:
+            return
+        capacity = shutil.disk_usage(settings.DOWNLOAD_DIR).total - settings.DISK_HEADROOM
+        if size > capacity:
+            raise Exception(
+                f"❌ Task needs {size // 1048576} MB, more than this node's disk can hold."
+            )
+        if self._released is None:
+            self._released = asyncio.Condition()
+
+        async with self._released:
+            if size > self.available():
+                logger.info(f"💾 Waiting for {size // 1048576} MB of disk: {listener.task_id}")
+            while size > self.available():
+                if listener.is_cancelled:
+                    return
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self._released.wait(), RECHECK_INTERVAL)
+            self._reserved[listener.task_id] = (listener, size)
+
+    async def release(self, task_id: str):
+        if self._reserved.pop(task_id, None) and self._released:
+            async with self._released:
+                self._released.notify_all()
+
+
+# Singleton Instance
+disk_budget = DiskBudget()
@@ -0,0 +1,249 @@
+# apps/worker-video/services/link_resolver.py
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from handlers.mirror_leech_utils.download_utils.direct_link_generator import find_host
+from handlers.mirror_leech_utils.download_utils.host_registry import host_of
+from shared.dedup import source_key
+from shared.settings import settings
+from shared.task_envelope import ResolvedFile, ResolvedLink, TaskEnvelope
+from shared.task_queue import LEECH_QUEUE
+
+logger = logging.getLogger("LinkResolver")
+
+# --- REDIS KEYS ---
+RESOLVED_PREFIX = "resolved:"  # resolved:{task_id} -> ResolvedLink JSON (TTL)
+RESOLVING_PREFIX = "resolving:"  # Short lock so only ONE node scrapes a task
+LINK_CACHE_PREFIX = "linkcache:"  # linkcache:{source_key} -> ResolvedLink JSON
+
+# Skip the generator for streaming sites (yt-dlp extracts those itself)
+STREAMING_HOSTS = (
+    "youtube.com",
+    "youtu.be",
+    "twitter.com",
+    "x.com",
+    "instagram.com",
+    "tiktok.com",
+)
+
+# Host scrapers are blocking (requests/cloudscraper + sleeps). They get their
+# OWN bounded pool so a slow host can't starve yt-dlp or other executor work,
+# and a per-host cap so one host can't hog the pool (or rate-limit us).
+_executor = ThreadPoolExecutor(
+    max_workers=settings.RESOLVER_THREADS, thread_name_prefix="resolver"
+)
+_host_slots = {}  # {host: asyncio.Semaphore}
+
+
+def _plugin(url: str):
+    """The host plugin for this URL, or None (unsupported / invalid)."""
+    try:
+        return find_host(url)
+    except Exception:
+        return None
+
+
+def _host_slot(host: str) -> asyncio.Semaphore:
+    if host not in _host_slots:
+        _host_slots[host] = asyncio.Semaphore(settings.RESOLVER_PER_HOST_LIMIT)
+    return _host_slots[host]
+
+
+def _fallback(url: str) -> ResolvedLink:
+    """Scrape failed: the source URL itself, already stale (never stored/reused)."""
+    return ResolvedLink(url=url, expires_at=-1)
+
+
+def _header_lines(header) -> list[str]:
+    """Host functions return headers as 'Name: value', a dict, or nothing."""
+    if not header:
+        return []
+    if isinstance(header, dict):
+        return [f"{k}: {v}" for k, v in header.items()]
+    if isinstance(header, (list, tuple)):
+        return [str(h) for h in header]
+    return [str(header)]
+
+
+class LinkResolver:
+    """
+    Speculative Direct-Link Resolution.
+    Scrapes file-host links while tasks still WAIT (queue head + our
+    prefetched claims), so a download starts the moment a slot frees up.
+    Results live in Redis with an expiry and are refreshed before they go stale.
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    @staticmethod
+    def needs_resolution(url: str) -> bool:
+        if url.startswith(("magnet:", "bc:")) or any(x in url for x in STREAMING_HOSTS):
+            return False
+        return _plugin(url) is not None  # Unknown hosts go to the engine as-is
+
+    @staticmethod
+    def is_fresh(link: ResolvedLink | None) -> bool:
+        """Usable with enough life left to actually start the download."""
+        if not link:
+            return False
+        return not link.expires_at or (
+            link.expires_at - time.time() > settings.RESOLVE_REFRESH_MARGIN
+        )
+
+    async def resolve(self, url: str, fresh: bool = False) -> ResolvedLink:
+        """
+        Source URL -> direct link. Served from the link cache when possible;
+        otherwise runs the (blocking) host scraper on the resolver pool, never
+        on the event loop (progress callbacks, heartbeats and Pyrogram keep
+        flowing). `fresh` skips the cache (e.g. after a 403).
+        """
+        cache_key = f"{LINK_CACHE_PREFIX}{source_key(url)}"
+        if not fresh and (cached := await self._load(cache_key)):
+            logger.info(f"⚡ Link cache hit: {host_of(url)}")
+            return cached
+
+        plugin = _plugin(url)
+        expires_at = time.time() + ((plugin and plugin.ttl) or settings.RESOLVED_LINK_TTL)
+        if not plugin:
+            return _fallback(url)
+        try:
+            async with _host_slot(host_of(url)):
+                result = await asyncio.wait_for(
+                    plugin.resolve(url, _executor), timeout=settings.RESOLVER_TIMEOUT
+                )
+        except TimeoutError:
+            logger.warning(f"⏱️ Resolver timed out after {settings.RESOLVER_TIMEOUT}s: {url}")
+            return _fallback(url)
+        except Exception as e:
+            # Same outcome as before: fall back to the original URL
+            logger.info(f"ℹ️ Direct Link Generator skipped: {e}")
+            return _fallback(url)
+
+        if isinstance(result, dict):
+            if not plugin.folders:
+                logger.warning(f"📁 {plugin.name} isn't a folder host; using original URL.")
+                return _fallback(url)
+            # Folder: every file travels to the engine with its sub-path
+            files = [ResolvedFile(**item) for item in result.get("contents", [])]
+            if not files:
+                logger.warning(f"📁 Empty folder resolved for {url}; using original URL.")
+                return _fallback(url)
+            link = ResolvedLink(
+                url=url,
+                headers=_header_lines(result.get("header")),
+                expires_at=expires_at,
+                title=result.get("title", ""),
+                files=files,
+            )
+            logger.info(f"📁 {plugin.name}: {len(files)} files in '{link.title}'")
+        else:
+            header = None
+            if isinstance(result, tuple):
+                result, header = result  # Handle (link, header) tuples
+            link = ResolvedLink(
+                url=result, headers=_header_lines(header), expires_at=expires_at
+            )
+        if plugin.headers and not link.headers:
+            # The link is useless without its header: scrape again at dispatch
+            logger.warning(f"🔑 {plugin.name} returned no header; using original URL.")
+            return _fallback(url)
+        # Resumes, retries & duplicate leeches of this page skip the scrape
+        await self._save(cache_key, link)
+        return link
+
+    async def invalidate(self, envelope: TaskEnvelope):
+        """The engine got a 403/410: the link is dead for everyone."""
+        envelope.resolved = None
+        await self.redis.delete(
+            f"{LINK_CACHE_PREFIX}{source_key(envelope.url)}",
+            f"{RESOLVED_PREFIX}{envelope.task_id}",
+        )
+        logger.warning(f"🚫 Resolved link rejected by host. Cache dropped: {envelope.task_id}")
+
+    async def _save(self, key: str, link: ResolvedLink):
+        ttl = max(int(link.expires_at - time.time()), 1)
+        await self.redis.set(key, link.model_dump_json(), ex=ttl)
+
+    async def _load(self, key: str) -> ResolvedLink | None:
+        raw = await self.redis.get(key)
+        if not raw:
+            return None
+        try:
+            link = ResolvedLink.model_validate_json(raw)
+        except ValueError:
+            return None
+        return link if self.is_fresh(link) else None
+
+    async def store(self, task_id: str, link: ResolvedLink):
+        if not self.is_fresh(link):
+            return  # Fallbacks: the next get() scrapes again instead
+        await self._save(f"{RESOLVED_PREFIX}{task_id}", link)
+
+    async def lookup(self, task_id: str) -> ResolvedLink | None:
+        raw = await self.redis.get(f"{RESOLVED_PREFIX}{task_id}")
+        if not raw:
+            return None
+        try:
+            return ResolvedLink.model_validate_json(raw)
+        except ValueError:
+            return None
+
+    async def get(self, envelope: TaskEnvelope) -> ResolvedLink | None:
+        """
+        The link to download from: the envelope hint, a speculative result
+        from Redis, or (last resort) a fresh scrape right now.
+        """
+        if not self.needs_resolution(envelope.url):
+            return None
+        if self.is_fresh(envelope.resolved):
+            return envelope.resolved
+
+        link = await self.lookup(envelope.task_id)
+        if not self.is_fresh(link):
+            link = await self.resolve(envelope.url)
+            await self.store(envelope.task_id, link)
+        return link
+
+    async def speculate(self):
+        """Background loop: pre-resolves the next tasks in queue:leech."""
+        logger.info(f"🔮 Speculative resolver online (Lookahead: {settings.RESOLVE_LOOKAHEAD})")
+        while True:
+            try:
+                # Workers pop from the RIGHT -> the tail holds the next tasks
+                upcoming = await self.redis.lrange(
+                    LEECH_QUEUE, -settings.RESOLVE_LOOKAHEAD, -1
+                )
+                for payload in reversed(upcoming):
+                    await self._speculate_one(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Speculative resolver error: {e}")
+            await asyncio.sleep(settings.RESOLVE_INTERVAL)
+
+    async def _speculate_one(self, payload: str):
+        try:
+            envelope = TaskEnvelope.decode(payload)
+        except ValueError:
+            return
+        if not self.needs_resolution(envelope.url) or self.is_fresh(envelope.resolved):
+            return
+        if _plugin(envelope.url).captcha:
+            return  # Don't burn a captcha on a task that may still be cancelled
+        if self.is_fresh(await self.lookup(envelope.task_id)):
+            return
+
+        # Fleet-wide: only one node scrapes a given task
+        lock = f"{RESOLVING_PREFIX}{envelope.task_id}"
+        if not await self.redis.set(lock, 1, nx=True, ex=60):
+            return
+        try:
+            link = await self.resolve(envelope.url)
+            await self.store(envelope.task_id, link)
+            if self.is_fresh(link):
+                logger.info(f"🔮 Pre-resolved {envelope.task_id} ahead of its slot")
+        finally:
+            await self.redis.delete(lock)
@@ -0,0 +1,99 @@
+# apps/worker-video/services/torrent_cache.py
+import asyncio
+import contextlib
+import logging
+import os
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from shared.database import db_service
+from shared.dedup import source_key
+from shared.settings import settings
+
+logger = logging.getLogger("TorrentCache")
+
+GRIDFS_BUCKET = "torrent_metadata"
+
+
+def infohash_of(url: str) -> str:
+    """Hex infohash of a magnet ('' for anything else)."""
+    if not url.startswith("magnet:"):
+        return ""
+    key = source_key(url)
+    return key.removeprefix("btih:") if key.startswith("btih:") else ""
+
+
+def _read(path: str) -> bytes | None:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _write(path: str, data: bytes):
+    # tmp + rename: a crash never leaves a truncated .torrent behind
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class TorrentCache:
+    """
+    Content-addressed store of magnet metadata: <infohash>.torrent.
+    aria2 saves the metadata once it has it (bt-save-metadata); repeat
+    leeches, retries and resumes of that magnet then start from the
+    .torrent and go straight to fetching pieces. GridFS (optional)
+    lets every node of the fleet reuse what one node fetched.
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root or settings.TORRENT_CACHE_DIR
+        self._bucket = None
+
+    def path(self, infohash: str) -> str:
+        return os.path.join(self.root, f"{infohash}.torrent")
+
+    @property
+    def bucket(self):
+        if self._bucket is None and settings.TORRENT_CACHE_GRIDFS and db_service.db is not None:
+            self._bucket = AsyncIOMotorGridFSBucket(db_service.db, bucket_name=GRIDFS_BUCKET)
+        return self._bucket
+
+    async def get(self, infohash: str) -> bytes | None:
+        """Cached metadata of this torrent (local disk first, then GridFS)."""
+        if not infohash:
+            return None
+        data = await asyncio.to_thread(_read, self.path(infohash))
+        if data or not self.bucket:
+            return data
+        try:
+            stream = await self.bucket.open_download_stream_by_name(infohash)
+            data = await stream.read()
+        except Exception:
+            return None  # gridfs.NoFile or Mongo down: just fetch from peers
+        await asyncio.to_thread(_write, self.path(infohash), data)
+        return data
+
+    async def capture(self, infohash: str, dpath: str):
+        """Moves the .torrent aria2 saved into the task dir into the cache."""
+        saved = os.path.join(dpath, f"{infohash}.torrent")
+        data = await asyncio.to_thread(_read, saved)
+        if not data:
+            return
+        await asyncio.to_thread(_write, self.path(infohash), data)
+        with contextlib.suppress(OSError):
+            os.remove(saved)  # Keep it out of the upload set
+        logger.info(f"🧲 Metadata cached: {infohash}")
+
+        if self.bucket:
+            try:
+                await self.bucket.upload_from_stream(infohash, data)
+            except Exception as e:
+                logger.warning(f"GridFS upload of {infohash} failed: {e}")
+
+
+# Singleton Instance
+torrent_cache = TorrentCache()
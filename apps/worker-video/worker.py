@@ -5,6 +5,7 @@ import os
 import random
 import shutil
 import signal
+import socket
 import subprocess
 import sys
 import time
@@ -14,19 +15,52 @@ from shared.ext_utils.button_build import ButtonMaker
 sys.path.append("/app/shared")
 from motor.motor_asyncio import AsyncIOMotorClient
 from redis.asyncio import Redis
+from services.aria2_client import aria2
+from services.disk_budget import disk_budget
+from services.link_resolver import LinkResolver
 
 from handlers.download_manager import DownloadManager
-from handlers.flow_ingest import MediaLeecher
+from handlers.flow_ingest import LeechJob, MediaLeecher
+from handlers.kill_switch import kill_switch
 from handlers.listeners.task_listener import TaskListener
 from handlers.status_manager import StatusManager
+from shared.cluster import WorkerRegistry, alive_nodes
 from shared.database import db_service
+from shared.dedup import abandon_source, hand_off, release_source
 from shared.registry import MirrorStatus, task_dict, task_dict_lock
 from shared.settings import settings
+from shared.task_envelope import TaskEnvelope, TaskStage
+from shared.task_queue import (
+    LEECH_QUEUE,
+    ReliableQueue,
+    list_incomplete,
+    list_processing,
+    task_id_of,
+)
 from shared.tg_client import TgClient
+from shared.utils import SystemMonitor
 
 TgClient.setup_logging()
 logger = logging.getLogger("VideoWorker")
 
+MEDIA_EXTENSIONS = (".mkv", ".mp4", ".avi", ".mov", ".webm", ".m4v", ".ts", ".wmv", ".flv")
+PARTIAL_EXTENSIONS = (".part", ".ytdl", ".aria2", ".segments")
+ORPHAN_GRACE = 600  # Seconds: covers a peer claiming a task between our scan and the sweep
+
+
+def media_files(root: str) -> list[str]:
+    """
+    Every finished file a task produced (season packs, folders and torrents
+    give many). Media files only, unless the task brought nothing else.
+    """
+    found = []
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            if not name.endswith(PARTIAL_EXTENSIONS):
+                found.append(os.path.join(dirpath, name))
+    media = [f for f in found if f.lower().endswith(MEDIA_EXTENSIONS)]
+    return sorted(media or found)
+
 
 class VideoWorker:
     """
@@ -38,17 +72,34 @@ class VideoWorker:
         self.db = None
         self.redis = None
         self.leecher = None
+        self.queue = None  # ReliableQueue (BLMOVE + Leases)
+        self.inflight = {}  # {task_id: payload} claimed by THIS node
+        self.lanes = {}  # {task_id: asyncio.Task} running process_task()
+        self.stolen = set()  # task_ids another node took over before we started
+        self.fleet = None  # WorkerRegistry (Heartbeats + Capacity)
+        self.resolver = None  # LinkResolver (Speculative direct links)
         self.is_running = True
         self.shutdown_event = asyncio.Event()
-        self.semaphore = asyncio.Semaphore(settings.MAX_TOTAL_TASKS)
+        # --- STAGED PIPELINE (Download -> Process -> Upload) ---
+        # Each stage has its own limit; bounded queues join them so network
+        # ingress, ffmpeg CPU and Telegram egress stay busy at the same time.
+        self.download_slots = asyncio.Semaphore(settings.MAX_CONCURRENT_DOWNLOADS)
+        self.process_queue = asyncio.Queue(maxsize=settings.MAX_CONCURRENT_PROCESSING)
+        self.upload_queue = asyncio.Queue(maxsize=settings.MAX_CONCURRENT_UPLOADS)
+        # Claimed-but-unfinished cap (running + prefetch window)
+        self.admission = asyncio.Semaphore(
+            settings.MAX_TOTAL_TASKS + settings.WORKER_PREFETCH
+        )
 
         # 🔑 DYNAMIC SESSION NAME
         # Defaults to 'worker_video_default' if SESSION_FILE is missing in .env
         self.session_name = os.getenv("SESSION_FILE", "worker_video_default")
         self.mode = os.getenv("WORKER_MODE", "BOT").upper()
+        # 🖥️ FLEET IDENTITY: Unique per container, stable across restarts
+        self.node_id = settings.WORKER_ID or f"{self.session_name}@{socket.gethostname()}"
 
         logger.info(
-            f"🆔 Node Initialized | Mode: {self.mode} | Session: {self.session_name}"
+            f"🆔 Node Initialized | Mode: {self.mode} | Session: {self.session_name} | Node: {self.node_id}"
         )
 
         try:
@@ -56,8 +107,12 @@ class VideoWorker:
         except:
             self.log_channel = 0
 
-    def clean_slate(self):
-        """🧹 WIPER: Removes all stale files from crash but ignores config/cookies"""
+    def clean_slate(self, keep=(), grace=0):
+        """
+        🧹 WIPER: Removes all stale files from crash but ignores config/cookies.
+        `keep` holds task_ids whose folder is still resumable (partial data).
+        `grace` spares entries modified within the last N seconds.
+        """
         dl_dir = settings.DOWNLOAD_DIR
         cookie_name = os.path.basename(settings.COOKIES_FILE_PATH)  # Get 'cookies.txt'
 
@@ -67,15 +122,22 @@ class VideoWorker:
                 # Remove all files in the directory
                 for filename in os.listdir(dl_dir):
                     # 🛡️ EXCLUSION LOGIC
-                    if filename == cookie_name:
+                    if filename == cookie_name or filename in keep:
                         continue
 
                     file_path = os.path.join(dl_dir, filename)
+                    try:
+                        if grace and time.time() - os.path.getmtime(file_path) < grace:
+                            continue  # Just created: may belong to a task starting now
+                    except OSError:
+                        continue  # Vanished meanwhile (its task finished)
                     if os.path.isfile(file_path) or os.path.islink(file_path):
                         os.unlink(file_path)
                     elif os.path.isdir(file_path):
                         shutil.rmtree(file_path)
-                logger.info("✅ Downloads folder purged (Cookies preserved).")
+                logger.info(
+                    f"✅ Downloads folder purged (Cookies + {len(keep)} resumable tasks preserved)."
+                )
             except Exception as e:
                 logger.warning(f"Failed to clean download folder: {e}")
         else:
@@ -121,14 +183,24 @@ class VideoWorker:
             exit(1)
 
     async def init_services(self):
-        # 0. Safety Cleanup
-        self.clean_slate()
+        # 0. Safety Cleanup (Resume mode: orphans only, after recovery below)
+        if not settings.RESUME_DOWNLOADS:
+            self.clean_slate()
 
         # 1. DB (Persistence Layer)
         await db_service.connect()  # Ensure kernel DB is connected for Shared Registry
         mongo_client = AsyncIOMotorClient(settings.MONGO_URL)
         self.db = mongo_client["shadow_systems"]
         self.redis = Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        self.queue = ReliableQueue(
+            self.redis, self.node_id, lease_ttl=settings.TASK_LEASE_TTL
+        )
+        self.fleet = WorkerRegistry(
+            self.redis,
+            self.node_id,
+            capacity=settings.MAX_TOTAL_TASKS,
+            ttl=settings.NODE_TTL,
+        )
 
         # Start Primary Identity (Added 'plugins' to load the recovery handler)
         plugins_config = dict(root="handlers")
@@ -163,16 +235,43 @@ class VideoWorker:
 
         # STARTUP RECOVERY
         await self.reconcile_incomplete_tasks()
+        if settings.RESUME_DOWNLOADS:
+            await self.collect_orphans()
+            asyncio.create_task(self.download_gc())
 
         # 5. Start Status Manager Heartbeat
-        self.status_mgr = StatusManager(self.app)
+        self.status_mgr = StatusManager(self.app, fleet=self.fleet)
         asyncio.create_task(self.status_mgr.update_heartbeat())  # Background Loop
 
+        # 5.1 Kill Switch (One pub/sub subscription for all local tasks)
+        asyncio.create_task(kill_switch.run(self.redis))
+
+        # 5.2 aria2 Events (One websocket: async RPC + completion notifications)
+        asyncio.create_task(aria2.run())
+
+        # 6. Reliable Queue Housekeeping (Lease renewal + Dead-node reaper)
+        asyncio.create_task(self.lease_heartbeat())
+        asyncio.create_task(self.lease_reaper())
+
+        # 6.1 Fleet Membership (Capacity/Load heartbeat + Work stealing)
+        await self.publish_load()
+        asyncio.create_task(self.fleet_heartbeat())
+
+        # 6.2 Speculative Link Resolution (Scrapes hosts for queued tasks)
+        self.resolver = LinkResolver(self.redis)
+        asyncio.create_task(self.resolver.speculate())
+
+        # 7. Stage Pools (Processing + Upload)
+        for _ in range(settings.MAX_CONCURRENT_PROCESSING):
+            asyncio.create_task(self.processing_stage())
+        for _ in range(settings.MAX_CONCURRENT_UPLOADS):
+            asyncio.create_task(self.upload_stage())
+
     async def reconcile_incomplete_tasks(self):
-        """WZML-X Style: Checks MongoDB for tasks that never finished."""
+        """WZML-X Style: Parks tasks this node claimed but never acked."""
         try:
             logger.info("🔍 Checking for incomplete tasks from previous session...")
-            incompletes = await self.db.incomplete_tasks.find().to_list(length=100)
+            incompletes = await self.queue.park_stale()
 
             if not incompletes:
                 logger.info("✅ No incomplete tasks found.")
@@ -206,6 +305,226 @@ class VideoWorker:
         except Exception as e:
             logger.error(f"❌ Error during task reconciliation: {e}")
 
+    async def collect_orphans(self):
+        """
+        ♻️ Keeps the folders of tasks that can still come back (Recovery Menu,
+        queue:leech, running on ANY node) and wipes everything else.
+        Peers may share DOWNLOAD_DIR, so liveness comes from the processing
+        lists, never from folder mtimes (a growing .part doesn't touch them).
+        """
+        parked = await list_incomplete(self.redis)
+        queued = await self.redis.lrange(LEECH_QUEUE, 0, -1)
+        running = await list_processing(self.redis)
+        # Local sets read AFTER the awaits: tasks claimed meanwhile are kept
+        keep = {task_id_of(payload) for payload in parked + queued + running}
+        keep |= set(self.lanes) | set(self.inflight)
+        await asyncio.to_thread(self.clean_slate, keep, ORPHAN_GRACE)
+
+    async def download_gc(self):
+        """Background loop: Folders of cleared/finished-elsewhere tasks get collected."""
+        while self.is_running:
+            await asyncio.sleep(settings.DOWNLOAD_GC_INTERVAL)
+            try:
+                await self.collect_orphans()
+            except Exception as e:
+                logger.warning(f"Download GC error: {e}")
+
+    async def checkpoint(self, envelope, stage) -> bool:
+        """
+        Records the stage reached in our processing entry (survives crashes).
+        Returns False if the entry left our list (another node took the task).
+        """
+        envelope.stage = stage
+        current = self.inflight.get(envelope.task_id)
+        if not current:
+            return True
+        try:
+            stored = await self.queue.checkpoint(current, envelope)
+        except Exception as e:
+            # Redis hiccup: keep going, the old entry is still a valid claim
+            logger.warning(f"Checkpoint failed for {envelope.task_id}: {e}")
+            return True
+        if stored is None:
+            return False
+        self.inflight[envelope.task_id] = stored
+        return True
+
+    async def lease_heartbeat(self):
+        """Keeps the leases of every in-flight task alive (1 round trip per beat)."""
+        interval = max(settings.TASK_LEASE_TTL // 3, 1)
+        while self.is_running:
+            try:
+                lost = await self.queue.renew(list(self.inflight))
+                for task_id in lost:
+                    self.on_lease_lost(task_id)
+            except Exception as e:
+                logger.warning(f"Lease renewal failed: {e}")
+            await asyncio.sleep(interval)
+
+    def on_lease_lost(self, task_id):
+        """Another node owns this task now (stolen while waiting, or reaped)."""
+        payload = self.inflight.get(task_id)
+        if payload and self.stage_of(payload) == TaskStage.QUEUED:
+            # Never started here -> drop our lane quietly, the thief runs it
+            self.stolen.add(task_id)
+            lane = self.lanes.get(task_id)
+            if lane:
+                lane.cancel()
+        else:
+            logger.warning(
+                f"⚠️ Lease of running task {task_id} was taken over. Finishing it anyway."
+            )
+
+    @staticmethod
+    def stage_of(payload) -> str:
+        try:
+            return TaskEnvelope.decode(payload).stage
+        except ValueError:
+            return TaskStage.QUEUED
+
+    async def publish_load(self):
+        """Pushes this node's capacity + live load to the fleet registry."""
+        stages = [self.stage_of(p) for p in list(self.inflight.values())]
+        stats = SystemMonitor.get_stats(settings.DOWNLOAD_DIR)
+        await self.fleet.heartbeat(
+            active=len(stages),
+            waiting=stages.count(TaskStage.QUEUED),
+            downloading=stages.count(TaskStage.DOWNLOADING),
+            processing=stages.count(TaskStage.PROCESSING),
+            uploading=stages.count(TaskStage.UPLOADING),
+            cpu=stats["cpu"],
+            mem=stats["mem"],
+            free=stats["free"],
+        )
+        return stages
+
+    async def fleet_heartbeat(self):
+        """Fleet loop: heartbeat, then look for work if we're idle."""
+        while self.is_running:
+            await asyncio.sleep(settings.NODE_HEARTBEAT_INTERVAL)
+            try:
+                stages = await self.publish_load()
+                if settings.ENABLE_WORK_STEALING:
+                    await self.steal_work(stages)
+            except Exception as e:
+                logger.warning(f"Fleet heartbeat failed: {e}")
+
+    async def steal_work(self, stages):
+        """
+        WORK STEALING: When our download slots sit idle and queue:leech is
+        empty, take not-yet-started tasks off busy nodes (or anything off
+        dead ones) instead of waiting for their slots / the reaper.
+        """
+        busy = stages.count(TaskStage.QUEUED) + stages.count(TaskStage.DOWNLOADING)
+        room = min(
+            settings.MAX_CONCURRENT_DOWNLOADS - busy,
+            settings.MAX_TOTAL_TASKS + settings.WORKER_PREFETCH - len(stages),
+        )
+        if room <= 0 or await self.redis.llen(LEECH_QUEUE):
+            return
+
+        # Reserve admission slots first so the watcher can't overfill us
+        reserved = 0
+        while reserved < room and not self.admission.locked():
+            await self.admission.acquire()
+            reserved += 1
+        if not reserved:
+            return
+
+        stolen = []
+        try:
+            nodes = await alive_nodes(self.redis)
+            alive = {n["node_id"]: int(n.get("waiting", 0)) for n in nodes}
+            stolen = await self.queue.steal(alive, limit=reserved)
+        finally:
+            for _ in range(reserved - len(stolen)):
+                self.admission.release()
+
+        for payload in stolen:
+            self.spawn_lane(payload)
+
+    async def lease_reaper(self):
+        """Hands back tasks from crashed/hung nodes whose lease expired."""
+        while self.is_running:
+            await asyncio.sleep(settings.QUEUE_REAPER_INTERVAL)
+            try:
+                await self.queue.reap(skip=set(self.inflight), on_bury=self.bury_source)
+            except Exception as e:
+                logger.warning(f"Lease reaper error: {e}")
+
+    async def processing_stage(self):
+        """STAGE 2 Pool: Metadata, rename, ffprobe, screenshots & sample (CPU)."""
+        while self.is_running:
+            job = await self.process_queue.get()
+            try:
+                if await self.leecher.prepare(job):
+                    # Bounded hand-off: a slow Telegram egress throttles this stage
+                    await self.upload_queue.put(job)
+                    continue
+            except Exception as e:
+                logger.error(f"❌ Processing stage crashed on {job.task_id}: {e}")
+            # Failed/Cancelled jobs never reach the upload pool
+            await self.close_job(job)
+
+    async def upload_stage(self):
+        """STAGE 3 Pool: Telegram upload, asset album & DB indexing (Egress)."""
+        while self.is_running:
+            job = await self.upload_queue.get()
+            try:
+                if job.envelope:
+                    await self.checkpoint(job.envelope, TaskStage.UPLOADING)
+                await self.leecher.upload(job)
+            except Exception as e:
+                logger.error(f"❌ Upload stage crashed on {job.task_id}: {e}")
+            await self.close_job(job)
+
+    def leech_job(
+        self, envelope, file_path, notify_chat, part=1, parts=1, batch=None, episode=None
+    ):
+        """LeechJob for one file of a task (single file, pack member or playlist entry)."""
+        return LeechJob(
+            file_path=file_path,
+            tmdb_id=envelope.tmdb_id,
+            type_hint=envelope.type_hint,
+            task_id=envelope.task_id,
+            user_id=envelope.user_id,
+            notify_chat=notify_chat,
+            trigger_msg_id=envelope.trigger_msg_id,
+            user_tag=envelope.user_tag,
+            # The hint names the task, not each file of a pack
+            name_hint=envelope.name_hint if parts == 1 else "",
+            envelope=envelope,
+            part=part,
+            parts=parts,
+            batch=batch,
+            episode=episode,
+        )
+
+    async def run_job(self, job, budget):
+        async with budget:
+            # Bounded hand-off: blocks while the processing pool is saturated
+            await self.process_queue.put(job)
+            await job.done
+
+    async def run_jobs(self, jobs):
+        """
+        Every file rides its own Process -> Upload sub-pipeline. The stage
+        pools bound the node; MAX_FILES_PER_TASK bounds one task, so a
+        40-file pack can't starve the other tasks of the node.
+        """
+        budget = asyncio.Semaphore(settings.MAX_FILES_PER_TASK)
+        await asyncio.gather(*(self.run_job(job, budget) for job in jobs))
+
+    async def close_job(self, job):
+        """Runs the leecher cleanup and wakes the lane waiting on the job."""
+        try:
+            await self.leecher.finalize(job)
+        except Exception as e:
+            logger.error(f"⚠️ Finalize failed for {job.task_id}: {e}")
+        finally:
+            if not job.done.done():
+                job.done.set_result(job.success)
+
     async def stop_services(self):
         """🛑 GRACEFUL SHUTDOWN ROUTINE"""
         if not self.is_running:
@@ -214,6 +533,13 @@ class VideoWorker:
         logger.info("🛑 Shutdown Signal Received. Cleaning up...")
         self.is_running = False
 
+        # 0. Leave the fleet (Peers stop counting our capacity right away)
+        if self.fleet:
+            try:
+                await self.fleet.deregister()
+            except Exception as e:
+                logger.warning(f"Fleet deregistration failed: {e}")
+
         # 1. Kill Aria2
         if hasattr(self, "aria2_proc"):
             try:
@@ -232,169 +558,262 @@ class VideoWorker:
 
     async def process_task(self, payload):
         """The 'Worker Lane': This runs a single task from start to finish."""
-        # 1. PRE-INITIALIZE (Solves UnboundLocalError forever)
-        task_id = payload.split("|")[0]
-        local_path = None
-        user_id = "0"
+        # 1. DECODE ONCE (Typed envelope is passed around from here on)
+        try:
+            envelope = TaskEnvelope.decode(payload)
+        except ValueError as e:
+            logger.error(f"🗑️ Dropping undecodable payload: {e}")
+            await self.queue.ack(payload)
+            await self.bury_source(task_id_of(payload))
+            self.inflight.pop(task_id_of(payload), None)
+            return
+
+        # PRE-INITIALIZE (Solves UnboundLocalError forever)
+        task_id = envelope.task_id
+        tmdb_id = envelope.tmdb_id
+        user_id = envelope.user_id
+        origin_chat_id = envelope.origin_chat_id or settings.TG_LOG_CHANNEL_ID
         listener = None
+        job = None
+        resolving = None
 
-        # A Semaphore is like a bouncer. Only 'MAX_TOTAL_TASKS' can pass this line at once.
-        async with self.semaphore:
-            try:
-                # 2. RECORD IN MONGODB (The Safety Net)
-                await self.db.incomplete_tasks.update_one(
-                    {"_id": task_id},
-                    {"$set": {"payload": payload, "added_at": time.time()}},
-                    upsert=True,
-                )
+        try:
+            # 2. SAFETY NET: The payload already sits in our processing list
+            # with a live lease (see task_watcher), so no DB write is needed.
+            logger.info(
+                f"📥 Processing: ID={task_id} | TMDB={tmdb_id} | Name_Hint={envelope.name_hint} | User={envelope.user_tag} | Retry={envelope.retries}"
+            )
 
-                # Use a limited split (8) to ensure that if the URL contains '|',
-                # it doesn't break the rest of the indices.
-                parts = payload.split("|", 8)
-
-                # CLEANING: Strip hidden whitespace from every part to ensure .isdigit() works
-                parts = [p.strip() for p in parts]
-
-                # Ensure we have all 9 parts
-                while len(parts) < 9:
-                    parts.append("")
-                (
-                    task_id,
-                    tmdb_id,
-                    raw_url,
-                    type_hint,
-                    name_hint,
-                    user_id,
+            # 3. Initialize Listener (+ subscribe it to pub/sub kill signals)
+            listener = TaskListener(envelope)
+            await kill_switch.register(listener)
+
+            # 3.1 SPECULATIVE RESOLVE: Scrape the file host while we still
+            # wait for a download slot (no-op if already pre-resolved)
+            resolving = asyncio.create_task(self.resolver.get(envelope))
+
+            # 3.2 PRE-EXTRACTION: size/format/title before a slot is committed
+            # (fails oversized files fast, waits for disk space if needed)
+            manager = DownloadManager(self.redis)
+            if not listener.is_cancelled:
+                await manager.preflight(listener)
+
+            # 3.3 PLAYLIST FAN-OUT: a finished entry starts Process -> Upload
+            # while the rest of the list is still downloading
+            entry_jobs, entry_runs, entry_batch = [], [], {}
+            entry_budget = asyncio.Semaphore(settings.MAX_FILES_PER_TASK)
+
+            async def on_entry(index, count, file_path):
+                entry_batch[index] = [0, await asyncio.to_thread(os.path.getsize, file_path)]
+                job = self.leech_job(
+                    envelope,
+                    file_path,
                     origin_chat_id,
-                    user_tag,
-                    trigger_msg_id,
-                ) = parts
-
-                # LOG THE FULL PAYLOAD FOR DEBUGGING
-                logger.info(
-                    f"📥 Processing: ID={task_id} | TMDB={tmdb_id} | Name_Hint={name_hint} | User={user_tag}"
+                    part=index,
+                    parts=count,
+                    batch=entry_batch if count > 1 else None,
+                    episode=index,
                 )
+                entry_jobs.append(job)
+                entry_runs.append(asyncio.create_task(self.run_job(job, entry_budget)))
+
+            # STAGE 1: DOWNLOAD (Network ingress pool)
+            # Only this phase holds a download slot, so a slow upload of task A
+            # never blocks the download of task B.
+            async with self.download_slots:
+                # OWNERSHIP CHECK: an idle node may have stolen the task while
+                # it waited for this slot (our entry is gone from the list).
+                try:
+                    envelope.resolved = await resolving
+                except Exception as e:
+                    logger.warning(f"Speculative resolve failed for {task_id}: {e}")
+
+                # Stage + direct link are persisted together (survive a requeue)
+                if not await self.checkpoint(envelope, TaskStage.DOWNLOADING):
+                    self.stolen.add(task_id)
+                if task_id in self.stolen:
+                    logger.info(f"🤝 {task_id} was taken over by another node.")
+                    return
+
+                # 4. Launch Download Engine (unless killed while queued)
+                if not listener.is_cancelled:
+                    await manager.start(listener, on_entry=on_entry)
+
+                # 5. EVENT WAIT: Wakes the instant the engine finishes/fails,
+                # or the Kill Switch cancels us. No polling, no Redis calls.
+                await listener.wait()
+            # Bytes are on disk now: the reservation has done its job
+            await disk_budget.release(task_id)
+
+            # 6. Hand-off to Processing (If finished and not cancelled)
+            if entry_jobs:
+                # Playlist: entries are in the pipeline already (even if cancelled)
+                await self.checkpoint(envelope, TaskStage.PROCESSING)
+                await asyncio.gather(*entry_runs)
+                jobs = sorted(entry_jobs, key=lambda j: j.part)
+                if jobs[0].parts > 1:
+                    await self.leecher.finalize_batch(jobs)
+                job = next((j for j in jobs if j.success), jobs[0])
+
+            elif listener.is_finished and not listener.is_cancelled:
+                # Random jitter (0.1 to 1.5s) so they don't hit the DB/API at the exact same millisecond
+                await asyncio.sleep(random.uniform(0.1, 1.5))
+                logger.info(f"⚙️ Transitioning to Processing: {task_id}")
+
+                # Force a 1-second sleep to ensure files are flushed to disk
+                await asyncio.sleep(1)
+
+                # A task is a SET of files (packs, folders, multi-file torrents)
+                files = media_files(listener.dir)
+                if not files:
+                    raise Exception("Download directory is empty!")
+
+                # Update status so users see it left the download phase
+                if listener.status_obj:
+                    listener.status_obj._upload_status = MirrorStatus.STATUS_PROCESSING
+
+                # Multi-file: one aggregated progress bar for the whole task
+                batch = {i: [0, os.path.getsize(f)] for i, f in enumerate(files, 1)}
+                jobs = [
+                    self.leech_job(
+                        envelope,
+                        local_path,
+                        origin_chat_id,
+                        part=index,
+                        parts=len(files),
+                        batch=batch if len(files) > 1 else None,
+                    )
+                    for index, local_path in enumerate(files, 1)
+                ]
+                if len(jobs) > 1:
+                    logger.info(f"📦 {task_id}: {len(jobs)} files to process")
+                await self.checkpoint(envelope, TaskStage.PROCESSING)
+
+                await self.run_jobs(jobs)
+                if len(jobs) > 1:
+                    await self.leecher.finalize_batch(jobs)
+                job = next((j for j in jobs if j.success), jobs[0])
 
-                # Sanitize IDs: Convert to int only if it's a pure digit string
-                tmdb_id = int(tmdb_id) if tmdb_id and tmdb_id.isdigit() else 0
+        except Exception as e:
+            logger.error(f"❌ Task {task_id} failed: {e}")
+            # Clean Redis status on known failure
+            await self.redis.delete(f"task_status:{task_id}")
+
+            # Notify user and CLEAR registry via the listener
+            if listener:
+                await listener.on_error(str(e))
+
+        finally:
+            kill_switch.unregister(task_id)
+            if resolving and not resolving.done():
+                resolving.cancel()
+            # A stolen task only drops local state: the thief now owns the
+            # queue entry, the lease and the user's slot.
+            stolen = task_id in self.stolen
+            self.stolen.discard(task_id)
+            # ♻️ Shutdown mid-task: data + processing entry survive, so the
+            # next boot parks it for the Recovery Menu and resumes the bytes.
+            interrupted = not self.is_running and settings.RESUME_DOWNLOADS
+
+            # 1. PHYSICAL CLEANUP (The Nuke)
+            if listener and os.path.exists(listener.dir) and not interrupted:
+                try:
+                    shutil.rmtree(listener.dir, ignore_errors=True)
+                except:
+                    pass
+
+            await disk_budget.release(task_id)
+
+            # 2. MEMORY CLEANUP (The Double-Tap)
+            # Even if listener.on_error failed, we pop the dict here
+            async with task_dict_lock:
+                if task_id in task_dict:
+                    task_dict.pop(task_id, None)
+
+            if not stolen and not interrupted:
+                # 3. REDIS SLOT RELEASE
+                if user_id != "0":
+                    await self.redis.srem(f"active_user_tasks:{user_id}", task_id)
 
-                # origin_chat_id must handle the '-' sign for channel IDs
-                origin_chat_id = (
-                    int(origin_chat_id)
-                    if origin_chat_id and origin_chat_id.replace("-", "").isdigit()
-                    else settings.TG_LOG_CHANNEL_ID
-                )
+                # 4. ACK: Handled (success OR known failure) -> drop from processing list
+                try:
+                    await self.queue.ack(self.inflight.get(task_id, payload))
+                except Exception as e:
+                    logger.error(f"⚠️ Ack failed for {task_id}: {e}")
 
-                # 3. Initialize Listener
-                listener = TaskListener(
-                    task_id=task_id,
-                    url=raw_url,
-                    tmdb_id=tmdb_id,
-                    user_id=user_id,
-                    user_tag=user_tag,
-                    origin_chat_id=int(origin_chat_id),
-                    trigger_msg_id=trigger_msg_id,
-                    type_hint=type_hint,
-                    name_hint=name_hint,
-                )
+                # 5. COALESCED FOLLOWERS: Share our result (or pass the baton)
+                await self.settle_followers(envelope, job)
+            self.inflight.pop(task_id, None)
 
-                # 4. Launch Download Engine
-                manager = DownloadManager(self.redis)
-                await manager.start(listener)
-
-                # 5. SMART WAIT: Wait for 'is_finished' flag or 'is_cancelled'
-                while not listener.is_finished:
-                    if listener.is_cancelled or await self.redis.get(
-                        f"kill_signal:{task_id}"
-                    ):
-                        listener.is_cancelled = True
-                        break
-                    await asyncio.sleep(2)
-
-                # 6. Upload Phase (If finished and not cancelled)
-                if listener.is_finished and not listener.is_cancelled:
-                    # Random jitter (0.1 to 1.5s) so they don't hit the DB/API at the exact same millisecond
-                    await asyncio.sleep(random.uniform(0.1, 1.5))
-                    logger.info(f"📤 Transitioning to Upload: {task_id}")
-
-                    # Force a 1-second sleep to ensure files are flushed to disk
-                    await asyncio.sleep(1)
-
-                    # WZML-X LOGIC: The file is simply the first file in the listener.dir
-                    files = os.listdir(listener.dir)
-                    if not files:
-                        raise Exception("Download directory is empty!")
-
-                    # Get the full path of the downloaded file
-                    local_path = os.path.join(listener.dir, files[0])
-
-                    if local_path and os.path.exists(local_path):
-                        # Update status to Uploading so users see it
-                        if listener.status_obj:
-                            listener.status_obj._upload_status = (
-                                MirrorStatus.STATUS_UPLOADING
-                            )
-
-                        await self.leecher.upload_and_sync(
-                            file_path=local_path,
-                            tmdb_id=int(tmdb_id),
-                            type_hint=type_hint,
-                            task_id=task_id,
-                            user_id=user_id,
-                            origin_chat_id=int(origin_chat_id),
-                            trigger_msg_id=trigger_msg_id,
-                            user_tag=user_tag,
-                            name_hint=name_hint,
-                        )
-                    else:
-                        raise Exception("Downloaded file disappeared or name mismatch.")
-
-                # 7. SUCCESS: DELETE FROM MONGODB
-                await self.db.incomplete_tasks.delete_one({"_id": task_id})
+            logger.info(f"🏁 Finalized cleanup for task: {task_id}")
 
-            except Exception as e:
-                logger.error(f"❌ Task {task_id} failed: {e}")
-                # Clean MongoDB and Redis status on known failure
-                await self.db.incomplete_tasks.delete_one({"_id": task_id})
-                await self.redis.delete(f"task_status:{task_id}")
-
-                # Notify user and CLEAR registry via the listener
-                if listener:
-                    await listener.on_error(str(e))
-
-            finally:
-                # 1. PHYSICAL CLEANUP (The Nuke)
-                if listener and os.path.exists(listener.dir):
-                    try:
-                        shutil.rmtree(listener.dir, ignore_errors=True)
-                    except:
-                        pass
+    async def settle_followers(self, envelope, job):
+        """
+        In-flight Dedup: Tasks that attached to our source while we ran.
+        Success -> they get our upload. Failure -> the first one becomes the
+        new leader (front of the queue), the rest re-attach behind it.
+        """
+        try:
+            followers = await release_source(self.redis, envelope)
+            if not followers:
+                return
 
-                # 2. MEMORY CLEANUP (The Double-Tap)
-                # Even if listener.on_error failed, we pop the dict here
-                async with task_dict_lock:
-                    if task_id in task_dict:
-                        task_dict.pop(task_id, None)
+            if job and job.success:
+                await self.leecher.share_result(job, followers)
+                return
 
-                # 3. REDIS SLOT RELEASE
-                if user_id != "0":
-                    await self.redis.srem(f"active_user_tasks:{user_id}", task_id)
+            await hand_off(self.redis, followers, envelope.task_id)
+        except Exception as e:
+            logger.error(f"⚠️ Follower hand-off failed for {envelope.task_id}: {e}")
 
-                logger.info(f"🏁 Finalized cleanup for task: {task_id}")
+    async def bury_source(self, task_id):
+        """A leader that will never finish (dead queue, undecodable): free its source."""
+        try:
+            await abandon_source(self.redis, task_id)
+        except Exception as e:
+            logger.error(f"⚠️ Follower hand-off failed for {task_id}: {e}")
 
     async def task_watcher(self):
-        """The 'Ear': It pulls tasks from Redis and spawns them into parallel lanes."""
-        logger.info(f"🚀 Parallel Worker Online. Max Slots: {settings.MAX_TOTAL_TASKS}")
+        """
+        The 'Ear': Pulls tasks from Redis ONLY when this node has room.
+        A node holds at most MAX_TOTAL_TASKS running + WORKER_PREFETCH waiting,
+        so the rest of a burst stays in queue:leech for the other nodes.
+        """
+        logger.info(
+            f"🚀 Parallel Worker Online. Max Slots: {settings.MAX_TOTAL_TASKS} | Prefetch: {settings.WORKER_PREFETCH}"
+        )
         while self.is_running:
+            # BACKPRESSURE: Wait for a free admission slot BEFORE touching Redis
+            await self.admission.acquire()
             try:
-                task = await self.redis.brpop("queue:leech", timeout=1)
-                if task:
-                    payload = task[1]
-                    # We 'create_task' so the loop doesn't wait (ASYNC PARALLEL)
-                    asyncio.create_task(self.process_task(payload))
+                # BLMOVE into our processing list + lease (Crash-safe hand-off)
+                payload = await self.queue.claim(block=1)
             except Exception as e:
+                self.admission.release()
                 logger.error(f"Watcher Error: {e}")
                 await asyncio.sleep(2)
+                continue
+
+            if not payload:
+                self.admission.release()
+                continue
+
+            self.spawn_lane(payload)
+
+    def spawn_lane(self, payload):
+        """Starts a Worker Lane for a claimed payload (admission slot already held)."""
+        task_id = task_id_of(payload)
+        self.inflight[task_id] = payload
+        # We 'create_task' so the loop doesn't wait (ASYNC PARALLEL)
+        lane = asyncio.create_task(self.process_task(payload))
+        self.lanes[task_id] = lane
+
+        # The slot frees up however the lane ends (success, failure, cancel)
+        def _release(_):
+            self.lanes.pop(task_id, None)
+            self.admission.release()
+
+        lane.add_done_callback(_release)
 
 
 async def main():
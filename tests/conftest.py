@@ -0,0 +1,46 @@
+# tests/conftest.py
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import fakeredis
+import pytest
+
+APPS = Path(__file__).resolve().parent.parent / "apps"
+# Same import roots as the containers: 'shared.x' from apps/, 'handlers.x' from the worker
+sys.path[:0] = [str(APPS), str(APPS / "worker-video")]
+
+# Settings are env-driven: required secrets get inert values for the test run
+for name, value in {
+    "TG_API_ID": "1",
+    "TG_API_HASH": "test",
+    "TG_BOT_TOKEN": "test",
+    "TG_WORKER_BOT_TOKEN": "test",
+    "TG_STREAM_BOT_TOKEN": "test",
+    "TG_OWNER_ID": "1",
+    "TG_LOG_CHANNEL_ID": "-100",
+    "MONGO_URL": "mongodb://localhost:27017",
+    "REDIS_URL": "redis://localhost:6379",
+    "JWT_SECRET": "test",
+    "SECURE_LINK_SECRET": "test",
+    "TMDB_API_KEY": "test",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture
+def run():
+    """Runs `scenario(redis)` against a fresh in-memory Redis (Lua via lupa)."""
+
+    def runner(scenario):
+        async def main():
+            redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+            try:
+                return await scenario(redis)
+            finally:
+                await redis.aclose()
+
+        return asyncio.run(main())
+
+    return runner
@@ -0,0 +1,118 @@
+# tests/test_dedup.py
+from shared.dedup import (
+    abandon_source,
+    attach_source,
+    canonical_url,
+    detach_follower,
+    release_source,
+    source_key,
+)
+from shared.task_envelope import TaskEnvelope
+from shared.task_queue import LEECH_QUEUE, task_id_of
+
+URL = "https://host.example/file/abc"
+
+
+def envelope(task_id, url=URL):
+    return TaskEnvelope(task_id=task_id, url=url, source_key=source_key(url))
+
+
+# --- canonical_url / source_key ---
+def test_canonical_url_strips_noise():
+    assert canonical_url("HTTPS://www.Host.example:443/a/b/?utm_source=x&b=2&a=1#frag") == (
+        "https://host.example/a/b?a=1&b=2"
+    )
+
+
+def test_canonical_url_keeps_custom_port_and_content_params():
+    assert canonical_url("http://host.example:8080/v?id=7&fbclid=z") == (
+        "http://host.example:8080/v?id=7"
+    )
+
+
+def test_source_key_matches_equivalent_urls():
+    assert source_key("https://www.host.example/f/?ref=tw") == source_key("https://host.example/f")
+    assert source_key("https://host.example/f") != source_key("https://host.example/g")
+
+
+def test_source_key_of_magnet_is_its_infohash():
+    hex_hash = "c12fe1c06bba254a9dc9f519b335aa7c1367a88a"
+    base32 = "YEX6DQDLXISUVHOJ6UM3GNNKPQJWPKEK"
+    assert source_key(f"magnet:?xt=urn:btih:{hex_hash.upper()}&dn=x") == f"btih:{hex_hash}"
+    assert source_key(f"magnet:?xt=urn:btih:{base32}") == f"btih:{hex_hash}"
+
+
+# --- attach / release ---
+def test_first_task_leads_the_rest_follow(run):
+    async def scenario(redis):
+        assert await attach_source(redis, envelope("lead")) is None
+        assert await attach_source(redis, envelope("f1")) == "lead"
+        assert await attach_source(redis, envelope("f2")) == "lead"
+
+        followers = await release_source(redis, envelope("lead"))
+        assert [f.task_id for f in followers] == ["f1", "f2"]
+        assert await attach_source(redis, envelope("next")) is None  # Source is free
+
+    run(scenario)
+
+
+def test_release_by_non_owner_takes_nobody(run):
+    async def scenario(redis):
+        await attach_source(redis, envelope("lead"))
+        await attach_source(redis, envelope("f1"))
+
+        assert await release_source(redis, envelope("stale")) == []
+        assert [f.task_id for f in await release_source(redis, envelope("lead"))] == ["f1"]
+
+    run(scenario)
+
+
+def test_tasks_without_source_key_never_coalesce(run):
+    async def scenario(redis):
+        bare = TaskEnvelope(task_id="a", url=URL)
+        assert await attach_source(redis, bare) is None
+        assert await attach_source(redis, bare) is None
+        assert await release_source(redis, bare) == []
+
+    run(scenario)
+
+
+def test_abandoned_leader_hands_source_to_first_follower(run):
+    async def scenario(redis):
+        await attach_source(redis, envelope("lead"))
+        await attach_source(redis, envelope("f1"))
+        await attach_source(redis, envelope("f2"))
+
+        assert await abandon_source(redis, "lead") == 2
+        queued = await redis.lrange(LEECH_QUEUE, 0, -1)
+        assert [task_id_of(p) for p in queued] == ["f1"]  # f2 re-attached behind it
+        assert await attach_source(redis, envelope("late")) == "f1"
+        assert [f.task_id for f in await release_source(redis, envelope("f1"))] == [
+            "f2",
+            "late",
+        ]
+
+    run(scenario)
+
+
+def test_abandon_of_a_finished_task_is_a_no_op(run):
+    async def scenario(redis):
+        await attach_source(redis, envelope("lead"))
+        await release_source(redis, envelope("lead"))
+        assert await abandon_source(redis, "lead") == 0
+        assert await redis.llen(LEECH_QUEUE) == 0
+
+    run(scenario)
+
+
+def test_cancelled_follower_is_detached_for_good(run):
+    async def scenario(redis):
+        await attach_source(redis, envelope("lead"))
+        await attach_source(redis, envelope("f1"))
+        await attach_source(redis, envelope("f2"))
+
+        assert await detach_follower(redis, "f1")
+        assert not await detach_follower(redis, "f1")
+        assert [f.task_id for f in await release_source(redis, envelope("lead"))] == ["f2"]
+
+    run(scenario)
@@ -0,0 +1,50 @@
+# tests/test_format_policy.py
+import pytest
+
+from handlers.mirror_leech_utils.download_utils.yt_dlp_download import (
+    FormatPolicy,
+    format_policy,
+)
+from shared.settings import settings
+
+
+@pytest.fixture
+def policies(monkeypatch):
+    def apply(value):
+        monkeypatch.setattr(settings, "YTDL_MAX_HEIGHT", 1080)
+        monkeypatch.setattr(settings, "YTDL_VCODEC", "h264")
+        monkeypatch.setattr(settings, "YTDL_ACODEC", "aac")
+        monkeypatch.setattr(settings, "YTDL_MAX_FILESIZE", 4096 * 1048576)
+        monkeypatch.setattr(settings, "YTDL_TYPE_POLICIES", value)
+
+    return apply
+
+
+def test_defaults_without_overrides(policies):
+    policies("")
+    assert format_policy("movie") == FormatPolicy(1080, "h264", "aac", 4096 * 1048576)
+
+
+def test_type_override_replaces_given_fields_only(policies):
+    policies("tv:720::opus, movie:2160:vp9")
+    assert format_policy("TV") == FormatPolicy(720, "h264", "opus", 4096 * 1048576)
+    assert format_policy("movie") == FormatPolicy(2160, "vp9", "aac", 4096 * 1048576)
+    assert format_policy("auto").max_height == 1080
+
+
+def test_size_override_is_in_megabytes(policies):
+    policies("tv:480:::700")
+    assert format_policy("tv").max_filesize == 700 * 1048576
+
+
+def test_malformed_entry_is_skipped(policies):
+    policies("tv:720p, tv:abc:vp9:opus:x, movie:1440")
+    assert format_policy("tv") == FormatPolicy(1080, "h264", "aac", 4096 * 1048576)
+    assert format_policy("movie").max_height == 1440
+
+
+def test_opts_cap_height_and_size():
+    opts = FormatPolicy(720, "h264", "aac", 1048576).opts()
+    assert opts["format"].startswith("bv*[height<=720][filesize<?1048576]")
+    assert opts["format"].endswith("/bv*+ba/b")  # Never leech nothing
+    assert opts["format_sort"] == ["res:720", "vcodec:h264", "acodec:aac", "ext:mp4:m4a"]
@@ -0,0 +1,71 @@
+# tests/test_http_download.py
+import json
+from itertools import pairwise
+from types import SimpleNamespace
+
+import pytest
+
+from handlers.mirror_leech_utils.download_utils.http_download import (
+    STATE_SUFFIX,
+    HttpDownloader,
+)
+from shared.settings import settings
+
+MB = 1048576
+
+
+@pytest.fixture
+def segments(monkeypatch):
+    monkeypatch.setattr(settings, "HTTP_SEGMENTS", 4)
+    monkeypatch.setattr(settings, "HTTP_MIN_SEGMENT_SIZE", 8 * MB)
+
+
+def downloader(resumed=False):
+    return HttpDownloader(SimpleNamespace(resumed=resumed, task_id="t1"))
+
+
+def test_plan_splits_into_contiguous_segments(segments, tmp_path):
+    plan = downloader()._plan({"size": 100 * MB, "ranges": True}, str(tmp_path / "f.mkv"))
+    assert len(plan) == 4
+    assert plan[0][0] == 0 and plan[-1][1] == 100 * MB - 1
+    assert all(a[1] + 1 == b[0] for a, b in pairwise(plan))
+    assert all(seg[2] == 0 for seg in plan)
+
+
+def test_plan_keeps_small_files_in_one_segment(segments, tmp_path):
+    plan = downloader()._plan({"size": 5 * MB, "ranges": True}, str(tmp_path / "f.mkv"))
+    assert plan == [[0, 5 * MB - 1, 0]]
+
+
+def test_plan_without_ranges_is_one_stream(segments, tmp_path):
+    assert downloader()._plan({"size": 0, "ranges": False}, str(tmp_path / "f")) == [[0, -1, 0]]
+
+
+def write_state(target, size, segs):
+    """A .part file plus its segment sidecar, as an interrupted download leaves them."""
+    (target.parent / f"{target.name}.part").write_bytes(b"")
+    (target.parent / f"{target.name}{STATE_SUFFIX}").write_text(
+        json.dumps({"size": size, "segments": segs})
+    )
+
+
+def test_plan_resumes_from_sidecar(segments, tmp_path):
+    target = tmp_path / "f.mkv"
+    saved = [[0, 49 * MB, 10 * MB], [49 * MB + 1, 100 * MB - 1, 3]]
+    write_state(target, 100 * MB, saved)
+    plan = downloader(resumed=True)._plan({"size": 100 * MB, "ranges": True}, str(target))
+    assert plan == saved
+
+
+def test_plan_ignores_sidecar_of_another_size(segments, tmp_path):
+    target = tmp_path / "f.mkv"
+    write_state(target, 99 * MB, [[0, 99 * MB - 1, 5]])
+    plan = downloader(resumed=True)._plan({"size": 100 * MB, "ranges": True}, str(target))
+    assert len(plan) == 4 and all(seg[2] == 0 for seg in plan)
+
+
+def test_plan_ignores_sidecar_unless_resumed(segments, tmp_path):
+    target = tmp_path / "f.mkv"
+    write_state(target, 100 * MB, [[0, 100 * MB - 1, 5]])
+    plan = downloader(resumed=False)._plan({"size": 100 * MB, "ranges": True}, str(target))
+    assert all(seg[2] == 0 for seg in plan)
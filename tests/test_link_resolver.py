@@ -0,0 +1,48 @@
+# tests/test_link_resolver.py
+import pytest
+from services import link_resolver
+from services.link_resolver import LinkResolver
+
+from handlers.mirror_leech_utils.download_utils.host_registry import HostPlugin
+
+URL = "https://host.example/file/abc"
+FOLDER = {"contents": [{"path": "", "filename": "a.mkv", "url": "https://cdn/a"}]}
+
+
+@pytest.fixture
+def scrape(monkeypatch, run):
+    """Resolves URL through a fake plugin returning `result`."""
+
+    def resolve(result, **spec):
+        plugin = HostPlugin(name="fake", fetch=lambda url: result, **spec)
+        monkeypatch.setattr(link_resolver, "_plugin", lambda url: plugin)
+
+        async def scenario(redis):
+            return await LinkResolver(redis).resolve(URL)
+
+        return run(scenario)
+
+    return resolve
+
+
+def test_folder_from_a_folder_host_is_kept(scrape):
+    link = scrape(FOLDER, folders=True)
+    assert [f.filename for f in link.files] == ["a.mkv"]
+    assert LinkResolver.is_fresh(link)
+
+
+def test_folder_from_a_single_file_host_is_rejected(scrape):
+    link = scrape(FOLDER)
+    assert link.url == URL and not link.files
+    assert not LinkResolver.is_fresh(link)
+
+
+def test_header_host_without_header_falls_back(scrape):
+    link = scrape("https://cdn/a", headers=True)
+    assert link.url == URL and not LinkResolver.is_fresh(link)
+
+
+def test_header_host_with_header_is_kept(scrape):
+    link = scrape(("https://cdn/a", "Referer: https://host.example/"), headers=True)
+    assert link.url == "https://cdn/a"
+    assert link.headers == ["Referer: https://host.example/"]
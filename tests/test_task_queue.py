@@ -0,0 +1,187 @@
+# tests/test_task_queue.py
+from shared.task_envelope import TaskEnvelope, TaskStage
+from shared.task_queue import (
+    ACTIVE_COUNTS,
+    DEAD_QUEUE,
+    LEECH_QUEUE,
+    PROCESSING_PREFIX,
+    ReliableQueue,
+    enqueue,
+    lease_key,
+    list_processing,
+    remove_queued,
+    task_id_of,
+)
+
+
+def envelope(task_id, **fields):
+    return TaskEnvelope(task_id=task_id, url=f"https://example.com/{task_id}", **fields)
+
+
+def test_claim_takes_oldest_and_leases_it(run):
+    async def scenario(redis):
+        await enqueue(redis, envelope("a"))
+        await enqueue(redis, envelope("b"))
+        queue = ReliableQueue(redis, "node1")
+
+        payload = await queue.claim(block=1)
+        assert task_id_of(payload) == "a"
+        assert await redis.lrange(f"{PROCESSING_PREFIX}node1", 0, -1) == [payload]
+        assert await redis.get(lease_key("a")) == "node1"
+        assert await redis.hget(ACTIVE_COUNTS, "node1") == "1"
+
+    run(scenario)
+
+
+def test_priority_task_is_claimed_first(run):
+    async def scenario(redis):
+        await enqueue(redis, envelope("normal"))
+        await enqueue(redis, envelope("urgent", priority=1))
+        payload = await ReliableQueue(redis, "node1").claim(block=1)
+        assert task_id_of(payload) == "urgent"
+
+    run(scenario)
+
+
+def test_ack_drops_entry_lease_and_slot(run):
+    async def scenario(redis):
+        await enqueue(redis, envelope("a"))
+        queue = ReliableQueue(redis, "node1")
+        payload = await queue.claim(block=1)
+
+        await queue.ack(payload)
+        assert await redis.llen(f"{PROCESSING_PREFIX}node1") == 0
+        assert not await redis.exists(lease_key("a"))
+        assert await redis.hget(ACTIVE_COUNTS, "node1") == "0"
+
+    run(scenario)
+
+
+def test_ack_keeps_a_lease_taken_over_by_another_node(run):
+    async def scenario(redis):
+        await enqueue(redis, envelope("a"))
+        queue = ReliableQueue(redis, "node1")
+        payload = await queue.claim(block=1)
+        await redis.set(lease_key("a"), "node2")
+
+        await queue.ack(payload)
+        assert await redis.get(lease_key("a")) == "node2"
+
+    run(scenario)
+
+
+def test_reap_requeues_after_two_lease_less_sweeps(run):
+    async def scenario(redis):
+        await enqueue(redis, envelope("a"))
+        payload = await ReliableQueue(redis, "crashed").claim(block=1)
+        await redis.delete(lease_key("a"))
+        reaper = ReliableQueue(redis, "node2")
+
+        assert await reaper.reap() == 0  # First sweep: only a suspect
+        assert await reaper.reap() == 1
+        requeued = TaskEnvelope.decode((await redis.lrange(LEECH_QUEUE, 0, -1))[0])
+        assert requeued.task_id == "a" and requeued.retries == 1
+        assert await redis.llen(f"{PROCESSING_PREFIX}crashed") == 0
+        assert payload != requeued.encode()
+
+    run(scenario)
+
+
+def test_reap_skips_leased_and_local_tasks(run):
+    async def scenario(redis):
+        await enqueue(redis, envelope("leased"))
+        await enqueue(redis, envelope("local"))
+        queue = ReliableQueue(redis, "node1")
+        await queue.claim(block=1)
+        await queue.claim(block=1)
+        await redis.delete(lease_key("local"))
+
+        for _ in range(3):
+            assert await queue.reap(skip={"local"}) == 0
+        assert await redis.llen(f"{PROCESSING_PREFIX}node1") == 2
+
+    run(scenario)
+
+
+def test_reap_buries_a_task_past_its_retries(run):
+    async def scenario(redis):
+        await enqueue(redis, envelope("poison", retries=99))
+        await ReliableQueue(redis, "crashed").claim(block=1)
+        await redis.delete(lease_key("poison"))
+        buried = []
+
+        async def on_bury(task_id):
+            buried.append(task_id)
+
+        reaper = ReliableQueue(redis, "node2")
+        await reaper.reap(on_bury=on_bury)
+        assert await reaper.reap(on_bury=on_bury) == 0
+        assert task_id_of((await redis.lrange(DEAD_QUEUE, 0, -1))[0]) == "poison"
+        assert buried == ["poison"]
+
+    run(scenario)
+
+
+def test_steal_takes_waiting_task_from_busy_node(run):
+    async def scenario(redis):
+        await enqueue(redis, envelope("a"))
+        await ReliableQueue(redis, "busy").claim(block=1)
+        thief = ReliableQueue(redis, "idle")
+
+        stolen = await thief.steal({"busy": 1, "idle": 0}, limit=1)
+        assert [task_id_of(p) for p in stolen] == ["a"]
+        assert await redis.get(lease_key("a")) == "idle"
+        assert await redis.hget(ACTIVE_COUNTS, "busy") == "0"
+        assert await redis.hget(ACTIVE_COUNTS, "idle") == "1"
+
+    run(scenario)
+
+
+def test_steal_leaves_started_tasks_of_live_nodes(run):
+    async def scenario(redis):
+        await enqueue(redis, envelope("a", stage=TaskStage.DOWNLOADING))
+        await ReliableQueue(redis, "busy").claim(block=1)
+        stolen = await ReliableQueue(redis, "idle").steal({"busy": 1}, limit=1)
+        assert stolen == []
+
+    run(scenario)
+
+
+def test_steal_from_silent_node_waits_for_lease_expiry(run):
+    async def scenario(redis):
+        await enqueue(redis, envelope("a", stage=TaskStage.DOWNLOADING))
+        await ReliableQueue(redis, "silent").claim(block=1)
+        thief = ReliableQueue(redis, "idle")
+
+        # Missed heartbeat but the lease is still alive: not dead yet
+        assert await thief.steal({}, limit=1) == []
+        assert await redis.get(lease_key("a")) == "silent"
+
+        await redis.delete(lease_key("a"))
+        stolen = await thief.steal({}, limit=1)
+        assert TaskEnvelope.decode(stolen[0]).retries == 1
+        assert await redis.get(lease_key("a")) == "idle"
+
+    run(scenario)
+
+
+def test_remove_queued_drops_only_that_task(run):
+    async def scenario(redis):
+        await enqueue(redis, envelope("a"))
+        await enqueue(redis, envelope("b"))
+        assert await remove_queued(redis, "a")
+        assert not await remove_queued(redis, "a")
+        assert [task_id_of(p) for p in await redis.lrange(LEECH_QUEUE, 0, -1)] == ["b"]
+
+    run(scenario)
+
+
+def test_list_processing_spans_every_node(run):
+    async def scenario(redis):
+        await enqueue(redis, envelope("a"))
+        await enqueue(redis, envelope("b"))
+        await ReliableQueue(redis, "node1").claim(block=1)
+        await ReliableQueue(redis, "node2").claim(block=1)
+        assert sorted(task_id_of(p) for p in await list_processing(redis)) == ["a", "b"]
+
+    run(scenario)